@@ -4,11 +4,20 @@ from datetime import datetime
 import json
 from database import (
     get_audit_logs, get_response_info, get_response_details, 
-    update_response_detail, get_user_by_username, update_user_allowed_surveys,
+    update_response_details_bulk, get_user_by_username, update_user_allowed_surveys,
     add_governorate_admin, get_health_admins, update_user, update_survey,
-    get_governorates_list, add_user, save_survey, delete_survey,
-    get_health_admin_name
+    add_user, save_survey, delete_survey, get_health_admin_name,
+    get_governorates, get_governorate, get_health_admin,
+    get_health_admins_details, get_health_admins_by_governorate,
+    invalidate_reference_cache, get_users_overview, get_survey_schema,
+    get_survey_responses, get_response_details_bulk,
+    get_survey_response_stats, get_survey_daily_stats, rebuild_response_rollups,
+    get_response_matrix, build_response_matrix, get_client,
+    bump_user_version, grant_survey_to_health_admin
 )
+from view_helpers import paginated_responses
+from analytics import get_survey_analytics
+from instrumentation import query_scope
 
 def show_admin_dashboard():
     st.title("لوحة تحكم النظام")
@@ -21,45 +30,22 @@ def show_admin_dashboard():
         "عرض البيانات"
     ])
     
-    with tab1:
+    with tab1, query_scope("manage_users"):
         manage_users()
-    with tab2:
+    with tab2, query_scope("manage_governorates"):
         manage_governorates()
-    with tab3:
+    with tab3, query_scope("manage_regions"):
         manage_regions()
-    with tab4:
+    with tab4, query_scope("manage_surveys"):
         manage_surveys()
-    with tab5:
+    with tab5, query_scope("view_data"):
         view_data()
 
 def manage_users():
     st.header("إدارة المستخدمين")
     
     # عرض المستخدمين الحاليين
-    users_data = []
-    users = st.session_state.supabase.table('Users').select('*').execute().data
-    
-    for user in users:
-        governorate_name = ""
-        admin_name = ""
-        
-        if user['role'] == 'governorate_admin':
-            gov_admin = st.session_state.supabase.table('GovernorateAdmins').select('Governorates(governorate_name)').eq('user_id', user['user_id']).execute().data
-            if gov_admin:
-                governorate_name = gov_admin[0]['Governorates']['governorate_name']
-        elif user['role'] == 'employee' and user['assigned_region']:
-            admin_name = get_health_admin_name(user['assigned_region'])
-            health_admin = st.session_state.supabase.table('HealthAdministrations').select('Governorates(governorate_name)').eq('admin_id', user['assigned_region']).execute().data
-            if health_admin:
-                governorate_name = health_admin[0]['Governorates']['governorate_name']
-        
-        users_data.append({
-            'user_id': user['user_id'],
-            'username': user['username'],
-            'role': user['role'],
-            'governorate_name': governorate_name,
-            'admin_name': admin_name
-        })
+    users_data = get_users_overview()
     
     # عرض جدول المستخدمين
     for user in users_data:
@@ -88,8 +74,8 @@ def manage_users():
         add_user_form()
 
 def add_user_form():
-    governorates = get_governorates_list()
-    surveys = st.session_state.supabase.table('Surveys').select('survey_id, survey_name').execute().data
+    governorates = get_governorates()
+    surveys = get_client().table('Surveys').select('survey_id, survey_name').execute().data
 
     if 'add_user_form_data' not in st.session_state:
         st.session_state.add_user_form_data = {
@@ -150,7 +136,7 @@ def add_user_form():
                     key="employee_gov_select")
                 st.session_state.add_user_form_data['governorate_id'] = selected_gov
 
-                health_admins = st.session_state.supabase.table('HealthAdministrations').select('admin_id, admin_name').eq('governorate_id', selected_gov).execute().data
+                health_admins = get_health_admins_by_governorate(selected_gov)
 
                 if health_admins:
                     selected_admin = st.selectbox(
@@ -203,7 +189,7 @@ def add_user_form():
                         add_governorate_admin(user['user_id'], st.session_state.add_user_form_data['governorate_id'])
 
                     if role != "admin" and st.session_state.add_user_form_data['allowed_surveys']:
-                        update_user_allowed_surveys(user['user_id'], st.session_state.add_user_form_data['allowed_surveys'])
+                        update_user_allowed_surveys(user['user_id'], st.session_state.add_user_form_data['allowed_surveys'], current_ids=[])
 
                     st.success(f"تمت إضافة المستخدم {username} بنجاح")
                     st.session_state.add_user_form_data = {
@@ -228,24 +214,24 @@ def add_user_form():
             st.rerun()
 
 def edit_user_form(user_id):
-    user = st.session_state.supabase.table('Users').select('*').eq('user_id', user_id).execute().data
+    user = get_client().table('Users').select('*').eq('user_id', user_id).execute().data
     if not user:
         st.error("المستخدم غير موجود!")
         del st.session_state.editing_user
         return
     
     user = user[0]
-    governorates = get_governorates_list()
-    surveys = st.session_state.supabase.table('Surveys').select('survey_id, survey_name').execute().data
+    governorates = get_governorates()
+    surveys = get_client().table('Surveys').select('survey_id, survey_name').execute().data
     
-    allowed_surveys = st.session_state.supabase.table('UserSurveys').select('survey_id').eq('user_id', user_id).execute().data
+    allowed_surveys = get_client().table('UserSurveys').select('survey_id').eq('user_id', user_id).execute().data
     allowed_surveys = [s['survey_id'] for s in allowed_surveys]
     
     current_gov = None
     current_admin = user['assigned_region']
     
     if user['role'] == 'governorate_admin':
-        gov_admin = st.session_state.supabase.table('GovernorateAdmins').select('governorate_id').eq('user_id', user_id).execute().data
+        gov_admin = get_client().table('GovernorateAdmins').select('governorate_id').eq('user_id', user_id).execute().data
         if gov_admin:
             current_gov = gov_admin[0]['governorate_id']
     
@@ -274,7 +260,7 @@ def edit_user_form(user_id):
                 key=f"emp_gov_{user_id}"
             )
             
-            health_admins = st.session_state.supabase.table('HealthAdministrations').select('admin_id, admin_name').eq('governorate_id', selected_gov).execute().data
+            health_admins = get_health_admins_by_governorate(selected_gov)
             
             admin_options = [a['admin_id'] for a in health_admins]
             try:
@@ -304,18 +290,19 @@ def edit_user_form(user_id):
             if st.form_submit_button("حفظ التعديلات"):
                 if new_role == "governorate_admin":
                     update_user(user_id, new_username, new_role)
-                    st.session_state.supabase.table('GovernorateAdmins').delete().eq('user_id', user_id).execute()
-                    st.session_state.supabase.table('GovernorateAdmins').insert({
+                    get_client().table('GovernorateAdmins').delete().eq('user_id', user_id).execute()
+                    get_client().table('GovernorateAdmins').insert({
                         'user_id': user_id,
                         'governorate_id': selected_gov
                     }).execute()
+                    bump_user_version(user_id)
                     
                     if new_role != "admin":
-                        update_user_allowed_surveys(user_id, selected_surveys)
+                        update_user_allowed_surveys(user_id, selected_surveys, current_ids=allowed_surveys)
                 else:
                     update_user(user_id, new_username, new_role, selected_admin if new_role == "employee" else None)
                     if new_role != "admin":
-                        update_user_allowed_surveys(user_id, selected_surveys)
+                        update_user_allowed_surveys(user_id, selected_surveys, current_ids=allowed_surveys)
                 
                 del st.session_state.editing_user
                 st.rerun()
@@ -326,12 +313,13 @@ def edit_user_form(user_id):
 
 def delete_user(user_id):
     try:
-        has_responses = st.session_state.supabase.table('Responses').select('1').eq('user_id', user_id).execute().data
+        has_responses = get_client().table('Responses').select('1').eq('user_id', user_id).execute().data
         if has_responses:
             st.error("لا يمكن حذف المستخدم لأنه لديه إجابات مسجلة!")
             return False
         
-        st.session_state.supabase.table('Users').delete().eq('user_id', user_id).execute()
+        get_client().table('Users').delete().eq('user_id', user_id).execute()
+        bump_user_version(user_id)
         st.success("تم حذف المستخدم بنجاح")
         return True
     except Exception as e:
@@ -341,7 +329,7 @@ def delete_user(user_id):
 def manage_surveys():
     st.header("إدارة الاستبيانات")
     
-    surveys = st.session_state.supabase.table('Surveys').select('*').execute().data
+    surveys = get_client().table('Surveys').select('*').execute().data
     
     for survey in surveys:
         col1, col2, col3, col4 = st.columns([4, 2, 1, 1])
@@ -361,18 +349,47 @@ def manage_surveys():
     if 'editing_survey' in st.session_state:
         edit_survey(st.session_state.editing_survey)
     
+    if surveys:
+        with st.expander("منح استبيان لجميع موظفي إدارة صحية"):
+            grant_survey_form(surveys)
+    
     with st.expander("إنشاء استبيان جديد"):
         create_survey_form()
 
+def grant_survey_form(surveys):
+    health_admins = get_health_admins_details()
+    if not health_admins:
+        st.warning("لا توجد إدارات صحية متاحة")
+        return
+    
+    with st.form("grant_survey_form"):
+        survey_id = st.selectbox(
+            "الاستبيان",
+            options=[s['survey_id'] for s in surveys],
+            format_func=lambda x: next(s['survey_name'] for s in surveys if s['survey_id'] == x)
+        )
+        admin_id = st.selectbox(
+            "الإدارة الصحية",
+            options=[a['admin_id'] for a in health_admins],
+            format_func=lambda x: next(f"{a['admin_name']} - {a['Governorates']['governorate_name']}" for a in health_admins if a['admin_id'] == x)
+        )
+        
+        if st.form_submit_button("منح الاستبيان"):
+            granted = grant_survey_to_health_admin(survey_id, admin_id)
+            if granted:
+                st.success(f"تم منح الاستبيان لـ {granted} موظف")
+            else:
+                st.info("جميع موظفي الإدارة الصحية لديهم هذا الاستبيان بالفعل")
+
 def edit_survey(survey_id):
-    survey = st.session_state.supabase.table('Surveys').select('*').eq('survey_id', survey_id).execute().data
+    survey = get_client().table('Surveys').select('*').eq('survey_id', survey_id).execute().data
     if not survey:
         st.error("الاستبيان غير موجود!")
         del st.session_state.editing_survey
         return
     
     survey = survey[0]
-    fields = st.session_state.supabase.table('Survey_Fields').select('*').eq('survey_id', survey_id).order('field_order').execute().data
+    fields = get_client().table('Survey_Fields').select('*').eq('survey_id', survey_id).order('field_order').execute().data
     
     if 'new_survey_fields' not in st.session_state:
         st.session_state.new_survey_fields = []
@@ -476,7 +493,7 @@ def create_survey_form():
     if 'create_survey_fields' not in st.session_state:
         st.session_state.create_survey_fields = []
     
-    governorates = get_governorates_list()
+    governorates = get_governorates()
     
     with st.form("create_survey_form"):
         survey_name = st.text_input("اسم الاستبيان")
@@ -529,7 +546,7 @@ def create_survey_form():
                 st.rerun()
 
 def display_survey_data(survey_id):
-    survey = st.session_state.supabase.table('Surveys').select('survey_name').eq('survey_id', survey_id).execute().data
+    survey = get_client().table('Surveys').select('survey_name').eq('survey_id', survey_id).execute().data
     if not survey:
         st.error("الاستبيان المحدد غير موجود")
         return
@@ -537,30 +554,32 @@ def display_survey_data(survey_id):
     survey_name = survey[0]['survey_name']
     st.subheader(f"بيانات الاستبيان: {survey_name}")
 
-    total_responses = st.session_state.supabase.table('Responses').select('*', count='exact').eq('survey_id', survey_id).execute().count
-    if total_responses == 0:
+    stats = get_survey_response_stats(survey_id)
+    if stats['total'] == 0:
         st.info("لا توجد بيانات متاحة لهذا الاستبيان بعد")
         return
 
-    responses = st.session_state.supabase.table('Responses').select('''
-        response_id, 
-        Users(username), 
-        HealthAdministrations(admin_name, Governorates(governorate_name)),
-        submission_date, 
-        is_completed
-    ''').eq('survey_id', survey_id).execute().data
-
-    completed_responses = sum(1 for r in responses if r['is_completed'])
-    regions_count = len(set(r['HealthAdministrations']['admin_name'] for r in responses))
-
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("إجمالي الإجابات", total_responses)
+        st.metric("إجمالي الإجابات", stats['total'])
     with col2:
-        st.metric("الإجابات المكتملة", completed_responses)
+        st.metric("الإجابات المكتملة", stats['completed'])
     with col3:
-        st.metric("عدد المناطق", regions_count)
+        st.metric("المسودات", stats['draft'])
+    with col4:
+        st.metric("عدد المناطق", stats['regions'])
+
+    daily = get_survey_daily_stats(survey_id)
+    if not daily.empty:
+        st.bar_chart(daily[['completed', 'draft']].rename(columns={'completed': 'مكتملة', 'draft': 'مسودة'}))
+
+    if st.button("🔄 إعادة بناء الإحصاءات", key=f"rebuild_rollups_{survey_id}",
+                 help="إعادة حساب الإحصاءات المجمعة لهذا الاستبيان من جدول الإجابات"):
+        if rebuild_response_rollups(survey_id) is not None:
+            st.success("تمت إعادة بناء الإحصاءات بنجاح")
+            st.rerun()
 
+    responses = paginated_responses(survey_id, key=f"admin_responses_{survey_id}")
     df = pd.DataFrame(
         [(r['response_id'], r['Users']['username'], 
           r['HealthAdministrations']['admin_name'], 
@@ -570,63 +589,27 @@ def display_survey_data(survey_id):
         columns=["ID", "المستخدم", "الإدارة الصحية", "المحافظة", "تاريخ التقديم", "الحالة"]
     )
     
-    st.dataframe(df)
+    matrix = get_response_matrix(survey_id, df["ID"].tolist())
+    st.dataframe(df.merge(matrix, left_on="ID", right_index=True, how='left', suffixes=("", " (إجابة)")))
     
     if st.button("تصدير شامل لجميع البيانات إلى Excel", key=f"export_excel_{survey_id}"):
         import re
-        from io import BytesIO
         
         filename = re.sub(r'[^\w\-_]', '_', survey_name) + "_كامل_" + datetime.now().strftime("%Y%m%d_%H%M") + ".xlsx"
         
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='ملخص_الإجابات', index=False)
-            
-            all_details = []
-            for response in responses:
-                details = st.session_state.supabase.table('Response_Details').select('''
-                    Survey_Fields(field_label), 
-                    answer_value,
-                    Responses(Users(username), submission_date, is_completed)
-                ''').eq('response_id', response['response_id']).execute().data
-                
-                for detail in details:
-                    all_details.append({
-                        "ID الإجابة": response['response_id'],
-                        "الحقل": detail['Survey_Fields']['field_label'],
-                        "القيمة": detail['answer_value'],
-                        "أدخلها": detail['Responses']['Users']['username'],
-                        "تاريخ الإدخال": detail['Responses']['submission_date'],
-                        "حالة الإجابة": "مكتملة" if detail['Responses']['is_completed'] else "مسودة"
-                    })
-            
-            if all_details:
-                details_df = pd.DataFrame(all_details)
-                details_df.to_excel(writer, sheet_name='تفاصيل_الإجابات', index=False)
-            
-            fields = st.session_state.supabase.table('Survey_Fields').select('*').eq('survey_id', survey_id).order('field_order').execute().data
-            fields_df = pd.DataFrame(
-                [(f['field_label'], f['field_type'], json.loads(f['field_options']) if f['field_options'] else None, "نعم" if f['is_required'] else "لا") for f in fields],
-                columns=["اسم الحقل", "نوع الحقل", "الخيارات", "مطلوب"]
-            )
-            fields_df.to_excel(writer, sheet_name='حقول_الاستبيان', index=False)
-            
-            users_df = pd.DataFrame(
-                [(r['Users']['username'], r['HealthAdministrations']['admin_name'], 
-                 r['HealthAdministrations']['Governorates']['governorate_name'],
-                 r['submission_date'], "مكتملة" if r['is_completed'] else "مسودة") for r in responses],
-                columns=["المستخدم", "الإدارة الصحية", "المحافظة", "تاريخ التقديم", "الحالة"]
-            )
-            users_df.drop_duplicates().to_excel(writer, sheet_name='المستخدمين', index=False)
-   
-        with open(filename, "rb") as f:
+        try:
+            export = build_survey_export(survey_id)
+        except Exception as e:
+            st.error(f"حدث خطأ في إنشاء ملف Excel: {str(e)}")
+        else:
             st.download_button(
                 label="تنزيل ملف Excel الكامل",
-                data=f,
+                data=export,
                 file_name=filename,
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key=f"download_excel_{survey_id}"
             )
-        st.success("تم إنشاء ملف Excel الشامل بنجاح")
+            st.success("تم إنشاء ملف Excel الشامل بنجاح")
 
     selected_response_id = st.selectbox(
         "اختر إجابة لعرض وتعديل تفاصيلها",
@@ -648,6 +631,7 @@ def display_survey_data(survey_id):
             """)
             
             details = get_response_details(selected_response_id)
+            schema = get_survey_schema(survey_id)
             updates = {}
             
             with st.form(key=f"edit_response_form_{selected_response_id}"):
@@ -659,7 +643,8 @@ def display_survey_data(survey_id):
                         st.markdown(f"**{label}**")
                     with col2:
                         if field_type == 'dropdown':
-                            options_list = json.loads(options) if options else []
+                            field = schema.by_id.get(field_id) if schema else None
+                            options_list = list(field.options) if field else []
                             new_value = st.selectbox(
                                 label,
                                 options_list,
@@ -681,16 +666,9 @@ def display_survey_data(survey_id):
                     save_clicked = st.form_submit_button("💾 حفظ جميع التعديلات")
                     if save_clicked:
                         if updates:
-                            success_count = 0
-                            for detail_id, new_value in updates.items():
-                                if update_response_detail(detail_id, new_value):
-                                    success_count += 1
-                            
-                            if success_count == len(updates):
+                            if update_response_details_bulk(updates, selected_response_id):
                                 st.success("تم تحديث جميع التعديلات بنجاح")
-                            else:
-                                st.error(f"تم تحديث {success_count} من أصل {len(updates)} تعديلات")
-                            st.rerun()
+                                st.rerun()
                         else:
                             st.info("لم تقم بإجراء أي تعديلات")
                 with col2:
@@ -698,10 +676,62 @@ def display_survey_data(survey_id):
                     if cancel_clicked:
                         st.rerun()
 
+def build_survey_export(survey_id):
+    """بناء ملف Excel الشامل للاستبيان في الذاكرة من استعلامات مجمعة
+    
+    يرفع الاستثناء عند فشل جلب الإجابات أو تفاصيلها حتى لا يُصدّر ملف ناقص
+    """
+    from io import BytesIO
+    
+    responses = get_survey_responses(survey_id)
+    schema = get_survey_schema(survey_id)
+    fields = schema.fields if schema else ()
+    
+    responses_df = pd.DataFrame(
+        [(r['response_id'], r['Users']['username'], 
+          r['HealthAdministrations']['admin_name'], 
+          r['HealthAdministrations']['Governorates']['governorate_name'],
+          r['submission_date'], 
+          "مكتملة" if r['is_completed'] else "مسودة") for r in responses],
+        columns=["ID", "المستخدم", "الإدارة الصحية", "المحافظة", "تاريخ التقديم", "الحالة"]
+    )
+    
+    details = get_response_details_bulk(responses_df["ID"].tolist())
+    matrix = build_response_matrix(schema, details, responses_df["ID"].tolist()) if schema else pd.DataFrame()
+    details_df = pd.DataFrame(details, columns=['detail_id', 'response_id', 'field_id', 'answer_value'])
+    field_labels = pd.Series({f.field_id: f.label for f in fields}, dtype=object)
+    details_df = details_df.merge(
+        responses_df[["ID", "المستخدم", "تاريخ التقديم", "الحالة"]],
+        left_on='response_id', right_on="ID", how='left'
+    )
+    details_df = pd.DataFrame({
+        "ID الإجابة": details_df['response_id'],
+        "الحقل": details_df['field_id'].map(field_labels),
+        "القيمة": details_df['answer_value'],
+        "أدخلها": details_df["المستخدم"],
+        "تاريخ الإدخال": details_df["تاريخ التقديم"],
+        "حالة الإجابة": details_df["الحالة"]
+    })
+    
+    fields_df = pd.DataFrame(
+        [(f.label, f.field_type, list(f.options) or None, "نعم" if f.is_required else "لا") for f in fields],
+        columns=["اسم الحقل", "نوع الحقل", "الخيارات", "مطلوب"]
+    )
+    
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        responses_df.to_excel(writer, sheet_name='ملخص_الإجابات', index=False)
+        matrix.to_excel(writer, sheet_name='الإجابات')
+        if not details_df.empty:
+            details_df.to_excel(writer, sheet_name='تفاصيل_الإجابات', index=False)
+        fields_df.to_excel(writer, sheet_name='حقول_الاستبيان', index=False)
+        responses_df.drop(columns=["ID"]).drop_duplicates().to_excel(writer, sheet_name='المستخدمين', index=False)
+    return output.getvalue()
+
 def view_data():
     st.header("عرض البيانات المجمعة")
     
-    surveys = st.session_state.supabase.table('Surveys').select('survey_id, survey_name').order('survey_name').execute().data
+    surveys = get_client().table('Surveys').select('survey_id, survey_name').order('survey_name').execute().data
     
     if not surveys:
         st.warning("لا توجد استبيانات متاحة")
@@ -715,11 +745,45 @@ def view_data():
     )
     
     if selected_survey:
-        display_survey_data(selected_survey['survey_id'])
+        view_mode = st.radio("العرض", ["الإجابات", "تحليلات الحقول"], horizontal=True, key="survey_view_mode")
+        if view_mode == "تحليلات الحقول":
+            display_survey_analytics(selected_survey['survey_id'])
+        else:
+            display_survey_data(selected_survey['survey_id'])
+
+def display_survey_analytics(survey_id):
+    schema = get_survey_schema(survey_id)
+    analytics = get_survey_analytics(survey_id)
+    if not schema or not schema.fields or analytics is None:
+        st.info("لا توجد حقول أو بيانات لتحليلها في هذا الاستبيان")
+        return
+    
+    for field in schema.fields:
+        result = analytics[field.field_id]
+        with st.expander(f"{field.label} ({field.field_type}) - {result['answered']} إجابة"):
+            if not result['answered']:
+                st.info("لا توجد إجابات لهذا الحقل")
+                continue
+            if 'counts' in result:
+                st.bar_chart(result['counts'])
+            if 'summary' in result:
+                summary = result['summary']
+                cols = st.columns(4)
+                cols[0].metric("العدد", int(summary['count']))
+                cols[1].metric("المتوسط", f"{summary['mean']:.2f}")
+                cols[2].metric("الأدنى", f"{summary['min']:g}")
+                cols[3].metric("الأعلى", f"{summary['max']:g}")
+                st.dataframe(
+                    result['quantiles'].rename(lambda q: f"P{int(q * 100)}").to_frame("القيمة").T,
+                    use_container_width=True
+                )
+                st.bar_chart(result['histogram'])
+            if 'series' in result:
+                st.line_chart(result['series'])
 
 def manage_governorates():
     st.header("إدارة المحافظات")
-    governorates = st.session_state.supabase.table('Governorates').select('*').execute().data
+    governorates = get_governorates()
     
     for gov in governorates:
         col1, col2, col3, col4 = st.columns([4, 3, 1, 1])
@@ -747,28 +811,27 @@ def manage_governorates():
             
             if submitted:
                 if governorate_name:
-                    existing = st.session_state.supabase.table('Governorates').select('1').eq('governorate_name', governorate_name).execute().data
+                    existing = get_client().table('Governorates').select('1').eq('governorate_name', governorate_name).execute().data
                     if existing:
                         st.error("هذه المحافظة موجودة بالفعل!")
                     else:
-                        st.session_state.supabase.table('Governorates').insert({
+                        get_client().table('Governorates').insert({
                             'governorate_name': governorate_name,
                             'description': description
                         }).execute()
+                        invalidate_reference_cache()
                         st.success("تمت إضافة المحافظة بنجاح")
                         st.rerun()
                 else:
                     st.warning("يرجى إدخال اسم المحافظة")
 
 def edit_governorate(gov_id):
-    gov = st.session_state.supabase.table('Governorates').select('*').eq('governorate_id', gov_id).execute().data
+    gov = get_governorate(gov_id)
     if not gov:
         st.error("المحافظة غير موجودة")
         del st.session_state.editing_gov
         return
     
-    gov = gov[0]
-    
     with st.form(f"edit_gov_{gov_id}"):
         new_name = st.text_input("اسم المحافظة", value=gov['governorate_name'])
         new_desc = st.text_area("الوصف", value=gov['description'] if gov['description'] else "")
@@ -776,14 +839,15 @@ def edit_governorate(gov_id):
         col1, col2 = st.columns(2)
         with col1:
             if st.form_submit_button("حفظ التعديلات"):
-                existing = st.session_state.supabase.table('Governorates').select('1').eq('governorate_name', new_name).neq('governorate_id', gov_id).execute().data
+                existing = get_client().table('Governorates').select('1').eq('governorate_name', new_name).neq('governorate_id', gov_id).execute().data
                 if existing:
                     st.error("هذا الاسم مستخدم بالفعل لمحافظة أخرى!")
                 else:
-                    st.session_state.supabase.table('Governorates').update({
+                    get_client().table('Governorates').update({
                         'governorate_name': new_name,
                         'description': new_desc
                     }).eq('governorate_id', gov_id).execute()
+                    invalidate_reference_cache()
                     st.success("تم تحديث المحافظة بنجاح")
                     del st.session_state.editing_gov
                     st.rerun()
@@ -794,12 +858,13 @@ def edit_governorate(gov_id):
 
 def delete_governorate(gov_id):
     try:
-        has_regions = st.session_state.supabase.table('HealthAdministrations').select('1').eq('governorate_id', gov_id).execute().data
+        has_regions = get_client().table('HealthAdministrations').select('1').eq('governorate_id', gov_id).execute().data
         if has_regions:
             st.error("لا يمكن حذف المحافظة لأنها تحتوي على إدارات صحية!")
             return False
         
-        st.session_state.supabase.table('Governorates').delete().eq('governorate_id', gov_id).execute()
+        get_client().table('Governorates').delete().eq('governorate_id', gov_id).execute()
+        invalidate_reference_cache()
         st.success("تم حذف المحافظة بنجاح")
         return True
     except Exception as e:
@@ -809,9 +874,7 @@ def delete_governorate(gov_id):
 def manage_regions():
     st.header("إدارة الإدارات الصحية")
     
-    regions = st.session_state.supabase.table('HealthAdministrations').select('''
-        admin_id, admin_name, description, Governorates(governorate_name)
-    ''').execute().data
+    regions = get_health_admins_details()
     
     for reg in regions:
         col1, col2, col3, col4, col5 = st.columns([3, 3, 2, 1, 1])
@@ -833,7 +896,7 @@ def manage_regions():
         edit_health_admin(st.session_state.editing_reg)
     
     with st.expander("إضافة إدارة صحية جديدة"):
-        governorates = get_governorates_list()
+        governorates = get_governorates()
         
         if not governorates:
             st.warning("لا توجد محافظات متاحة. يرجى إضافة محافظة أولاً.")
@@ -851,32 +914,30 @@ def manage_regions():
             
             if submitted:
                 if admin_name:
-                    existing = st.session_state.supabase.table('HealthAdministrations').select('*').eq('admin_name', admin_name).eq('governorate_id', governorate_id).execute().data
+                    existing = get_client().table('HealthAdministrations').select('*').eq('admin_name', admin_name).eq('governorate_id', governorate_id).execute().data
                     if existing:
                         st.error("هذه الإدارة الصحية موجودة بالفعل في هذه المحافظة!")
                     else:
-                        st.session_state.supabase.table('HealthAdministrations').insert({
+                        get_client().table('HealthAdministrations').insert({
                             'admin_name': admin_name,
                             'description': description,
                             'governorate_id': governorate_id
                         }).execute()
+                        invalidate_reference_cache()
                         st.success("تمت إضافة الإدارة الصحية بنجاح")
                         st.rerun()
                 else:
                     st.warning("يرجى إدخال اسم الإدارة الصحية")
 
 def edit_health_admin(admin_id):
-    admin = st.session_state.supabase.table('HealthAdministrations').select('''
-        admin_name, description, governorate_id, Governorates(governorate_name)
-    ''').eq('admin_id', admin_id).execute().data
+    admin = get_health_admin(admin_id)
     
     if not admin:
         st.error("الإدارة الصحية المطلوبة غير موجودة!")
         del st.session_state.editing_reg
         return
     
-    admin = admin[0]
-    governorates = get_governorates_list()
+    governorates = get_governorates()
     
     with st.form(f"edit_admin_{admin_id}"):
         new_name = st.text_input("اسم الإدارة الصحية", value=admin['admin_name'])
@@ -890,15 +951,16 @@ def edit_health_admin(admin_id):
         col1, col2 = st.columns(2)
         with col1:
             if st.form_submit_button("حفظ التعديلات"):
-                existing = st.session_state.supabase.table('HealthAdministrations').select('*').eq('admin_name', new_name).eq('governorate_id', new_gov).neq('admin_id', admin_id).execute().data
+                existing = get_client().table('HealthAdministrations').select('*').eq('admin_name', new_name).eq('governorate_id', new_gov).neq('admin_id', admin_id).execute().data
                 if existing:
                     st.error("هذا الاسم مستخدم بالفعل لإدارة صحية أخرى في هذه المحافظة!")
                 else:
-                    st.session_state.supabase.table('HealthAdministrations').update({
+                    get_client().table('HealthAdministrations').update({
                         'admin_name': new_name,
                         'description': new_desc,
                         'governorate_id': new_gov
                     }).eq('admin_id', admin_id).execute()
+                    invalidate_reference_cache()
                     st.success("تم تحديث الإدارة الصحية بنجاح")
                     del st.session_state.editing_reg
                     st.rerun()
@@ -909,12 +971,13 @@ def edit_health_admin(admin_id):
 
 def delete_health_admin(admin_id):
     try:
-        has_users = st.session_state.supabase.table('Users').select('1').eq('assigned_region', admin_id).execute().data
+        has_users = get_client().table('Users').select('1').eq('assigned_region', admin_id).execute().data
         if has_users:
             st.error("لا يمكن حذف الإدارة الصحية لأنها مرتبطة بمستخدمين!")
             return False
         
-        st.session_state.supabase.table('HealthAdministrations').delete().eq('admin_id', admin_id).execute()
+        get_client().table('HealthAdministrations').delete().eq('admin_id', admin_id).execute()
+        invalidate_reference_cache()
         st.success("تم حذف الإدارة الصحية بنجاح")
         return True
     except Exception as e:
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from database import get_survey_schema, get_survey_answer_values, get_survey_data_version, SurveySchema
+
+# تحليلات توزيع الإجابات لكل حقل حسب نوعه، محسوبة على جميع تفاصيل الإجابات بعمليات pandas/NumPy متجهة
+# قيم الإجابات محفوظة في ذاكرة العملية لكل استبيان، وعند كل عرض تُجلب فقط التفاصيل ذات detail_id أكبر من آخر
+# تفصيل محفوظ. يعاد التحميل كاملاً عند تغير نسخة البيانات أو المخطط، وكل ANALYTICS_FULL_RELOAD_SECONDS
+# لالتقاط تعديلات العمليات الأخرى والمعاملات التي ثُبتت بترتيب detail_id مختلف
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+HISTOGRAM_BINS = 20
+TOP_TEXT_VALUES = 10
+ANALYTICS_CACHE_ENTRIES = 5
+ANALYTICS_FULL_RELOAD_SECONDS = 600
+
+
+def _value_counts(answers: pd.DataFrame) -> Dict[int, pd.Series]:
+    counts = answers.groupby(['field_id', 'answer_value'], sort=False).size()
+    return {field_id: group.droplevel(0).sort_values(ascending=False)
+            for field_id, group in counts.groupby(level=0, sort=False)}
+
+
+def compute_field_analytics(schema: SurveySchema, answers: pd.DataFrame) -> Dict[int, Dict]:
+    """حساب توزيع الإجابات لكل حقل في الاستبيان
+
+    answers: إطار بيانات بالأعمدة field_id و answer_value لجميع تفاصيل الإجابات
+    """
+    field_types = pd.Series({f.field_id: f.field_type for f in schema.fields}, dtype=object)
+    answers = answers[answers['answer_value'].notna() & (answers['answer_value'] != '')]
+    types = answers['field_id'].map(field_types)
+    results: Dict[int, Dict] = {f.field_id: {'type': f.field_type, 'answered': 0} for f in schema.fields}
+    for field_id, answered in answers.groupby('field_id').size().items():
+        if field_id in results:
+            results[field_id]['answered'] = int(answered)
+
+    # القوائم المنسدلة وخانات الاختيار: عدد كل قيمة (مع الخيارات التي لم يخترها أحد)
+    for field_id, counts in _value_counts(answers[types.isin(['dropdown', 'checkbox'])]).items():
+        field = schema.by_id[field_id]
+        if field.field_type == 'checkbox':
+            counts = counts.rename({'True': 'نعم', 'False': 'لا'})
+        elif field.options:
+            counts = counts.reindex(list(dict.fromkeys(list(field.options) + list(counts.index))), fill_value=0)
+        results[field_id]['counts'] = counts
+
+    # الحقول النصية: أكثر القيم تكراراً
+    for field_id, counts in _value_counts(answers[types == 'text']).items():
+        results[field_id]['counts'] = counts.head(TOP_TEXT_VALUES)
+
+    # الحقول الرقمية: المئينات والإحصاءات الأساسية والمدرج التكراري
+    numbers = pd.DataFrame({
+        'field_id': answers['field_id'][types == 'number'],
+        'value': pd.to_numeric(answers['answer_value'][types == 'number'], errors='coerce')
+    }).dropna()
+    if not numbers.empty:
+        grouped = numbers.groupby('field_id')['value']
+        quantiles = grouped.quantile(QUANTILES).unstack()
+        summary = grouped.agg(['count', 'mean', 'min', 'max'])
+        for field_id, values in grouped:
+            counts, edges = np.histogram(values.to_numpy(), bins=HISTOGRAM_BINS)
+            results[field_id]['summary'] = summary.loc[field_id]
+            results[field_id]['quantiles'] = quantiles.loc[field_id]
+            results[field_id]['histogram'] = pd.Series(
+                counts, index=pd.Index(np.round((edges[:-1] + edges[1:]) / 2, 2), name='القيمة')
+            )
+
+    # حقول التاريخ: عدد الإجابات لكل يوم
+    dates = pd.DataFrame({
+        'field_id': answers['field_id'][types == 'date'],
+        'value': pd.to_datetime(answers['answer_value'][types == 'date'], errors='coerce')
+    }).dropna()
+    if not dates.empty:
+        per_day = dates.groupby(['field_id', pd.Grouper(key='value', freq='D')]).size()
+        for field_id, series in per_day.groupby(level=0):
+            results[field_id]['series'] = series.droplevel(0)
+
+    return results
+
+
+@dataclass(frozen=True)
+class _SurveyAnswers:
+    data_version: Tuple[int, int]
+    loaded_at: float
+    last_detail_id: int
+    answers: pd.DataFrame
+    results: Dict[int, Dict]
+
+
+_answers: 'OrderedDict[int, _SurveyAnswers]' = OrderedDict()
+_answers_lock = threading.Lock()
+_survey_locks: Dict[int, threading.Lock] = {}
+
+
+def _survey_lock(survey_id: int) -> threading.Lock:
+    with _answers_lock:
+        return _survey_locks.setdefault(survey_id, threading.Lock())
+
+
+def _refresh(schema: SurveySchema, cached: Optional[_SurveyAnswers], data_version: Tuple[int, int]) -> _SurveyAnswers:
+    field_ids = [f.field_id for f in schema.fields]
+    if (cached is None or cached.data_version != data_version or
+            time.monotonic() - cached.loaded_at > ANALYTICS_FULL_RELOAD_SECONDS):
+        answers = get_survey_answer_values(field_ids)
+        loaded_at = time.monotonic()
+    else:
+        new = get_survey_answer_values(field_ids, after_detail_id=cached.last_detail_id)
+        if new.empty:
+            return cached
+        answers = pd.concat([cached.answers, new], ignore_index=True)
+        loaded_at = cached.loaded_at
+    last_detail_id = int(answers['detail_id'].max()) if not answers.empty else 0
+    return _SurveyAnswers(data_version, loaded_at, last_detail_id, answers, compute_field_analytics(schema, answers))
+
+
+def get_survey_analytics(survey_id: int) -> Optional[Dict[int, Dict]]:
+    """تحليلات الاستبيان، بجلب تفاصيل الإجابات الجديدة فقط منذ آخر حساب"""
+    schema = get_survey_schema(survey_id)
+    if schema is None:
+        return None
+    with _survey_lock(survey_id):
+        with _answers_lock:
+            cached = _answers.get(survey_id)
+        try:
+            with st.spinner("جاري حساب التحليلات..."):
+                current = _refresh(schema, cached, get_survey_data_version(survey_id))
+        except Exception as e:
+            # لا يتم حفظ نتائج محسوبة على بيانات ناقصة
+            st.error(f"حدث خطأ في جلب قيم الإجابات: {str(e)}")
+            return None
+        with _answers_lock:
+            _answers[survey_id] = current
+            _answers.move_to_end(survey_id)
+            while len(_answers) > ANALYTICS_CACHE_ENTRIES:
+                _answers.popitem(last=False)
+    return current.results
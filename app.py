@@ -1,11 +1,10 @@
 import streamlit as st
 from datetime import datetime, timedelta 
-from auth import authenticate, logout
+from auth import authenticate, logout, get_session_identity
 from admin_views import show_admin_dashboard
 from employee_views import show_employee_dashboard
 from governorate_admin_views import show_governorate_admin_dashboard
-from database import get_user_role
-from supabase import create_client, Client
+from instrumentation import start_query_log, render_query_panel
 
 
 def main():
@@ -14,19 +13,26 @@ def main():
     # التحقق من حالة الجلسة
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
+    
+    start_query_log()
         
     if authenticate():  # إذا كان مسجل الدخول
         # تحديث وقت النشاط عند كل تفاعل
         st.session_state.last_activity = datetime.now()
         
-        # عرض واجهة المستخدم حسب الدور
-        user_role = get_user_role(st.session_state.user_id)
+        # عرض واجهة المستخدم حسب الدور المحفوظ في الجلسة
+        identity = get_session_identity()
+        if identity is None:
+            logout()
+            return
+        user_role = identity['role']
         
         # زر تسجيل الخروج
         st.sidebar.button("تسجيل الخروج", on_click=logout)
         
         if user_role == 'admin':
             show_admin_dashboard()
+            render_query_panel()
         elif user_role == 'governorate_admin':
             show_governorate_admin_dashboard()
         else:
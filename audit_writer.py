@@ -0,0 +1,135 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# كاتب سجل التعديلات في الخلفية: الطلب يضيف السجل إلى طابور محدود فقط،
+# وخيط منفصل يدرج السجلات على دفعات كل AUDIT_BATCH_SIZE سجل أو كل AUDIT_FLUSH_INTERVAL_MS
+# الدفعة التي يفشل إدراجها يعاد إدراجها بتأخير متزايد حتى تنجح، وخلال ذلك يمتلئ الطابور
+# فيكتب المستدعون سجلاتهم مباشرة (الحد الأقصى للذاكرة هو حجم الطابور)
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = 50
+AUDIT_FLUSH_INTERVAL_MS = 1000
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_ENQUEUE_TIMEOUT = 2.0
+AUDIT_RETRY_DELAY = 0.5
+AUDIT_RETRY_MAX_DELAY = 30.0
+AUDIT_CLOSE_RETRIES = 3
+
+_STOP = object()
+
+
+class AuditWriter:
+    """طابور محدود وخيط تفريغ يكتب سجلات التعديلات على دفعات"""
+
+    def __init__(self, write_batch: Callable[[List[Dict]], None],
+                 batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS,
+                 max_queue: int = AUDIT_QUEUE_SIZE,
+                 enqueue_timeout: float = AUDIT_ENQUEUE_TIMEOUT,
+                 retry_delay: float = AUDIT_RETRY_DELAY,
+                 retry_max_delay: float = AUDIT_RETRY_MAX_DELAY):
+        self._write_batch = write_batch
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._enqueue_timeout = enqueue_timeout
+        self._retry_delay = retry_delay
+        self._retry_max_delay = retry_max_delay
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: Dict):
+        """إضافة سجل إلى الطابور
+
+        عند امتلاء الطابور ينتظر المستدعي حتى enqueue_timeout (ضغط عكسي)،
+        ثم يكتب السجل بنفسه بدلاً من فقدانه
+        """
+        try:
+            self._queue.put(record, timeout=self._enqueue_timeout)
+        except queue.Full:
+            self._write([record], attempts=AUDIT_CLOSE_RETRIES)
+
+    def _write(self, batch: List[Dict], attempts: Optional[int] = None):
+        """إدراج الدفعة مع إعادة المحاولة بتأخير متزايد
+
+        attempts = None: إعادة المحاولة حتى النجاح (خيط التفريغ) ما لم يبدأ الإغلاق،
+        وعند استنفاد المحاولات تُسجل السجلات كاملة في سجل الأخطاء حتى يمكن استعادتها
+        """
+        delay, attempt = self._retry_delay, 0
+        while True:
+            attempt += 1
+            try:
+                with self._write_lock:
+                    self._write_batch(batch)
+                return
+            except Exception:
+                logger.exception("تعذر كتابة %d من سجلات التعديلات (المحاولة %d)", len(batch), attempt)
+            limit = AUDIT_CLOSE_RETRIES if self._stopping.is_set() else attempts
+            if limit is not None and attempt >= limit:
+                logger.error("سجلات تعديلات لم تتم كتابتها: %s", json.dumps(batch, ensure_ascii=False, default=str))
+                return
+            self._stopping.wait(delay)
+            delay = min(delay * 2, self._retry_max_delay)
+
+    def _run(self):
+        batch: List[Dict] = []
+        deadline: Optional[float] = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                if batch:
+                    self._write(batch)
+                return
+            if record is not None:
+                batch.append(record)
+                if deadline is None:
+                    deadline = time.monotonic() + self._flush_interval
+
+            if batch and (len(batch) >= self._batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def close(self, timeout: float = 10.0):
+        """تفريغ السجلات المتبقية وإيقاف الخيط (يُستدعى تلقائياً عند إغلاق العملية)"""
+        if not self._thread.is_alive():
+            return
+        self._stopping.set()
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # خيط التفريغ متوقف عند دفعة لم تكتمل: تُكتب السجلات المتبقية في الطابور مباشرة
+            pending = self._drain()
+            logger.warning("طابور سجلات التعديلات ممتلئ عند الإغلاق، كتابة %d سجل مباشرة", len(pending))
+            for start in range(0, len(pending), self._batch_size):
+                self._write(pending[start:start + self._batch_size], attempts=AUDIT_CLOSE_RETRIES)
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                logger.error("تعذر إيقاف خيط سجلات التعديلات، %d سجل في الطابور", self._queue.qsize())
+                return
+        self._thread.join(timeout)
+
+    def _drain(self) -> List[Dict]:
+        """سحب جميع السجلات الموجودة في الطابور"""
+        records = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                return records
+            if record is not _STOP:
+                records.append(record)
@@ -1,7 +1,14 @@
 import streamlit as st
 import hashlib
 from datetime import datetime, timedelta
-from database import get_user_by_username, update_last_login
+from database import (
+    get_user_by_username,
+    update_last_login,
+    build_user_identity,
+    get_user_identity,
+    get_user_version,
+    USER_IDENTITY_TTL
+)
 
 def authenticate():
     if 'authenticated' in st.session_state and st.session_state.authenticated:
@@ -26,10 +33,7 @@ def authenticate():
             user = get_user_by_username(username)
             if user and check_password(user['password_hash'], password):
                 st.session_state.authenticated = True
-                st.session_state.user_id = user['user_id']
-                st.session_state.username = user['username']
-                st.session_state.role = user['role']
-                st.session_state.region_id = user['assigned_region']
+                set_session_identity(build_user_identity(user))
                 st.session_state.last_activity = datetime.now()
                 st.session_state.login_time = datetime.now()
                 update_last_login(user['user_id'])
@@ -39,6 +43,38 @@ def authenticate():
                 st.error("اسم المستخدم أو كلمة المرور غير صحيحة")
     return False
 
+def set_session_identity(identity: dict):
+    """حفظ هوية المستخدم في الجلسة مع رقم نسختها ووقت تحميلها"""
+    st.session_state.identity = {
+        **identity,
+        'version': get_user_version(identity['user_id']),
+        'loaded_at': datetime.now()
+    }
+    st.session_state.user_id = identity['user_id']
+    st.session_state.username = identity['username']
+    st.session_state.role = identity['role']
+    st.session_state.region_id = identity['region_id']
+    st.session_state.governorate_id = identity['governorate_id']
+
+def get_session_identity():
+    """هوية المستخدم من الجلسة، ويعاد تحميلها فقط إذا تغيرت نسختها أو انتهت صلاحيتها"""
+    identity = st.session_state.get('identity')
+    if identity is None:
+        return None
+    
+    stale = (identity['version'] != get_user_version(identity['user_id']) or
+             datetime.now() - identity['loaded_at'] > timedelta(seconds=USER_IDENTITY_TTL))
+    if stale:
+        try:
+            fresh = get_user_identity(identity['user_id'])
+        except Exception:
+            # خطأ عابر في الاتصال: الإبقاء على الهوية الحالية وإعادة المحاولة في التشغيل التالي
+            return identity
+        if fresh is None:
+            return None
+        set_session_identity(fresh)
+    return st.session_state.identity
+
 def check_password(hashed_password, user_password):
     return hashed_password == hash_password(user_password)
 
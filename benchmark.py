@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# مولد بيانات اصطناعية وقياس أداء طبقة البيانات على الواجهة المحلية (local_backend)
+# مثال: python benchmark.py --scale 100k --output bench.json
+
+SCALES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+
+def seed(client, detail_rows: int, fields_per_survey: int = 20, surveys: int = 5,
+         governorates: int = 27, admins_per_governorate: int = 10, seed_value: int = 42) -> dict:
+    """تعبئة قاعدة البيانات ببيانات اصطناعية قابلة للتكرار"""
+    rng = random.Random(seed_value)
+    conn = client.conn
+    responses = max(1, detail_rows // fields_per_survey)
+    users = max(50, responses // 20)
+    now = datetime.now()
+
+    conn.executemany('insert into Governorates (governorate_id, governorate_name, description) values (?, ?, ?)',
+                     [(g, f'محافظة {g}', None) for g in range(1, governorates + 1)])
+    admin_ids = range(1, governorates * admins_per_governorate + 1)
+    conn.executemany('insert into HealthAdministrations (admin_id, admin_name, governorate_id) values (?, ?, ?)',
+                     [(a, f'إدارة {a}', (a - 1) // admins_per_governorate + 1) for a in admin_ids])
+
+    password_hash = hashlib.sha256(b'password').hexdigest()
+    user_rows = [(1, 'admin', password_hash, 'admin', None)]
+    user_rows += [(u, f'employee{u}', password_hash, 'employee', rng.choice(admin_ids)) for u in range(2, users + 1)]
+    conn.executemany('insert into Users (user_id, username, password_hash, role, assigned_region) values (?, ?, ?, ?, ?)', user_rows)
+    user_region = {u[0]: u[4] for u in user_rows}
+
+    field_types = ['text', 'number', 'dropdown', 'checkbox', 'date']
+    field_rows = []
+    for s in range(1, surveys + 1):
+        conn.execute('insert into Surveys (survey_id, survey_name, created_by) values (?, ?, 1)', (s, f'استبيان {s}'))
+        conn.executemany('insert into SurveyGovernorate (survey_id, governorate_id) values (?, ?)',
+                         [(s, g) for g in range(1, governorates + 1)])
+        for i in range(fields_per_survey):
+            field_type = field_types[i % len(field_types)]
+            options = json.dumps(['أ', 'ب', 'ج']) if field_type == 'dropdown' else None
+            field_rows.append(((s - 1) * fields_per_survey + i + 1, s, f'حقل {i + 1}', field_type, options, i % 3 == 0, i + 1))
+    conn.executemany('insert into Survey_Fields (field_id, survey_id, field_label, field_type, field_options, is_required, field_order) '
+                     'values (?, ?, ?, ?, ?, ?, ?)', field_rows)
+    conn.executemany('insert into UserSurveys (user_id, survey_id) values (?, ?)',
+                     [(u, s) for u in range(2, users + 1) for s in range(1, surveys + 1)])
+
+    answers = {
+        'text': lambda: rng.choice(['نعم', 'لا', 'ربما']),
+        'number': lambda: str(rng.randint(0, 500)),
+        'dropdown': lambda: rng.choice(['أ', 'ب', 'ج']),
+        'checkbox': lambda: rng.choice(['True', 'False']),
+        'date': lambda: (now - timedelta(days=rng.randint(0, 365))).strftime('%Y-%m-%d'),
+    }
+    response_rows, detail_batch = [], []
+    completed_days = set()
+    for r in range(1, responses + 1):
+        survey_id = rng.randint(1, surveys)
+        user_id = rng.randint(2, users)
+        submitted = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        # إجابة مكتملة واحدة لكل مستخدم واستبيان ويوم (responses_one_completed_per_day_idx)
+        day_key = (user_id, survey_id, submitted.date())
+        is_completed = rng.random() < 0.8 and day_key not in completed_days
+        if is_completed:
+            completed_days.add(day_key)
+        response_rows.append((r, survey_id, user_id, user_region[user_id],
+                              submitted.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3], is_completed))
+        for field_id, _, _, field_type, _, _, _ in field_rows[(survey_id - 1) * fields_per_survey:survey_id * fields_per_survey]:
+            detail_batch.append((r, field_id, answers[field_type]()))
+        if len(detail_batch) >= 50_000 or r == responses:
+            conn.executemany('insert into Responses (response_id, survey_id, user_id, region_id, submission_date, is_completed) '
+                             'values (?, ?, ?, ?, ?, ?)', response_rows)
+            conn.executemany('insert into Response_Details (response_id, field_id, answer_value) values (?, ?, ?)', detail_batch)
+            response_rows, detail_batch = [], []
+
+    audit_rows = max(100, detail_rows // 10)
+    conn.executemany('insert into AuditLog (user_id, action_type, table_name, record_id, old_value, new_value, action_timestamp) '
+                     'values (?, ?, ?, ?, ?, ?, ?)',
+                     [(1, rng.choice(['UPDATE', 'DELETE', 'INSERT']), rng.choice(['Users', 'Surveys', 'Response_Details']),
+                       rng.randint(1, responses), json.dumps({'answer_value': str(i)}), json.dumps({'answer_value': str(i + 1)}),
+                       (now - timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]) for i in range(audit_rows)])
+    conn.commit()
+
+    return {
+        'governorates': governorates,
+        'health_administrations': len(admin_ids),
+        'users': users,
+        'surveys': surveys,
+        'fields': len(field_rows),
+        'responses': responses,
+        'response_details': responses * fields_per_survey,
+        'audit_log': audit_rows,
+    }
+
+
+def measure(client, func, repeat: int) -> dict:
+    """قياس زمن التنفيذ وعدد الطلبات إلى قاعدة البيانات لكل استدعاء"""
+    timings, round_trips = [], []
+    for _ in range(repeat):
+        before = client.round_trips
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+        round_trips.append(client.round_trips - before)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'round_trips': max(round_trips),
+        'result_size': len(result) if hasattr(result, '__len__') else None,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس أداء طبقة البيانات على بيانات اصطناعية")
+    parser.add_argument('--scale', default='1k', help=f"عدد صفوف Response_Details: {', '.join(SCALES)} أو رقم")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help="ملف SQLite (افتراضياً ملف مؤقت جديد)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    detail_rows = SCALES.get(args.scale.lower()) or int(args.scale)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='survey_bench_'), 'bench.db')
+    os.environ['DB_BACKEND'] = 'sqlite'
+    os.environ['SQLITE_PATH'] = db_path
+
+    import database
+    import admin_views
+
+    client = database.get_client()
+    start = time.perf_counter()
+    counts = seed(client, detail_rows, seed_value=args.seed)
+    seed_seconds = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    sample_response = rng.randint(1, counts['responses'])
+    sample_user = rng.randint(2, counts['users'])
+    sample_survey = rng.randint(1, counts['surveys'])
+
+    cases = {
+        'get_survey_fields': lambda: database.get_survey_fields(sample_survey),
+        'get_response_details': lambda: database.get_response_details(sample_response),
+        'get_audit_logs': lambda: database.get_audit_logs(),
+        'get_audit_logs_search': lambda: database.get_audit_logs(search_query='15'),
+        'get_audit_logs_page_search': lambda: database.get_audit_logs_page(search_query='15')[0],
+        'get_survey_response_stats': lambda: database.get_survey_response_stats(sample_survey),
+        'get_survey_daily_stats': lambda: database.get_survey_daily_stats(sample_survey),
+        'has_completed_survey_today': lambda: database.has_completed_survey_today(sample_user, sample_survey),
+        'get_governorate_employees': lambda: database.get_governorate_employees(1),
+        'display_survey_data_export': lambda: admin_views.build_survey_export(sample_survey),
+    }
+
+    results = {}
+    for name, func in cases.items():
+        results[name] = measure(client, func, args.repeat)
+        print(f"{name:32s} {results[name]['median_ms']:>12.2f} ms  {results[name]['round_trips']:>6d} طلب", file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(),
+        'scale': detail_rows,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'seed_seconds': round(seed_seconds, 3),
+        'rows': counts,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"تم حفظ النتائج في {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,198 @@
 import os
-from st_supabase_connection import SupabaseConnection
-from typing import List, Dict, Optional, Tuple, Any, Union
+from typing import List, Dict, Optional, Tuple, Any, Union, FrozenSet, Mapping
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import threading
+import inspect
+from functools import wraps
+from dataclasses import dataclass
+from types import MappingProxyType
+import pandas as pd
 from pathlib import Path
+from instrumentation import InstrumentedClient, current_query_log
+from audit_writer import AuditWriter
 
 
 
 
-conn = st.connection(
-    "st.session_state.supabase",
-    type=st.session_state.supabaseConnection,
-    url=st.secrets["st.session_state.supabase_URL"],
-    key=st.secrets["st.session_state.supabase_KEY"]
-)
+def get_setting(name: str, default: Any = None) -> Any:
+    """قراءة إعداد من متغيرات البيئة أولاً ثم من st.secrets"""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+# عملاء قاعدة البيانات مشتركون على مستوى العملية بين جميع الجلسات والخيوط
+_clients: Dict[Tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+def _shared_client(key: Tuple, factory) -> Any:
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+def _create_local_client(path: str):
+    from local_backend import LocalClient
+    return LocalClient(path)
+
+def _create_supabase_client(url: str, key: str):
+    """إنشاء عميل Supabase مع مجمع اتصالات httpx دائم (keep-alive)
+    
+    حدود المجمع والمهلة قابلة للضبط: DB_POOL_MAX_CONNECTIONS و DB_POOL_MAX_KEEPALIVE
+    و DB_POOL_KEEPALIVE_EXPIRY و DB_TIMEOUT
+    """
+    import httpx
+    from supabase import create_client
+    
+    client = create_client(url, key)
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = httpx.Client(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=httpx.Timeout(float(get_setting('DB_TIMEOUT', 10))),
+        limits=httpx.Limits(
+            max_connections=int(get_setting('DB_POOL_MAX_CONNECTIONS', 100)),
+            max_keepalive_connections=int(get_setting('DB_POOL_MAX_KEEPALIVE', 20)),
+            keepalive_expiry=float(get_setting('DB_POOL_KEEPALIVE_EXPIRY', 30))
+        ),
+        follow_redirects=True
+    )
+    default_session.close()
+    return client
+
+def _get_base_client():
+    if get_setting('DB_BACKEND', 'supabase') == 'sqlite':
+        path = get_setting('SQLITE_PATH', 'local.db')
+        return _shared_client(('sqlite', path), lambda: _create_local_client(path))
+    url, key = get_setting('SUPABASE_URL'), get_setting('SUPABASE_KEY')
+    return _shared_client(('supabase', url), lambda: _create_supabase_client(url, key))
+
+def _create_supabase_realtime(url: str, key: str):
+    from realtime_feed import SupabaseRealtime
+    return SupabaseRealtime(url, key)
+
+def get_realtime():
+    """ناشر التغييرات اللحظية المشترك حسب الإعداد DB_BACKEND
+    
+    supabase: قناة Realtime عبر realtime-py (realtime_feed.SupabaseRealtime)
+    sqlite: الناشر المحلي البديل local_backend.LocalRealtime الخاص بعميل SQLite
+    """
+    if get_setting('DB_BACKEND', 'supabase') == 'sqlite':
+        return _get_base_client().realtime
+    url, key = get_setting('SUPABASE_URL'), get_setting('SUPABASE_KEY')
+    return _shared_client(('realtime', url), lambda: _create_supabase_realtime(url, key))
+
+def get_client():
+    """عميل قاعدة البيانات المشترك حسب الإعداد DB_BACKEND
+    
+    supabase (الافتراضي): عميل Supabase واحد للعملية بمجمع اتصالات مشترك
+    sqlite: الواجهة المحلية local_backend.LocalClient على الملف SQLITE_PATH
+    """
+    client = _get_base_client()
+    
+    # تسجيل الاستعلامات عند تفعيل لوحة الاستعلامات (انظر instrumentation.py)
+    log = current_query_log()
+    return InstrumentedClient(client, log) if log is not None else client
 
 def init_db():
     pass 
 
+# سجل التعديلات يُكتب في الخلفية على دفعات (audit_writer.py) فلا يضيف زمناً لطلب المستخدم
+_audit_writer: Optional[AuditWriter] = None
+_audit_writer_lock = threading.Lock()
+
+# معاملات لا تُحفظ في سجل التعديلات
+AUDIT_EXCLUDED_ARGS = {'password'}
+
+def _write_audit_batch(batch: List[Dict]):
+    _get_base_client().table('AuditLog').insert(batch).execute()
+
+def get_audit_writer() -> AuditWriter:
+    global _audit_writer
+    with _audit_writer_lock:
+        if _audit_writer is None:
+            _audit_writer = AuditWriter(_write_audit_batch)
+        return _audit_writer
+
+def audited(action_type: str, table_name: str, record_arg: Optional[str] = None):
+    """تسجيل استدعاءات دوال التعديل الناجحة في سجل التعديلات تلقائياً
+    
+    record_arg: اسم المعامل الذي يحمل رقم السجل المعدل، وتُحفظ بقية المعاملات في new_value
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if result:
+                arguments = signature.bind(*args, **kwargs).arguments
+                values = {k: v for k, v in arguments.items() if k not in AUDIT_EXCLUDED_ARGS}
+                log_audit_action(st.session_state.get('user_id'), action_type, table_name,
+                                 values.get(record_arg) if record_arg else None, new_value=values)
+            return result
+        return wrapper
+    return decorator
+
 
 def get_user_by_username(username: str) -> Optional[Dict]:
     try:
-        response = st.session_state.supabase.table('Users').select('*, HealthAdministrations(admin_name), GovernorateAdmins(Governorates(governorate_name))').eq('username', username).execute()
+        response = get_client().table('Users').select('*, HealthAdministrations(admin_name), GovernorateAdmins(governorate_id, Governorates(governorate_name))').eq('username', username).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return None
 
+def get_users_overview() -> List[Dict]:
+    """استرجاع جميع المستخدمين مع المحافظة والإدارة الصحية في استعلام واحد"""
+    try:
+        response = get_client().table('Users').select('user_id, username, role, assigned_region, GovernorateAdmins(Governorates(governorate_name))').order('user_id').execute()
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب المستخدمين: {str(e)}")
+        return []
+    
+    admins = {a['admin_id']: a for a in get_health_admins_details()}
+    users_data = []
+    for user in response.data:
+        governorate_name = ""
+        admin_name = ""
+        
+        if user['role'] == 'governorate_admin':
+            gov_admin = user.get('GovernorateAdmins') or []
+            if gov_admin and gov_admin[0].get('Governorates'):
+                governorate_name = gov_admin[0]['Governorates']['governorate_name']
+        elif user['role'] == 'employee' and user['assigned_region']:
+            health_admin = admins.get(user['assigned_region'])
+            if health_admin:
+                admin_name = health_admin['admin_name']
+                governorate_name = health_admin['Governorates']['governorate_name']
+            else:
+                admin_name = "غير معروف"
+        
+        users_data.append({
+            'user_id': user['user_id'],
+            'username': user['username'],
+            'role': user['role'],
+            'governorate_name': governorate_name,
+            'admin_name': admin_name
+        })
+    return users_data
+
 def get_user_role(user_id: int) -> Optional[str]:
     """الحصول على دور المستخدم"""
     try:
-        response = st.session_state.supabase.table('Users').select('role').eq('user_id', user_id).execute()
+        response = get_client().table('Users').select('role').eq('user_id', user_id).execute()
         return response.data[0]['role'] if response.data else None
     except Exception as e:
         st.error(f"حدث خطأ في جلب دور المستخدم: {str(e)}")
         return None
 
+@audited('INSERT', 'Users')
 def add_user(username: str, password: str, role: str, region_id: Optional[int] = None) -> bool:
     """إضافة مستخدم جديد"""
     from auth import hash_password
@@ -47,12 +203,13 @@ def add_user(username: str, password: str, role: str, region_id: Optional[int] =
             'role': role,
             'assigned_region': region_id
         }
-        response = st.session_state.supabase.table('Users').insert(data).execute()
+        response = get_client().table('Users').insert(data).execute()
         return bool(response.data)
     except Exception as e:
         st.error(f"حدث خطأ في إضافة المستخدم: {str(e)}")
         return False
 
+@audited('UPDATE', 'Users', 'user_id')
 def update_user(user_id: int, username: str, role: str, region_id: Optional[int] = None) -> bool:
     """تحديث بيانات المستخدم"""
     try:
@@ -61,83 +218,168 @@ def update_user(user_id: int, username: str, role: str, region_id: Optional[int]
             'role': role,
             'assigned_region': region_id
         }
-        response = st.session_state.supabase.table('Users').update(data).eq('user_id', user_id).execute()
+        response = get_client().table('Users').update(data).eq('user_id', user_id).execute()
+        bump_user_version(user_id)
         return bool(response.data)
     except Exception as e:
         st.error(f"حدث خطأ في تحديث المستخدم: {str(e)}")
         return False
 
-def get_health_admins() -> List[Tuple[int, str]]:
-    """استرجاع جميع الإدارات الصحية"""
+# هوية المستخدم (الدور، الإدارة الصحية، المحافظة) تُحمّل مرة واحدة عند تسجيل الدخول وتُحفظ في الجلسة
+# رقم النسخة يزداد عند أي تعديل على المستخدم فتعيد جلساته المفتوحة تحميل هويتها،
+# و USER_IDENTITY_TTL يغطي التعديلات التي تتم من عملية خادم أخرى
+USER_IDENTITY_TTL = 300
+_user_versions: Dict[int, int] = {}
+_user_versions_lock = threading.Lock()
+
+def bump_user_version(user_id: int):
+    """إبطال هوية المستخدم المحفوظة في جميع جلساته بعد تعديله"""
+    with _user_versions_lock:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+
+def get_user_version(user_id: int) -> int:
+    return _user_versions.get(user_id, 0)
+
+def build_user_identity(user: Dict) -> Dict:
+    """بناء هوية المستخدم من صف Users مع GovernorateAdmins(governorate_id)"""
+    gov_admins = user.get('GovernorateAdmins') or []
+    return {
+        'user_id': user['user_id'],
+        'username': user['username'],
+        'role': user['role'],
+        'region_id': user['assigned_region'],
+        'governorate_id': gov_admins[0]['governorate_id'] if gov_admins else None
+    }
+
+def get_user_identity(user_id: int) -> Optional[Dict]:
+    """جلب هوية المستخدم من قاعدة البيانات باستعلام واحد
+    
+    يعيد None فقط إذا لم يعد المستخدم موجوداً، ويرفع الاستثناء عند فشل الاتصال
+    حتى يميز المستدعي بين حذف المستخدم والخطأ العابر
+    """
+    response = get_client().table('Users').select('user_id, username, role, assigned_region, GovernorateAdmins(governorate_id)').eq('user_id', user_id).execute()
+    return build_user_identity(response.data[0]) if response.data else None
+
+# ذاكرة مؤقتة مشتركة بين جميع الجلسات للبيانات المرجعية (المحافظات والإدارات الصحية)
+# يتم إبطالها صراحة عند أي تعديل عبر invalidate_reference_cache
+REFERENCE_CACHE_TTL = 600
+
+@st.cache_data(ttl=REFERENCE_CACHE_TTL, show_spinner=False)
+def _load_governorates() -> List[Dict]:
+    response = get_client().table('Governorates').select('governorate_id, governorate_name, description').order('governorate_id').execute()
+    return response.data
+
+@st.cache_data(ttl=REFERENCE_CACHE_TTL, show_spinner=False)
+def _load_health_admins() -> List[Dict]:
+    response = get_client().table('HealthAdministrations').select('admin_id, admin_name, description, governorate_id, Governorates(governorate_name)').order('admin_id').execute()
+    return response.data
+
+def invalidate_reference_cache():
+    """إبطال الذاكرة المؤقتة للمحافظات والإدارات الصحية بعد أي تعديل"""
+    _load_governorates.clear()
+    _load_health_admins.clear()
+    # الإطارات المتابعة لحظياً تحمل قائمة إدارات المحافظة (realtime_feed.py)
+    from realtime_feed import close_response_feeds
+    close_response_feeds()
+
+def get_governorates() -> List[Dict]:
+    """استرجاع جميع المحافظات من الذاكرة المؤقتة"""
+    try:
+        return _load_governorates()
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب المحافظات: {str(e)}")
+        return []
+
+def get_governorate(governorate_id: int) -> Optional[Dict]:
+    """استرجاع بيانات محافظة واحدة من الذاكرة المؤقتة"""
+    return next((g for g in get_governorates() if g['governorate_id'] == governorate_id), None)
+
+def get_health_admins_details() -> List[Dict]:
+    """استرجاع جميع الإدارات الصحية مع محافظاتها من الذاكرة المؤقتة"""
     try:
-        response = st.session_state.supabase.table('HealthAdministrations').select('admin_id, admin_name').execute()
-        return [(item['admin_id'], item['admin_name']) for item in response.data]
+        return _load_health_admins()
     except Exception as e:
         st.error(f"حدث خطأ في جلب الإدارات الصحية: {str(e)}")
         return []
 
+def get_health_admin(admin_id: int) -> Optional[Dict]:
+    """استرجاع بيانات إدارة صحية واحدة من الذاكرة المؤقتة"""
+    return next((a for a in get_health_admins_details() if a['admin_id'] == admin_id), None)
+
+def get_health_admins_by_governorate(governorate_id: int) -> List[Dict]:
+    """استرجاع الإدارات الصحية التابعة لمحافظة معينة"""
+    return [a for a in get_health_admins_details() if a['governorate_id'] == governorate_id]
+
+def get_health_admins() -> List[Tuple[int, str]]:
+    """استرجاع جميع الإدارات الصحية"""
+    return [(item['admin_id'], item['admin_name']) for item in get_health_admins_details()]
+
 def get_health_admin_name(admin_id: int) -> str:
     """استرجاع اسم الإدارة الصحية"""
     if admin_id is None:
         return "غير معين"
     
-    try:
-        response = st.session_state.supabase.table('HealthAdministrations').select('admin_name').eq('admin_id', admin_id).execute()
-        return response.data[0]['admin_name'] if response.data else "غير معروف"
-    except Exception as e:
-        st.error(f"حدث خطأ في جلب اسم الإدارة الصحية: {str(e)}")
-        return "خطأ في النظام"
+    admin = get_health_admin(admin_id)
+    return admin['admin_name'] if admin else "غير معروف"
 
-def save_response(survey_id: int, user_id: int, region_id: int, is_completed: bool = False) -> Optional[int]:
-    """حفظ استجابة جديدة"""
+def submit_survey(survey_id: int, user_id: int, region_id: int, answers: Dict[int, Any],
+                  is_completed: bool = False) -> Tuple[Optional[int], bool]:
+    """إرسال الاستبيان كاملاً في معاملة واحدة على الخادم (sql/001_submit_survey.sql)
+    
+    يعيد (رقم الإجابة، هل أكمل المستخدم الاستبيان اليوم بالفعل)
+    """
     try:
-        response = st.session_state.supabase.table('Responses').insert({
-            'survey_id': survey_id,
-            'user_id': user_id,
-            'region_id': region_id,
-            'is_completed': is_completed
+        response = get_client().rpc('submit_survey', {
+            'p_survey_id': survey_id,
+            'p_user_id': user_id,
+            'p_region_id': region_id,
+            'p_is_completed': is_completed,
+            'p_answers': {str(field_id): str(value) for field_id, value in answers.items() if value is not None}
         }).execute()
-        return response.data[0]['response_id'] if response.data else None
+        result = response.data or {}
+        return result.get('response_id'), bool(result.get('already_completed'))
     except Exception as e:
         st.error(f"حدث خطأ في حفظ الاستجابة: {str(e)}")
-        return None
+        return None, False
 
-def save_response_detail(response_id: int, field_id: int, answer_value: str) -> bool:
-    """حفظ تفاصيل الإجابة"""
+def get_employee_bootstrap(user_id: int) -> Optional[Dict]:
+    """بيانات لوحة الموظف كاملة في طلب واحد (sql/003_employee_bootstrap.sql)
+    
+    يعيد region و last_login و surveys، ولكل استبيان completed_today و schema (مخطط مترجم)
+    """
     try:
-        response = st.session_state.supabase.table('Response_Details').insert({
-            'response_id': response_id,
-            'field_id': field_id,
-            'answer_value': str(answer_value) if answer_value is not None else ""
-        }).execute()
-        return bool(response.data)
+        data = get_client().rpc('employee_bootstrap', {'p_user_id': user_id}).execute().data
+        if not data:
+            return None
+        for survey in data['surveys']:
+            survey['schema'] = cache_survey_schema(survey['survey_id'], [
+                (f['field_id'], f['field_label'], f['field_type'],
+                 f['field_options'], f['is_required'], f['field_order'])
+                for f in survey.pop('fields')
+            ])
+        return data
     except Exception as e:
-        st.error(f"حدث خطأ في حفظ تفاصيل الإجابة: {str(e)}")
-        return False
+        st.error(f"حدث خطأ في تحميل بيانات لوحة الموظف: {str(e)}")
+        return None
 
+@audited('INSERT', 'Surveys')
 def save_survey(survey_name: str, fields: List[Dict], governorate_ids: List[int]) -> bool:
+    """إنشاء الاستبيان وحقوله وربطه بالمحافظات في معاملة واحدة (sql/006_create_survey.sql)"""
     try:
-        # إدراج الاستبيان الأساسي
-        survey_data = {'survey_name': survey_name, 'created_by': st.session_state.user_id}
-        survey_response = st.session_state.supabase.table('Surveys').insert(survey_data).execute()
-        survey_id = survey_response.data[0]['survey_id']
-
-        # إدراج حقول الاستبيان
-        for field in fields:
-            field_data = {
-                'survey_id': survey_id,
+        survey_id = get_client().rpc('create_survey', {
+            'p_survey_name': survey_name,
+            'p_created_by': st.session_state.user_id,
+            'p_fields': [{
                 'field_label': field['field_label'],
                 'field_type': field['field_type'],
                 'field_options': json.dumps(field.get('field_options', [])),
                 'is_required': field.get('is_required', False),
-                'field_order': field.get('field_order', 0)
-            }
-            st.session_state.supabase.table('Survey_Fields').insert(field_data).execute()
-
-        # ربط الاستبيان بالمحافظات
-        for gov_id in governorate_ids:
-            st.session_state.supabase.table('SurveyGovernorate').insert({'survey_id': survey_id, 'governorate_id': gov_id}).execute()
+                'field_order': field.get('field_order', position)
+            } for position, field in enumerate(fields, start=1)],
+            'p_governorate_ids': list(governorate_ids)
+        }).execute().data
 
+        bump_survey_version(survey_id)
         return True
     except Exception as e:
         st.error(f"Error: {str(e)}")
@@ -146,7 +388,7 @@ def save_survey(survey_name: str, fields: List[Dict], governorate_ids: List[int]
 def update_last_login(user_id: int):
     """تحديث وقت آخر دخول للمستخدم"""
     try:
-        st.session_state.supabase.table('Users').update({
+        get_client().table('Users').update({
             'last_login': datetime.now().isoformat()
         }).eq('user_id', user_id).execute()
     except Exception as e:
@@ -155,53 +397,59 @@ def update_last_login(user_id: int):
 def update_user_activity(user_id: int):
     """تحديث نشاط المستخدم"""
     try:
-        st.session_state.supabase.table('Users').update({
+        get_client().table('Users').update({
             'last_activity': datetime.now().isoformat()
         }).eq('user_id', user_id).execute()
     except Exception as e:
         st.error(f"حدث خطأ في تحديث نشاط المستخدم: {str(e)}")
 
+@audited('DELETE', 'Surveys', 'survey_id')
 def delete_survey(survey_id: int) -> bool:
     """حذف استبيان وجميع بياناته المرتبطة"""
     try:
         # حذف تفاصيل الإجابات المرتبطة
-        st.session_state.supabase.table('Response_Details').delete().in_('response_id', 
-            st.session_state.supabase.table('Responses').select('response_id').eq('survey_id', survey_id)
+        get_client().table('Response_Details').delete().in_('response_id', 
+            get_client().table('Responses').select('response_id').eq('survey_id', survey_id)
         ).execute()
         
         # حذف الإجابات المرتبطة
-        st.session_state.supabase.table('Responses').delete().eq('survey_id', survey_id).execute()
+        get_client().table('Responses').delete().eq('survey_id', survey_id).execute()
+        get_client().table('ResponseDailyStats').delete().eq('survey_id', survey_id).execute()
         
         # حذف حقول الاستبيان
-        st.session_state.supabase.table('Survey_Fields').delete().eq('survey_id', survey_id).execute()
+        get_client().table('Survey_Fields').delete().eq('survey_id', survey_id).execute()
         
         # حذف روابط المحافظات
-        st.session_state.supabase.table('SurveyGovernorate').delete().eq('survey_id', survey_id).execute()
+        get_client().table('SurveyGovernorate').delete().eq('survey_id', survey_id).execute()
         
         # حذف الاستبيان نفسه
-        st.session_state.supabase.table('Surveys').delete().eq('survey_id', survey_id).execute()
+        get_client().table('Surveys').delete().eq('survey_id', survey_id).execute()
         
+        bump_survey_version(survey_id)
+        bump_response_data_version()
         st.success("تم حذف الاستبيان بنجاح")
         return True
     except Exception as e:
         st.error(f"حدث خطأ أثناء حذف الاستبيان: {str(e)}")
         return False
 
+@audited('INSERT', 'HealthAdministrations')
 def add_health_admin(admin_name: str, description: str, governorate_id: int) -> bool:
     """إضافة إدارة صحية جديدة"""
     try:
         # التحقق من التكرار
-        response = st.session_state.supabase.table('HealthAdministrations').select('*').eq('admin_name', admin_name).eq('governorate_id', governorate_id).execute()
+        response = get_client().table('HealthAdministrations').select('*').eq('admin_name', admin_name).eq('governorate_id', governorate_id).execute()
         if response.data:
             st.error("هذه الإدارة الصحية موجودة بالفعل في هذه المحافظة!")
             return False
         
         # إضافة الإدارة الجديدة
-        st.session_state.supabase.table('HealthAdministrations').insert({
+        get_client().table('HealthAdministrations').insert({
             'admin_name': admin_name,
             'description': description,
             'governorate_id': governorate_id
         }).execute()
+        invalidate_reference_cache()
         
         st.success(f"تمت إضافة الإدارة الصحية '{admin_name}' بنجاح")
         return True
@@ -211,57 +459,48 @@ def add_health_admin(admin_name: str, description: str, governorate_id: int) ->
 
 def get_governorates_list() -> List[Tuple[int, str]]:
     """استرجاع قائمة المحافظات"""
-    try:
-        response = st.session_state.supabase.table('Governorates').select('governorate_id, governorate_name').execute()
-        return [(item['governorate_id'], item['governorate_name']) for item in response.data]
-    except Exception as e:
-        st.error(f"حدث خطأ في جلب المحافظات: {str(e)}")
-        return []
+    return [(item['governorate_id'], item['governorate_name']) for item in get_governorates()]
 
+@audited('UPDATE', 'Surveys', 'survey_id')
 def update_survey(survey_id: int, survey_name: str, is_active: bool, fields: List[Dict]) -> bool:
-    """تحديث بيانات الاستبيان وحقوله"""
+    """تحديث بيانات الاستبيان وحقوله في معاملة واحدة (sql/012_update_survey_fields_compare_stored.sql)
+    
+    تُرسل جميع الحقول ويقارنها الخادم بالصفوف المخزنة فيحدّث المتغير منها فقط،
+    والحقول الجديدة يحدد الخادم ترتيبها بعد آخر حقل
+    """
     try:
-        # تحديث بيانات الاستبيان الأساسية
-        st.session_state.supabase.table('Surveys').update({
-            'survey_name': survey_name,
-            'is_active': is_active
-        }).eq('survey_id', survey_id).execute()
-        
-        # تحديث الحقول الموجودة أو إضافة جديدة
+        survey_fields = []
         for field in fields:
-            field_options = json.dumps(field.get('field_options', [])) if field.get('field_options') else None
-            
-            if 'field_id' in field:  # حقل موجود يتم تحديثه
-                st.session_state.supabase.table('Survey_Fields').update({
-                    'field_label': field['field_label'],
-                    'field_type': field['field_type'],
-                    'field_options': field_options,
-                    'is_required': field.get('is_required', False)
-                }).eq('field_id', field['field_id']).execute()
-            else:  # حقل جديد يتم إضافته
-                # الحصول على أقصى ترتيب للحقول
-                response = st.session_state.supabase.table('Survey_Fields').select('field_order').eq('survey_id', survey_id).order('field_order', desc=True).limit(1).execute()
-                max_order = response.data[0]['field_order'] if response.data else 0
-                
-                st.session_state.supabase.table('Survey_Fields').insert({
-                    'survey_id': survey_id,
-                    'field_label': field['field_label'],
-                    'field_type': field['field_type'],
-                    'field_options': field_options,
-                    'is_required': field.get('is_required', False),
-                    'field_order': max_order + 1
-                }).execute()
+            options = field.get('field_options')
+            payload = {
+                'field_label': field['field_label'],
+                'field_type': field['field_type'],
+                'field_options': json.dumps(options) if options else None,
+                'is_required': field.get('is_required', False)
+            }
+            if 'field_id' in field:
+                payload['field_id'] = field['field_id']
+            survey_fields.append(payload)
+        
+        get_client().rpc('update_survey_fields', {
+            'p_survey_id': survey_id,
+            'p_survey_name': survey_name,
+            'p_is_active': is_active,
+            'p_fields': survey_fields
+        }).execute()
         
+        bump_survey_version(survey_id)
         st.success("تم تحديث الاستبيان بنجاح")
         return True
     except Exception as e:
         st.error(f"حدث خطأ في تحديث الاستبيان: {str(e)}")
         return False
 
+@audited('INSERT', 'GovernorateAdmins', 'user_id')
 def add_governorate_admin(user_id: int, governorate_id: int) -> bool:
     """إضافة مسؤول محافظة جديد"""
     try:
-        st.session_state.supabase.table('GovernorateAdmins').insert({
+        get_client().table('GovernorateAdmins').insert({
             'user_id': user_id,
             'governorate_id': governorate_id
         }).execute()
@@ -272,7 +511,7 @@ def add_governorate_admin(user_id: int, governorate_id: int) -> bool:
 
 def get_governorate_admin_data(user_id: int) -> Optional[Tuple]:
     try:
-        response = st.session_state.supabase.table('GovernorateAdmins').select('Governorates(governorate_id, governorate_name, description)').eq('user_id', user_id).execute()
+        response = get_client().table('GovernorateAdmins').select('Governorates(governorate_id, governorate_name, description)').eq('user_id', user_id).execute()
         if response.data:
             gov = response.data[0]['Governorates']
             return (gov['governorate_id'], gov['governorate_name'], gov['description'])
@@ -284,7 +523,7 @@ def get_governorate_admin_data(user_id: int) -> Optional[Tuple]:
 # في database.py
 def get_governorate_surveys(governorate_id: int) -> List[Tuple[int, str, str, bool]]:
     try:
-        response = st.session_state.supabase.table('SurveyGovernorate').select('Surveys(survey_id, survey_name, created_at, is_active)').eq('governorate_id', governorate_id).execute()
+        response = get_client().table('SurveyGovernorate').select('Surveys(survey_id, survey_name, created_at, is_active)').eq('governorate_id', governorate_id).execute()
         if not response.data:
             return []
         return [(item['Surveys']['survey_id'], item['Surveys']['survey_name'], 
@@ -297,7 +536,7 @@ def get_governorate_surveys(governorate_id: int) -> List[Tuple[int, str, str, bo
 def get_governorate_employees(governorate_id: int) -> List[Tuple[int, str, str]]:
     """الحصول على الموظفين التابعين لمحافظة معينة"""
     try:
-        response = st.session_state.supabase.table('Users').select('user_id, username, HealthAdministrations(admin_name)').eq('role', 'employee').eq('HealthAdministrations.governorate_id', governorate_id).execute()
+        response = get_client().table('Users').select('user_id, username, HealthAdministrations!inner(admin_name)').eq('role', 'employee').eq('HealthAdministrations.governorate_id', governorate_id).execute()
         return [(item['user_id'], item['username'], item['HealthAdministrations']['admin_name']) 
                 for item in response.data]
     except Exception as e:
@@ -308,14 +547,14 @@ def get_allowed_surveys(user_id: int) -> List[Tuple[int, str]]:
     """الحصول على الاستبيانات المسموح بها للموظف"""
     try:
         # الحصول على المحافظة التابعة للمستخدم
-        response = st.session_state.supabase.table('Users').select('HealthAdministrations(governorate_id)').eq('user_id', user_id).execute()
+        response = get_client().table('Users').select('HealthAdministrations(governorate_id)').eq('user_id', user_id).execute()
         governorate_id = response.data[0]['HealthAdministrations']['governorate_id'] if response.data else None
         
         if not governorate_id:
             return []
             
         # الحصول على الاستبيانات المسموحة للمحافظة
-        response = st.session_state.supabase.table('SurveyGovernorate').select('Surveys(survey_id, survey_name)').eq('governorate_id', governorate_id).execute()
+        response = get_client().table('SurveyGovernorate').select('Surveys(survey_id, survey_name)').eq('governorate_id', governorate_id).execute()
         return [(item['Surveys']['survey_id'], item['Surveys']['survey_name']) 
                 for item in response.data]
     except Exception as e:
@@ -323,48 +562,162 @@ def get_allowed_surveys(user_id: int) -> List[Tuple[int, str]]:
         return []
 
 def get_survey_fields(survey_id: int) -> List[Tuple[int, str, str, str, bool, int]]:
-    """الحصول على حقول استبيان معين"""
+    """الحصول على حقول استبيان معين (من مخطط الاستبيان المترجم)"""
+    schema = get_survey_schema(survey_id)
+    return [f.as_tuple() for f in schema.fields] if schema else []
+
+# مخطط الاستبيان المترجم: الحقول مع الخيارات المحللة مسبقاً ومفاتيح عناصر الواجهة والحقول المطلوبة
+# يُحفظ على مستوى العملية حتى يتغير رقم نسخة الاستبيان (update_survey و save_survey و delete_survey)،
+# و SURVEY_SCHEMA_TTL يغطي التعديلات التي تتم من عملية خادم أخرى
+SURVEY_SCHEMA_TTL = 600
+
+@dataclass(frozen=True)
+class CompiledField:
+    field_id: int
+    label: str
+    field_type: str
+    options: Tuple[str, ...]
+    is_required: bool
+    order: int
+    widget_key: str
+    raw_options: Optional[str] = None
+
+    def as_tuple(self) -> Tuple[int, str, str, Optional[str], bool, int]:
+        return (self.field_id, self.label, self.field_type, self.raw_options, self.is_required, self.order)
+
+@dataclass(frozen=True)
+class SurveySchema:
+    survey_id: int
+    version: int
+    loaded_at: datetime
+    fields: Tuple[CompiledField, ...]
+    by_id: Mapping[int, CompiledField]
+    required_ids: FrozenSet[int]
+
+_survey_versions: Dict[int, int] = {}
+_survey_schemas: Dict[int, SurveySchema] = {}
+_survey_schemas_lock = threading.Lock()
+
+def bump_survey_version(survey_id: int):
+    """إبطال مخطط الاستبيان المترجم بعد تعديل الاستبيان أو حقوله"""
+    with _survey_schemas_lock:
+        _survey_versions[survey_id] = _survey_versions.get(survey_id, 0) + 1
+        _survey_schemas.pop(survey_id, None)
+
+def _compile_survey_schema(survey_id: int, version: int, rows: List[Tuple]) -> SurveySchema:
+    fields = tuple(
+        CompiledField(
+            field_id=field_id,
+            label=label,
+            field_type=field_type,
+            options=tuple(json.loads(options)) if options else (),
+            is_required=bool(is_required),
+            order=order,
+            widget_key=f"{field_type}_{field_id}",
+            raw_options=options
+        )
+        for field_id, label, field_type, options, is_required, order in rows
+    )
+    return SurveySchema(
+        survey_id=survey_id,
+        version=version,
+        loaded_at=datetime.now(),
+        fields=fields,
+        by_id=MappingProxyType({f.field_id: f for f in fields}),
+        required_ids=frozenset(f.field_id for f in fields if f.is_required)
+    )
+
+def _cached_survey_schema(survey_id: int) -> Optional[SurveySchema]:
+    schema = _survey_schemas.get(survey_id)
+    if (schema is None or schema.version != _survey_versions.get(survey_id, 0) or
+            datetime.now() - schema.loaded_at > timedelta(seconds=SURVEY_SCHEMA_TTL)):
+        return None
+    return schema
+
+def cache_survey_schema(survey_id: int, rows: List[Tuple]) -> SurveySchema:
+    """ترجمة حقول تم جلبها مسبقاً (مثل employee_bootstrap) أو إعادة المخطط المحفوظ إن كان صالحاً"""
+    with _survey_schemas_lock:
+        schema = _cached_survey_schema(survey_id)
+        if schema is None:
+            schema = _compile_survey_schema(survey_id, _survey_versions.get(survey_id, 0), rows)
+            _survey_schemas[survey_id] = schema
+        return schema
+
+def get_survey_schema(survey_id: int) -> Optional[SurveySchema]:
+    """مخطط الاستبيان المترجم من الذاكرة، أو من قاعدة البيانات عند تغير النسخة"""
+    schema = _cached_survey_schema(survey_id)
+    if schema is not None:
+        return schema
     try:
-        response = st.session_state.supabase.table('Survey_Fields').select('*').eq('survey_id', survey_id).order('field_order').execute()
-        return [(item['field_id'], item['field_label'], item['field_type'], 
-                item['field_options'], item['is_required'], item['field_order']) 
-                for item in response.data]
+        response = get_client().table('Survey_Fields').select('field_id, field_label, field_type, field_options, is_required, field_order').eq('survey_id', survey_id).order('field_order').execute()
+        return cache_survey_schema(survey_id, [
+            (item['field_id'], item['field_label'], item['field_type'],
+             item['field_options'], item['is_required'], item['field_order'])
+            for item in response.data
+        ])
     except Exception as e:
         st.error(f"حدث خطأ في جلب حقول الاستبيان: {str(e)}")
-        return []
+        return None
 
 def get_user_allowed_surveys(user_id: int) -> List[Tuple[int, str]]:
     """الحصول على الاستبيانات المسموح بها للمستخدم"""
     try:
-        response = st.session_state.supabase.table('UserSurveys').select('Surveys(survey_id, survey_name)').eq('user_id', user_id).execute()
+        response = get_client().table('UserSurveys').select('Surveys(survey_id, survey_name)').eq('user_id', user_id).execute()
         return [(item['Surveys']['survey_id'], item['Surveys']['survey_name']) 
                 for item in response.data]
     except Exception as e:
         st.error(f"حدث خطأ في جلب الاستبيانات المسموح بها: {str(e)}")
         return []
 
-def update_user_allowed_surveys(user_id: int, survey_ids: List[int]) -> bool:
-    """تحديث الاستبيانات المسموح بها للمستخدم"""
+def update_user_allowed_surveys(user_id: int, survey_ids: List[int],
+                                current_ids: Optional[List[int]] = None) -> bool:
+    """تحديث الاستبيانات المسموح بها للمستخدم بتطبيق الفرق فقط
+    
+    حذف جماعي واحد وإدراج جماعي واحد على الأكثر، ولا شيء إذا لم تتغير التصاريح.
+    current_ids: التصاريح الحالية إذا كانت محملة مسبقاً لتجنب إعادة قراءتها
+    """
     try:
-        # حذف جميع التصاريح الحالية
-        st.session_state.supabase.table('UserSurveys').delete().eq('user_id', user_id).execute()
+        if current_ids is None:
+            response = get_client().table('UserSurveys').select('survey_id').eq('user_id', user_id).execute()
+            current_ids = [item['survey_id'] for item in response.data]
         
-        # إضافة التصاريح الجديدة
-        for survey_id in survey_ids:
-            st.session_state.supabase.table('UserSurveys').insert({
-                'user_id': user_id,
-                'survey_id': survey_id
-            }).execute()
+        current, wanted = set(current_ids), set(survey_ids)
+        removed, added = sorted(current - wanted), sorted(wanted - current)
+        if removed:
+            get_client().table('UserSurveys').delete().eq('user_id', user_id).in_('survey_id', removed).execute()
+        if added:
+            get_client().table('UserSurveys').insert([
+                {'user_id': user_id, 'survey_id': survey_id} for survey_id in added
+            ]).execute()
         
+        if removed or added:
+            log_audit_action(st.session_state.get('user_id'), 'UPDATE', 'UserSurveys', user_id,
+                             old_value={'removed': removed}, new_value={'added': added})
         return True
     except Exception as e:
         st.error(f"حدث خطأ في تحديث الاستبيانات المسموح بها: {str(e)}")
         return False
 
+@audited('INSERT', 'UserSurveys', 'survey_id')
+def grant_survey_to_health_admin(survey_id: int, admin_id: int) -> int:
+    """منح استبيان لجميع موظفي إدارة صحية بإدراج جماعي واحد
+    
+    يعيد عدد الموظفين الذين مُنحوا الاستبيان (من لم يكن لديه تصريح به)
+    """
+    try:
+        employees = get_client().table('Users').select('user_id, UserSurveys(survey_id)').eq('role', 'employee').eq('assigned_region', admin_id).eq('UserSurveys.survey_id', survey_id).execute().data
+        new_grants = [{'user_id': e['user_id'], 'survey_id': survey_id} for e in employees if not e['UserSurveys']]
+        if new_grants:
+            get_client().table('UserSurveys').insert(new_grants).execute()
+        return len(new_grants)
+    except Exception as e:
+        st.error(f"حدث خطأ في منح الاستبيان للإدارة الصحية: {str(e)}")
+        return 0
+
 def get_response_details(response_id: int) -> List[Tuple[int, int, str, str, str, str]]:
     """الحصول على تفاصيل إجابة محددة"""
     try:
-        response = st.session_state.supabase.table('Response_Details').select('detail_id, field_id, Survey_Fields(field_label, field_type, field_options), answer_value').eq('response_id', response_id).execute()
+        response = get_client().table('Response_Details').select('detail_id, field_id, Survey_Fields(field_label, field_type, field_options), answer_value').eq('response_id', response_id).execute()
         return [(item['detail_id'], item['field_id'], 
                 item['Survey_Fields']['field_label'], item['Survey_Fields']['field_type'],
                 item['Survey_Fields']['field_options'], item['answer_value']) 
@@ -373,10 +726,232 @@ def get_response_details(response_id: int) -> List[Tuple[int, int, str, str, str
         st.error(f"حدث خطأ في جلب تفاصيل الإجابة: {str(e)}")
         return []
 
+# أحجام دفعات التصدير: عدد الإجابات في كل استعلام IN وعدد الصفوف في كل صفحة
+EXPORT_BATCH_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+
+def _fetch_all_pages(build_query, page_size: int = EXPORT_PAGE_SIZE) -> List[Dict]:
+    """جلب جميع صفوف استعلام مرتب على صفحات متتالية"""
+    rows = []
+    offset = 0
+    while True:
+        page = build_query().range(offset, offset + page_size - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+def get_survey_responses(survey_id: int) -> List[Dict]:
+    """جلب جميع إجابات الاستبيان مع المستخدم والإدارة الصحية على دفعات كبيرة
+    
+    يرفع الاستثناء عند فشل أي صفحة بدلاً من إرجاع بيانات ناقصة
+    """
+    return _fetch_all_pages(lambda: get_client().table('Responses').select(
+        'response_id, Users(username), HealthAdministrations(admin_name, Governorates(governorate_name)), submission_date, is_completed'
+    ).eq('survey_id', survey_id).order('response_id'))
+
+# حجم الصفحة الافتراضي لتصفح الإجابات
+RESPONSES_PAGE_SIZE = 50
+
+def _responses_query(select: str, survey_id: int, governorate_id: Optional[int] = None):
+    """بناء استعلام إجابات الاستبيان مع تصفية اختيارية بالمحافظة"""
+    if governorate_id:
+        if 'HealthAdministrations(' in select:
+            select = select.replace('HealthAdministrations(', 'HealthAdministrations!inner(governorate_id, ')
+        else:
+            select += ', HealthAdministrations!inner(governorate_id)'
+    query = get_client().table('Responses').select(select).eq('survey_id', survey_id)
+    if governorate_id:
+        query = query.eq('HealthAdministrations.governorate_id', governorate_id)
+    return query
+
+def get_governorate_survey_responses(survey_id: int, governorate_id: int) -> List[Dict]:
+    """جلب جميع إجابات الاستبيان في محافظة بالأعمدة اللازمة لمتابعتها لحظياً (انظر realtime_feed.py)
+    
+    يرفع الاستثناء عند فشل أي صفحة حتى لا يحفظ الإطار إجابات ناقصة
+    """
+    return _fetch_all_pages(lambda: _responses_query(
+        'response_id, user_id, region_id, submission_date, is_completed, Users(username)',
+        survey_id, governorate_id
+    ).order('response_id'))
+
+def get_usernames(user_ids: List[int]) -> Dict[int, str]:
+    """أسماء مجموعة من المستخدمين في طلب واحد"""
+    if not user_ids:
+        return {}
+    try:
+        rows = get_client().table('Users').select('user_id, username').in_('user_id', list(user_ids)).execute().data
+        return {row['user_id']: row['username'] for row in rows}
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب أسماء المستخدمين: {str(e)}")
+        return {}
+
+def get_survey_responses_page(survey_id: int, page_size: int = RESPONSES_PAGE_SIZE,
+                              after: Optional[Tuple[str, int]] = None,
+                              governorate_id: Optional[int] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+    """جلب صفحة من إجابات الاستبيان بترقيم المؤشر على (submission_date, response_id)
+    
+    يعيد (صفوف الصفحة، مؤشر الصفحة التالية أو None إذا كانت الأخيرة)
+    """
+    try:
+        query = _responses_query(
+            'response_id, Users(username), HealthAdministrations(admin_name, Governorates(governorate_name)), submission_date, is_completed',
+            survey_id, governorate_id
+        )
+        if after:
+            submission_date, response_id = after
+            query = query.or_(f'submission_date.lt."{submission_date}",and(submission_date.eq."{submission_date}",response_id.lt.{response_id})')
+        rows = query.order('submission_date', desc=True).order('response_id', desc=True).limit(page_size + 1).execute().data
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1]['submission_date'], rows[-1]['response_id'])
+        return rows, next_cursor
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب إجابات الاستبيان: {str(e)}")
+        return [], None
+
+def get_survey_response_stats(survey_id: int, governorate_id: Optional[int] = None) -> Dict[str, int]:
+    """إحصاءات إجابات الاستبيان في طلب واحد من الإحصاءات المجمعة (sql/010_response_rollups.sql)
+    
+    يعيد total و completed و draft و regions (عدد الإدارات الصحية المرسلة)
+    """
+    try:
+        return get_client().rpc('survey_response_stats', {
+            'p_survey_id': survey_id,
+            'p_governorate_id': governorate_id
+        }).execute().data
+    except Exception as e:
+        st.error(f"حدث خطأ في حساب إحصاءات الإجابات: {str(e)}")
+        return {'total': 0, 'completed': 0, 'draft': 0, 'regions': 0}
+
+def get_survey_daily_stats(survey_id: int, governorate_id: Optional[int] = None) -> pd.DataFrame:
+    """عدد الإجابات المرسلة والمكتملة والمسودات لكل يوم من الإحصاءات المجمعة (sql/010_response_rollups.sql)"""
+    columns = ['submitted', 'completed', 'draft']
+    try:
+        query = get_client().table('ResponseDailyStats').select('day, submitted, completed, draft').eq('survey_id', survey_id)
+        if governorate_id is not None:
+            query = query.eq('governorate_id', governorate_id)
+        rows = query.execute().data
+        if not rows:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='day'))
+        df = pd.DataFrame(rows)
+        df['day'] = pd.to_datetime(df['day'])
+        return df.groupby('day')[columns].sum().sort_index()
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب الإحصاءات اليومية: {str(e)}")
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='day'))
+
+def rebuild_response_rollups(survey_id: Optional[int] = None) -> Optional[int]:
+    """إعادة بناء الإحصاءات المجمعة من جدول الإجابات (لاستبيان واحد أو لجميع الاستبيانات)"""
+    try:
+        return get_client().rpc('rebuild_response_rollups', {'p_survey_id': survey_id}).execute().data
+    except Exception as e:
+        st.error(f"حدث خطأ في إعادة بناء الإحصاءات: {str(e)}")
+        return None
+
+def get_response_details_bulk(response_ids: List[int]) -> List[Dict]:
+    """جلب تفاصيل مجموعة من الإجابات على دفعات (response_id IN (...))
+    
+    يرفع الاستثناء عند فشل أي دفعة بدلاً من إرجاع بيانات ناقصة
+    """
+    rows = []
+    for start in range(0, len(response_ids), EXPORT_BATCH_SIZE):
+        batch = response_ids[start:start + EXPORT_BATCH_SIZE]
+        rows.extend(_fetch_all_pages(lambda: get_client().table('Response_Details').select(
+            'detail_id, response_id, field_id, answer_value'
+        ).in_('response_id', batch).order('detail_id')))
+    return rows
+
+# نسخة بيانات الإجابات: تزداد عند تعديل قيم الإجابات أو حذف استبيان لإبطال التحليلات المحفوظة
+_response_data_version = 0
+_response_data_version_lock = threading.Lock()
+
+def bump_response_data_version():
+    global _response_data_version
+    with _response_data_version_lock:
+        _response_data_version += 1
+
+def get_survey_data_version(survey_id: int) -> Tuple[int, int]:
+    """نسخة بيانات الاستبيان في هذه العملية: تتغير عند تعديل الإجابات أو المخطط (وليس عند وصول إجابة جديدة)"""
+    return (_response_data_version, _survey_versions.get(survey_id, 0))
+
+def get_survey_answer_values(field_ids: List[int], after_detail_id: int = 0,
+                             page_size: int = EXPORT_PAGE_SIZE) -> pd.DataFrame:
+    """قيم الإجابات لمجموعة حقول (detail_id, field_id, answer_value) بعد after_detail_id بترقيم المؤشر على detail_id
+    
+    يرفع الاستثناء عند فشل أي صفحة بدلاً من إرجاع بيانات ناقصة
+    """
+    rows = []
+    last_detail_id = after_detail_id
+    while field_ids:
+        page = get_client().table('Response_Details').select('detail_id, field_id, answer_value').in_('field_id', field_ids).gt('detail_id', last_detail_id).order('detail_id').limit(page_size).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+        last_detail_id = page[-1]['detail_id']
+    return pd.DataFrame(rows, columns=['detail_id', 'field_id', 'answer_value'])
+
+def build_response_matrix(schema: SurveySchema, details: List[Dict], response_ids: List[int]) -> pd.DataFrame:
+    """تحويل صفوف التفاصيل الطويلة إلى جدول عريض: صف لكل إجابة وعمود لكل حقل
+    
+    يتم تحديد نوع كل عمود حسب field_type (رقم، تاريخ، منطقي، فئات للقوائم المنسدلة)
+    """
+    long_df = pd.DataFrame(details, columns=['detail_id', 'response_id', 'field_id', 'answer_value'])
+    wide = (
+        long_df.drop_duplicates(['response_id', 'field_id'], keep='last')
+        .pivot(index='response_id', columns='field_id', values='answer_value')
+        .reindex(index=pd.Index(response_ids, name='response_id'), columns=[f.field_id for f in schema.fields])
+    )
+    
+    labels = pd.Series([f.label for f in schema.fields], dtype=object)
+    duplicated = labels.duplicated(keep=False)
+    labels[duplicated] = labels[duplicated] + " (" + pd.Series([str(f.field_id) for f in schema.fields])[duplicated] + ")"
+    
+    columns = {}
+    for field, label in zip(schema.fields, labels):
+        column = wide[field.field_id]
+        field_type = field.field_type
+        if field_type == 'number':
+            columns[label] = pd.to_numeric(column, errors='coerce')
+        elif field_type == 'date':
+            columns[label] = pd.to_datetime(column, errors='coerce')
+        elif field_type == 'checkbox':
+            columns[label] = column.map({'True': True, 'False': False}).astype('boolean')
+        elif field_type == 'dropdown':
+            # الخيارات الحالية أولاً ثم القيم المحفوظة التي حُذفت من الخيارات بعد جمع الإجابات
+            categories = list(dict.fromkeys(list(field.options) + column.dropna().tolist()))
+            columns[label] = pd.Categorical(column, categories=categories)
+        else:
+            columns[label] = column.astype('string')
+    return pd.DataFrame(columns, index=wide.index)
+
+def get_response_matrix(survey_id: int, response_ids: Optional[List[int]] = None) -> pd.DataFrame:
+    """جدول الإجابات العريض للاستبيان (أو لمجموعة محددة من الإجابات)"""
+    if response_ids is None:
+        try:
+            response_ids = [r['response_id'] for r in _fetch_all_pages(
+                lambda: get_client().table('Responses').select('response_id').eq('survey_id', survey_id).order('response_id')
+            )]
+        except Exception as e:
+            st.error(f"حدث خطأ في جلب إجابات الاستبيان: {str(e)}")
+            response_ids = []
+    schema = get_survey_schema(survey_id)
+    if schema is None:
+        return pd.DataFrame(index=pd.Index(response_ids, name='response_id'))
+    try:
+        details = get_response_details_bulk(response_ids)
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب تفاصيل الإجابات: {str(e)}")
+        details = []
+    return build_response_matrix(schema, details, response_ids)
+
+@audited('UPDATE', 'Response_Details', 'detail_id')
 def update_response_detail(detail_id: int, new_value: str) -> bool:
     """تحديث قيمة إجابة محددة"""
     try:
-        st.session_state.supabase.table('Response_Details').update({
+        get_client().table('Response_Details').update({
             'answer_value': new_value
         }).eq('detail_id', detail_id).execute()
         return True
@@ -384,10 +959,29 @@ def update_response_detail(detail_id: int, new_value: str) -> bool:
         st.error(f"حدث خطأ في تحديث الإجابة: {str(e)}")
         return False
 
+@audited('UPDATE', 'Response_Details', 'response_id')
+def update_response_details_bulk(updates: Dict[int, str], response_id: Optional[int] = None) -> bool:
+    """تحديث عدة قيم من تفاصيل الإجابة في معاملة واحدة (sql/008_update_response_details.sql)
+    
+    updates: {detail_id: القيمة الجديدة}، ويُسجل إجراء واحد في سجل التعديلات لكل استدعاء
+    """
+    if not updates:
+        return True
+    try:
+        get_client().rpc('update_response_details', {
+            'p_updates': {str(detail_id): value for detail_id, value in updates.items()},
+            'p_response_id': response_id
+        }).execute()
+        bump_response_data_version()
+        return True
+    except Exception as e:
+        st.error(f"حدث خطأ في تحديث الإجابة: {str(e)}")
+        return False
+
 def get_response_info(response_id: int) -> Optional[Tuple[int, str, str, str, str, str]]:
     """الحصول على معلومات أساسية عن الإجابة"""
     try:
-        response = st.session_state.supabase.table('Responses').select('response_id, Surveys(survey_name), Users(username), HealthAdministrations(admin_name, Governorates(governorate_name)), submission_date').eq('response_id', response_id).execute()
+        response = get_client().table('Responses').select('response_id, Surveys(survey_name), Users(username), HealthAdministrations(admin_name, Governorates(governorate_name)), submission_date').eq('response_id', response_id).execute()
         if response.data:
             data = response.data[0]
             return (
@@ -406,16 +1000,17 @@ def get_response_info(response_id: int) -> Optional[Tuple[int, str, str, str, st
 def log_audit_action(user_id: int, action_type: str, table_name: str, 
                     record_id: int = None, old_value: Any = None, 
                     new_value: Any = None) -> bool:
-    """تسجيل إجراء في سجل التعديلات"""
+    """تسجيل إجراء في سجل التعديلات (يُضاف إلى طابور الكتابة في الخلفية)"""
     try:
-        st.session_state.supabase.table('AuditLog').insert({
+        get_audit_writer().submit({
             'user_id': user_id,
             'action_type': action_type,
             'table_name': table_name,
             'record_id': record_id,
-            'old_value': json.dumps(old_value) if old_value else None,
-            'new_value': json.dumps(new_value) if new_value else None
-        }).execute()
+            'old_value': json.dumps(old_value, ensure_ascii=False, default=str) if old_value else None,
+            'new_value': json.dumps(new_value, ensure_ascii=False, default=str) if new_value else None,
+            'action_timestamp': datetime.now().isoformat()
+        })
         return True
     except Exception as e:
         st.error(f"حدث خطأ في تسجيل الإجراء: {str(e)}")
@@ -426,7 +1021,7 @@ def get_audit_logs(table_name: str = None, action_type: str = None,
                   search_query: str = None) -> List[Tuple[int, str, str, str, int, str, str, str]]:
     """الحصول على سجل التعديلات مع فلاتر متقدمة"""
     try:
-        query = st.session_state.supabase.table('AuditLog').select('log_id, Users(username), action_type, table_name, record_id, old_value, new_value, action_timestamp')
+        query = get_client().table('AuditLog').select('log_id, Users(username), action_type, table_name, record_id, old_value, new_value, action_timestamp')
         
         if table_name:
             query = query.eq('table_name', table_name)
@@ -438,7 +1033,7 @@ def get_audit_logs(table_name: str = None, action_type: str = None,
             query = query.gte('action_timestamp', date_range[0])
             query = query.lte('action_timestamp', date_range[1])
         if search_query:
-            query = query.or_(f"old_value.ilike.%{search_query}%,new_value.ilike.%{search_query}%,Users.username.ilike.%{search_query}%,table_name.ilike.%{search_query}%,action_type.ilike.%{search_query}%")
+            query = query.ilike('search_text', f'%{search_query.lower()}%')
             
         response = query.order('action_timestamp', desc=True).execute()
         return [(item['log_id'], item['Users']['username'], item['action_type'], 
@@ -449,11 +1044,60 @@ def get_audit_logs(table_name: str = None, action_type: str = None,
         st.error(f"حدث خطأ في جلب سجل التعديلات: {str(e)}")
         return []
 
+AUDIT_PAGE_SIZE = 100
+
+def get_audit_logs_page(page_size: int = AUDIT_PAGE_SIZE, after: Optional[Tuple[str, int]] = None,
+                        table_name: str = None, action_type: str = None,
+                        username: str = None, date_range: Tuple[str, str] = None,
+                        search_query: str = None) -> Tuple[List[Tuple], Optional[Tuple[str, int]], Optional[int]]:
+    """صفحة من سجل التعديلات بترقيم المؤشر على (action_timestamp, log_id)
+    
+    البحث النصي يستخدم العمود المفهرس search_text (sql/005_audit_log_search.sql).
+    يعيد (صفوف الصفحة، مؤشر الصفحة التالية أو None، العدد التقديري للنتائج في الصفحة الأولى فقط)
+    """
+    try:
+        users_embed = 'Users!inner(username)' if username else 'Users(username)'
+        query = get_client().table('AuditLog').select(
+            f'log_id, {users_embed}, action_type, table_name, record_id, old_value, new_value, action_timestamp',
+            count='estimated' if after is None else None
+        )
+        
+        if table_name:
+            query = query.eq('table_name', table_name)
+        if action_type:
+            query = query.eq('action_type', action_type)
+        if username:
+            query = query.ilike('Users.username', f'%{username}%')
+        if date_range:
+            query = query.gte('action_timestamp', date_range[0])
+            query = query.lte('action_timestamp', date_range[1])
+        if search_query:
+            query = query.ilike('search_text', f'%{search_query.lower()}%')
+        if after:
+            action_timestamp, log_id = after
+            query = query.or_(f'action_timestamp.lt."{action_timestamp}",and(action_timestamp.eq."{action_timestamp}",log_id.lt.{log_id})')
+        
+        response = query.order('action_timestamp', desc=True).order('log_id', desc=True).limit(page_size + 1).execute()
+        rows = response.data
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1]['action_timestamp'], rows[-1]['log_id'])
+        return ([(item['log_id'], item['Users']['username'] if item['Users'] else None, item['action_type'],
+                  item['table_name'], item['record_id'], item['old_value'],
+                  item['new_value'], item['action_timestamp'])
+                 for item in rows], next_cursor, response.count)
+    except Exception as e:
+        st.error(f"حدث خطأ في جلب سجل التعديلات: {str(e)}")
+        return [], None, None
+
 def has_completed_survey_today(user_id: int, survey_id: int) -> bool:
+    """فحص وجود إجابة مكتملة اليوم عبر الفهرس responses_user_completion_idx"""
     try:
-        today = datetime.now().strftime('%Y-%m-%d')
-        response = st.session_state.supabase.table('Responses').select('*').eq('user_id', user_id).eq('survey_id', survey_id).eq('is_completed', True).gte('submission_date', f'{today}T00:00:00').lte('submission_date', f'{today}T23:59:59').execute()
-        return len(response.data) > 0
+        today = datetime.now().date()
+        response = get_client().table('Responses').select('response_id').eq('user_id', user_id).eq('survey_id', survey_id).eq('is_completed', True).gte('submission_date', f'{today}T00:00:00').lt('submission_date', f'{today + timedelta(days=1)}T00:00:00').limit(1).execute()
+        return bool(response.data)
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return False
@@ -1,13 +1,11 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import json
 from database import (
+    get_client,
     get_health_admin_name,
-    save_response,
-    save_response_detail,
-    get_survey_fields,
-    has_completed_survey_today
+    submit_survey,
+    get_employee_bootstrap
 )
 
 def show_employee_dashboard():
@@ -15,13 +13,15 @@ def show_employee_dashboard():
         st.error("حسابك غير مرتبط بأي منطقة. يرجى التواصل مع المسؤول.")
         return
 
-    region_info = get_employee_region_info(st.session_state.region_id)
+    # جميع بيانات اللوحة في طلب واحد
+    bootstrap = get_employee_bootstrap(st.session_state.user_id)
+    region_info = bootstrap['region'] if bootstrap else None
     if not region_info:
         st.error("لم يتم العثور على معلومات المنطقة الخاصة بك في النظام")
         return
 
-    display_employee_header(region_info)
-    allowed_surveys = get_allowed_surveys(st.session_state.user_id)
+    display_employee_header(region_info, bootstrap['last_login'])
+    allowed_surveys = bootstrap['surveys']
     
     if not allowed_surveys:
         st.info("لا توجد استبيانات متاحة لك حاليًا")
@@ -29,33 +29,14 @@ def show_employee_dashboard():
 
     selected_surveys = display_survey_selection(allowed_surveys)
     
-    for survey_id in selected_surveys:
-        display_single_survey(survey_id, region_info['admin_id'])
+    for survey in allowed_surveys:
+        if survey['survey_id'] in selected_surveys:
+            display_single_survey(survey, region_info['admin_id'])
 
-def get_employee_region_info(region_id):
-    try:
-        result = st.session_state.supabase.table('HealthAdministrations').select('''
-            admin_id, admin_name, Governorates(governorate_name, governorate_id)
-        ''').eq('admin_id', region_id).execute().data
-        
-        if result:
-            return {
-                'admin_id': result[0]['admin_id'],
-                'admin_name': result[0]['admin_name'],
-                'governorate_name': result[0]['Governorates']['governorate_name'],
-                'governorate_id': result[0]['Governorates']['governorate_id']
-            }
-        return None
-    except Exception as e:
-        st.error(f"خطأ في قاعدة البيانات: {str(e)}")
-        return None
-
-def display_employee_header(region_info):
+def display_employee_header(region_info, last_login):
     st.set_page_config(layout="wide")
     st.title(f"لوحة الموظف - {region_info['admin_name']}")
     
-    last_login = get_last_login(st.session_state.user_id)
-    
     col1, col2, col3 = st.columns(3)
     with col1:
         st.subheader("المحافظة")
@@ -67,14 +48,6 @@ def display_employee_header(region_info):
         st.subheader("آخر دخول")
         st.info(last_login if last_login else "غير معروف")
 
-def get_last_login(user_id):
-    try:
-        result = st.session_state.supabase.table('Users').select('last_login').eq('user_id', user_id).execute().data
-        return result[0]['last_login'] if result and result[0]['last_login'] else None
-    except Exception as e:
-        st.error(f"حدث خطأ في جلب وقت آخر دخول: {str(e)}")
-        return None
-
 def display_survey_selection(allowed_surveys):
     st.header("الاستبيانات المتاحة")
     
@@ -87,34 +60,22 @@ def display_survey_selection(allowed_surveys):
     
     return selected_surveys
 
-def display_single_survey(survey_id, region_id):
-    try:
-        survey_info = st.session_state.supabase.table('Surveys').select('survey_name, created_at').eq('survey_id', survey_id).execute().data
+def display_single_survey(survey, region_id):
+    if survey['completed_today']:
+        st.warning(f"لقد أكملت استبيان '{survey['survey_name']}' اليوم. يمكنك إكماله مرة أخرى غدًا.")
+        return
         
-        if not survey_info:
-            st.error("الاستبيان المحدد غير موجود")
-            return
-            
-        if has_completed_survey_today(st.session_state.user_id, survey_id):
-            st.warning(f"لقد أكملت استبيان '{survey_info[0]['survey_name']}' اليوم. يمكنك إكماله مرة أخرى غدًا.")
-            return
-            
-        with st.expander(f"📋 {survey_info[0]['survey_name']} (تاريخ الإنشاء: {survey_info[0]['created_at']})"):
-            fields = get_survey_fields(survey_id)
-            display_survey_form(survey_id, region_id, fields, survey_info[0]['survey_name'])
-            
-    except Exception as e:
-        st.error(f"حدث خطأ في قاعدة البيانات: {str(e)}")
+    with st.expander(f"📋 {survey['survey_name']} (تاريخ الإنشاء: {survey['created_at']})"):
+        display_survey_form(survey['survey_id'], region_id, survey['schema'], survey['survey_name'])
 
-def display_survey_form(survey_id, region_id, fields, survey_name):
+def display_survey_form(survey_id, region_id, schema, survey_name):
     with st.form(f"survey_form_{survey_id}"):
         st.markdown("**يرجى تعبئة جميع الحقول المطلوبة (*)**")
         st.subheader("🧾 بيانات الاستبيان")
         
         answers = {}
-        for field in fields:
-            field_id, label, field_type, options, is_required, _ = field
-            answers[field_id] = render_field(field_id, label, field_type, options, is_required)
+        for field in schema.fields:
+            answers[field.field_id] = render_field(field)
         
         col1, col2 = st.columns(2)
         with col1:
@@ -126,71 +87,57 @@ def display_survey_form(survey_id, region_id, fields, survey_name):
             process_survey_submission(
                 survey_id,
                 region_id,
-                fields,
+                schema,
                 answers,
                 submitted,
                 survey_name
             )
 
-def render_field(field_id, label, field_type, options, is_required):
-    required_mark = " *" if is_required else ""
+def render_field(field):
+    label = field.label + (" *" if field.is_required else "")
     
-    if field_type == 'text':
-        return st.text_input(label + required_mark, key=f"text_{field_id}")
-    elif field_type == 'number':
-        return st.number_input(label + required_mark, key=f"number_{field_id}")
-    elif field_type == 'dropdown':
-        options_list = json.loads(options) if options else []
-        return st.selectbox(label + required_mark, options_list, key=f"dropdown_{field_id}")
-    elif field_type == 'checkbox':
-        return st.checkbox(label + required_mark, key=f"checkbox_{field_id}")
-    elif field_type == 'date':
-        return st.date_input(label + required_mark, key=f"date_{field_id}")
+    if field.field_type == 'text':
+        return st.text_input(label, key=field.widget_key)
+    elif field.field_type == 'number':
+        return st.number_input(label, key=field.widget_key)
+    elif field.field_type == 'dropdown':
+        return st.selectbox(label, field.options, key=field.widget_key)
+    elif field.field_type == 'checkbox':
+        return st.checkbox(label, key=field.widget_key)
+    elif field.field_type == 'date':
+        return st.date_input(label, key=field.widget_key)
     else:
-        st.warning(f"نوع الحقل غير معروف: {field_type}")
+        st.warning(f"نوع الحقل غير معروف: {field.field_type}")
         return None
 
-def process_survey_submission(survey_id, region_id, fields, answers, is_completed, survey_name):
-    missing_fields = check_required_fields(fields, answers)
+def process_survey_submission(survey_id, region_id, schema, answers, is_completed, survey_name):
+    missing_fields = check_required_fields(schema, answers)
     
     if missing_fields and is_completed:
         st.error(f"الحقول التالية مطلوبة: {', '.join(missing_fields)}")
         return
     
-    if is_completed and has_completed_survey_today(st.session_state.user_id, survey_id):
-        st.error("لقد قمت بإكمال هذا الاستبيان اليوم بالفعل. يمكنك إكماله مرة أخرى غدًا.")
-        return
-    
-    response_id = save_response(
+    response_id, already_completed = submit_survey(
         survey_id=survey_id,
         user_id=st.session_state.user_id,
         region_id=region_id,
+        answers=answers,
         is_completed=is_completed
     )
     
+    if already_completed:
+        st.error("لقد قمت بإكمال هذا الاستبيان اليوم بالفعل. يمكنك إكماله مرة أخرى غدًا.")
+        return
+    
     if not response_id:
         st.error("حدث خطأ أثناء حفظ البيانات")
         return
     
-    save_response_details(response_id, answers)
     show_submission_message(is_completed, survey_name)
 
-def check_required_fields(fields, answers):
-    missing_fields = []
-    for field in fields:
-        field_id, label, _, _, is_required, _ = field
-        if is_required and not answers.get(field_id):
-            missing_fields.append(label)
-    return missing_fields
-
-def save_response_details(response_id, answers):
-    for field_id, answer in answers.items():
-        if answer is not None:
-            save_response_detail(
-                response_id=response_id,
-                field_id=field_id,
-                answer_value=str(answer)
-            )
+def check_required_fields(schema, answers):
+    return [field.label for field in schema.fields
+            if field.field_id in schema.required_ids and not answers.get(field.field_id)]
 
 def show_submission_message(is_completed, survey_name):
     if is_completed:
@@ -202,23 +149,13 @@ def show_submission_message(is_completed, survey_name):
     else:
         st.success(f"تم حفظ مسودة استبيان '{survey_name}' بنجاح")
 
-def get_allowed_surveys(user_id):
-    try:
-        result = st.session_state.supabase.table('UserSurveys').select('''
-            Surveys(survey_id, survey_name)
-        ''').eq('user_id', user_id).execute().data
-        return [(s['Surveys']['survey_id'], s['Surveys']['survey_name']) for s in result]
-    except Exception as e:
-        st.error(f"حدث خطأ في جلب الاستبيانات المسموح بها: {str(e)}")
-        return []
-
 def view_survey_responses(survey_id):
     try:
-        survey = st.session_state.supabase.table('Surveys').select('survey_name').eq('survey_id', survey_id).execute().data
+        survey = get_client().table('Surveys').select('survey_name').eq('survey_id', survey_id).execute().data
         
         st.subheader(f"إجابات استبيان {survey[0]['survey_name']} (عرض فقط)")
         
-        responses = st.session_state.supabase.table('Responses').select('''
+        responses = get_client().table('Responses').select('''
             response_id, submission_date, is_completed
         ''').eq('survey_id', survey_id).eq('user_id', st.session_state.user_id).order('submission_date', desc=True).execute().data
         
@@ -241,7 +178,7 @@ def view_survey_responses(survey_id):
         )
 
         if selected_response_id:
-            details = st.session_state.supabase.table('Response_Details').select('''
+            details = get_client().table('Response_Details').select('''
                 Survey_Fields(field_label), answer_value
             ''').eq('response_id', selected_response_id).execute().data
 
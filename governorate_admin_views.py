@@ -1,31 +1,38 @@
 import streamlit as st
 import pandas as pd
-import json
 from database import (
-    get_governorate_admin_data,
+    get_client,
+    get_governorate,
     get_governorate_surveys,
     get_governorate_employees,
     update_survey,
     get_survey_fields,
+    get_survey_schema,
     update_user,
     get_user_allowed_surveys,
     update_user_allowed_surveys,
     get_response_info,
     get_response_details,
-    update_response_detail
+    update_response_details_bulk,
+    get_health_admins_by_governorate,
+    get_survey_daily_stats,
+    get_response_matrix
 )
+from view_helpers import paginated_frame
+from realtime_feed import get_response_feed, follow_response_feed
 
 def show_governorate_admin_dashboard():
     if st.session_state.get('role') != 'governorate_admin':
         st.error("غير مصرح لك بالوصول إلى هذه الصفحة")
         return
     
-    gov_data = get_governorate_admin_data(st.session_state.user_id)
+    # المحافظة محفوظة في هوية الجلسة وبياناتها من الذاكرة المؤقتة للمحافظات
+    gov_data = get_governorate(st.session_state.get('governorate_id'))
     if not gov_data:
         st.error("حسابك غير مرتبط بأي محافظة. يرجى التواصل مع مسؤول النظام.")
         return
     
-    governorate_id, governorate_name, description = gov_data
+    governorate_id, governorate_name, description = gov_data['governorate_id'], gov_data['governorate_name'], gov_data['description']
     
     st.set_page_config(layout="wide")
     st.title(f"لوحة تحكم محافظة {governorate_name}")
@@ -43,6 +50,13 @@ def show_governorate_admin_dashboard():
         view_governorate_data(governorate_id, governorate_name)
     with tab3:
         manage_governorate_employees(governorate_id, governorate_name)
+    
+    # المتابعة المباشرة تنتظر في نهاية الصفحة بعد عرض جميع التبويبات
+    live = st.session_state.pop('live_response_feed', None)
+    if live:
+        feed, version = live
+        follow_response_feed(feed, version, st.empty())
+        st.rerun()
 
 def manage_governorate_surveys(governorate_id, governorate_name):
     st.subheader(f"إدارة استبيانات محافظة {governorate_name}")
@@ -78,7 +92,7 @@ def edit_governorate_survey(survey_id, governorate_id):
     st.subheader("تعديل حالة الاستبيان")
     
     try:
-        survey = st.session_state.supabase.table('Surveys').select('survey_name, is_active').eq('survey_id', survey_id).execute().data
+        survey = get_client().table('Surveys').select('survey_name, is_active').eq('survey_id', survey_id).execute().data
         
         with st.form(f"edit_survey_{survey_id}"):
             st.text_input("اسم الاستبيان", value=survey[0]['survey_name'], disabled=True)
@@ -90,7 +104,7 @@ def edit_governorate_survey(survey_id, governorate_id):
             with col1:
                 save_btn = st.form_submit_button("💾 حفظ التعديلات")
                 if save_btn:
-                    st.session_state.supabase.table('Surveys').update({
+                    get_client().table('Surveys').update({
                         'is_active': is_active
                     }).eq('survey_id', survey_id).execute()
                     st.success("تم تحديث حالة الاستبيان بنجاح")
@@ -126,44 +140,50 @@ def view_governorate_data(governorate_id, governorate_name):
 
 def view_survey_responses(survey_id, governorate_id):
     try:
-        survey = st.session_state.supabase.table('Surveys').select('survey_name').eq('survey_id', survey_id).execute().data
+        survey = get_client().table('Surveys').select('survey_name').eq('survey_id', survey_id).execute().data
         st.subheader(f"إجابات استبيان {survey[0]['survey_name']}")
         
-        responses = st.session_state.supabase.table('Responses').select('''
-            response_id, 
-            Users(username), 
-            HealthAdministrations(admin_name, Governorates(governorate_name)),
-            submission_date, 
-            is_completed
-        ''').eq('survey_id', survey_id).eq('HealthAdministrations.governorate_id', governorate_id).execute().data
+        # الإجابات من الإطار المحفوظ في الذاكرة والمحدّث من قناة التغييرات اللحظية (realtime_feed.py)
+        feed = get_response_feed(survey_id, governorate_id)
+        version = feed.version
+        responses = feed.frame()
+        total, completed = len(responses), int(responses['is_completed'].sum())
         
-        if not responses:
+        if feed.live and st.toggle("🔴 متابعة مباشرة", key=f"live_responses_{survey_id}_{governorate_id}"):
+            st.session_state.live_response_feed = (feed, version)
+        
+        if not total:
             st.info("لا توجد إجابات مسجلة لهذا الاستبيان في محافظتك")
             return
         
-        total = len(responses)
-        completed = sum(1 for r in responses if r['is_completed'])
-        
         col1, col2, col3 = st.columns(3)
         col1.metric("إجمالي الإجابات", total)
         col2.metric("الإجابات المكتملة", completed)
         col3.metric("نسبة الإكمال", f"{round((completed/total)*100)}%")
         
-        df = pd.DataFrame(
-            [(r['response_id'], r['Users']['username'], 
-              r['HealthAdministrations']['admin_name'], 
-              r['HealthAdministrations']['Governorates']['governorate_name'],
-              r['submission_date'], 
-              "✔️" if r['is_completed'] else "✖️") 
-             for r in responses],
-            columns=["ID", "المستخدم", "الإدارة الصحية", "المحافظة", "التاريخ", "الحالة"]
-        )
+        daily = get_survey_daily_stats(survey_id, governorate_id)
+        if not daily.empty:
+            st.bar_chart(daily[['completed', 'draft']].rename(columns={'completed': 'مكتملة', 'draft': 'مسودة'}))
+        
+        page = paginated_frame(responses, key=f"gov_responses_{survey_id}_{governorate_id}")
+        df = pd.DataFrame({
+            "ID": page['response_id'],
+            "المستخدم": page['username'],
+            "الإدارة الصحية": page['admin_name'],
+            "المحافظة": get_governorate(governorate_id)['governorate_name'],
+            "التاريخ": page['submission_date'],
+            "الحالة": page['is_completed'].map({True: "✔️", False: "✖️"})
+        })
         
-        st.dataframe(df, use_container_width=True)
+        matrix = get_response_matrix(survey_id, df["ID"].tolist())
+        st.dataframe(
+            df.merge(matrix, left_on="ID", right_index=True, how='left', suffixes=("", " (إجابة)")),
+            use_container_width=True
+        )
         
         selected_response_id = st.selectbox(
             "اختر إجابة لعرض وتعديل تفاصيلها",
-            options=[r['response_id'] for r in responses],
+            options=df["ID"].tolist(),
             format_func=lambda x: f"إجابة #{x}",
             key=f"response_select_{survey_id}_{governorate_id}"
         )
@@ -181,6 +201,7 @@ def view_survey_responses(survey_id, governorate_id):
                 """)
                 
                 details = get_response_details(selected_response_id)
+                schema = get_survey_schema(survey_id)
                 updates = {}
                 
                 with st.form(key=f"edit_response_{survey_id}_{governorate_id}_{selected_response_id}"):
@@ -192,7 +213,8 @@ def view_survey_responses(survey_id, governorate_id):
                             st.markdown(f"**{label}**")
                         with col2:
                             if field_type == 'dropdown':
-                                options_list = json.loads(options) if options else []
+                                field = schema.by_id.get(field_id) if schema else None
+                                options_list = list(field.options) if field else []
                                 new_value = st.selectbox(
                                     f"تعديل {label}",
                                     options_list,
@@ -213,16 +235,9 @@ def view_survey_responses(survey_id, governorate_id):
                     with col1:
                         if st.form_submit_button("💾 حفظ جميع التعديلات"):
                             if updates:
-                                success_count = 0
-                                for detail_id, new_value in updates.items():
-                                    if update_response_detail(detail_id, new_value):
-                                        success_count += 1
-                                
-                                if success_count == len(updates):
+                                if update_response_details_bulk(updates, selected_response_id):
                                     st.success("تم تحديث جميع التعديلات بنجاح")
-                                else:
-                                    st.error(f"تم تحديث {success_count} من أصل {len(updates)} تعديلات")
-                                st.rerun()
+                                    st.rerun()
                             else:
                                 st.info("لم تقم بإجراء أي تعديلات")
                     with col2:
@@ -263,7 +278,7 @@ def edit_employee(user_id, governorate_id):
     st.subheader("تعديل بيانات الموظف")
     
     try:
-        employee = st.session_state.supabase.table('Users').select('''
+        employee = get_client().table('Users').select('''
             username, assigned_region, HealthAdministrations(admin_name)
         ''').eq('user_id', user_id).execute().data
         
@@ -273,7 +288,7 @@ def edit_employee(user_id, governorate_id):
             return
         
         employee = employee[0]
-        health_admins = st.session_state.supabase.table('HealthAdministrations').select('admin_id, admin_name').eq('governorate_id', governorate_id).order('admin_name').execute().data
+        health_admins = sorted(get_health_admins_by_governorate(governorate_id), key=lambda a: a['admin_name'])
         
         surveys = get_governorate_surveys(governorate_id)
         allowed_surveys = get_user_allowed_surveys(user_id)
@@ -312,7 +327,7 @@ def edit_employee(user_id, governorate_id):
             if submit_btn:
                 update_user(user_id, employee['username'], 'employee', selected_admin)
                 
-                if update_user_allowed_surveys(user_id, selected_surveys):
+                if update_user_allowed_surveys(user_id, selected_surveys, current_ids=allowed_survey_ids):
                     st.success("تم تحديث بيانات الموظف بنجاح")
                     del st.session_state.editing_employee
                     st.rerun()
@@ -0,0 +1,159 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Any
+
+import pandas as pd
+import streamlit as st
+
+# تسجيل استعلامات قاعدة البيانات في كل إعادة تشغيل (rerun) للصفحة:
+# الجدول، الفلاتر، عدد الصفوف، حجم البيانات، والزمن المستغرق لكل execute()
+
+ACTIONS = {'select', 'insert', 'update', 'upsert', 'delete'}
+
+
+class QueryLog:
+    """سجل استعلامات إعادة التشغيل الحالية"""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self.scope = "عام"
+
+    def add(self, record: Dict):
+        record['scope'] = self.scope
+        self.records.append(record)
+
+
+def _describe(value: Any) -> str:
+    if isinstance(value, (list, tuple, set)) and len(value) > 5:
+        return f"[{len(value)} قيمة]"
+    text = str(value)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def _payload_bytes(data: Any) -> int:
+    return len(json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+class InstrumentedQuery:
+    """غلاف لمنشئ الاستعلام يسجل الفلاتر وزمن التنفيذ"""
+
+    def __init__(self, builder: Any, log: QueryLog, table: str):
+        self._builder = builder
+        self._log = log
+        self._table = table
+        self._action = 'select'
+        self._filters: List[str] = []
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = [a._builder if isinstance(a, InstrumentedQuery) else a for a in args]
+            self._builder = attr(*args, **kwargs)
+            if name in ACTIONS:
+                self._action = name
+            else:
+                self._filters.append(f"{name}({', '.join(_describe(a) for a in args)})")
+            return self
+        return call
+
+    def execute(self) -> Any:
+        start = time.perf_counter()
+        response, error = None, None
+        try:
+            response = self._builder.execute()
+            return response
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            data = getattr(response, 'data', None)
+            self._log.add({
+                'table': self._table,
+                'action': self._action,
+                'filters': ', '.join(self._filters),
+                'rows': len(data) if isinstance(data, list) else (1 if data else 0),
+                'bytes': _payload_bytes(data) if data is not None else 0,
+                'ms': (time.perf_counter() - start) * 1000,
+                'error': error
+            })
+
+
+class InstrumentedClient:
+    """غلاف لعميل قاعدة البيانات يعيد منشئات استعلام مسجلة"""
+
+    def __init__(self, client: Any, log: QueryLog):
+        self._client = client
+        self._log = log
+
+    def table(self, name: str) -> InstrumentedQuery:
+        return InstrumentedQuery(self._client.table(name), self._log, name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> InstrumentedQuery:
+        query = InstrumentedQuery(self._client.rpc(name, params or {}), self._log, f"rpc:{name}")
+        query._action = 'rpc'
+        return query
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def start_query_log():
+    """بدء سجل جديد لإعادة التشغيل الحالية إذا كانت لوحة الاستعلامات مفعلة"""
+    if st.session_state.get('show_query_panel'):
+        st.session_state.query_log = QueryLog()
+    else:
+        st.session_state.pop('query_log', None)
+
+
+def current_query_log() -> Optional[QueryLog]:
+    return st.session_state.get('query_log')
+
+
+@contextmanager
+def query_scope(name: str):
+    """نسب الاستعلامات المنفذة داخل الكتلة إلى تبويب أو قسم معين"""
+    log = current_query_log()
+    if log is None:
+        yield
+        return
+    previous, log.scope = log.scope, name
+    try:
+        yield
+    finally:
+        log.scope = previous
+
+
+def render_query_panel():
+    """لوحة جانبية لمسؤول النظام تعرض استعلامات إعادة التشغيل الحالية"""
+    enabled = st.sidebar.checkbox("📊 عرض إحصاءات الاستعلامات", key="show_query_panel")
+    log = current_query_log()
+    if not enabled or log is None:
+        return
+
+    with st.sidebar.expander("إحصاءات الاستعلامات", expanded=True):
+        if not log.records:
+            st.info("لم يتم تنفيذ أي استعلام")
+            return
+
+        df = pd.DataFrame(log.records)
+        col1, col2 = st.columns(2)
+        col1.metric("عدد الاستعلامات", len(df))
+        col2.metric("الزمن الكلي", f"{df['ms'].sum():.0f} ms")
+
+        st.markdown("**حسب القسم**")
+        st.dataframe(
+            df.groupby('scope').agg(queries=('ms', 'size'), ms=('ms', 'sum'), bytes=('bytes', 'sum'))
+            .sort_values('ms', ascending=False).round(1),
+            use_container_width=True
+        )
+
+        st.markdown("**أبطأ الاستعلامات**")
+        st.dataframe(
+            df.sort_values('ms', ascending=False).head(10)[['scope', 'table', 'action', 'filters', 'rows', 'bytes', 'ms']].round(1),
+            use_container_width=True,
+            hide_index=True
+        )
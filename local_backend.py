@@ -0,0 +1,869 @@
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple, Any, Callable
+
+# بديل محلي لعميل Supabase مبني على SQLite يطبق الجزء المستخدم في التطبيق من
+# واجهة الاستعلامات: table().select/insert/update/delete + eq/in_/order/... + execute()
+# بالإضافة إلى الاختيارات المضمنة مثل HealthAdministrations(admin_name, Governorates(governorate_name))
+# يتم اختياره بالإعداد DB_BACKEND = "sqlite" (انظر database.get_client)
+
+SCHEMA = """
+create table if not exists Governorates (
+    governorate_id integer primary key autoincrement,
+    governorate_name text not null unique,
+    description text
+);
+create table if not exists HealthAdministrations (
+    admin_id integer primary key autoincrement,
+    admin_name text not null,
+    description text,
+    governorate_id integer not null references Governorates(governorate_id)
+);
+create table if not exists Users (
+    user_id integer primary key autoincrement,
+    username text not null unique,
+    password_hash text not null,
+    role text not null,
+    assigned_region integer references HealthAdministrations(admin_id),
+    last_login text,
+    last_activity text
+);
+create table if not exists GovernorateAdmins (
+    id integer primary key autoincrement,
+    user_id integer not null references Users(user_id),
+    governorate_id integer not null references Governorates(governorate_id)
+);
+create table if not exists Surveys (
+    survey_id integer primary key autoincrement,
+    survey_name text not null,
+    created_by integer references Users(user_id),
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')),
+    is_active integer not null default 1
+);
+create table if not exists Survey_Fields (
+    field_id integer primary key autoincrement,
+    survey_id integer not null references Surveys(survey_id),
+    field_label text not null,
+    field_type text not null,
+    field_options text,
+    is_required integer not null default 0,
+    field_order integer not null default 0
+);
+create table if not exists SurveyGovernorate (
+    id integer primary key autoincrement,
+    survey_id integer not null references Surveys(survey_id),
+    governorate_id integer not null references Governorates(governorate_id)
+);
+create table if not exists UserSurveys (
+    id integer primary key autoincrement,
+    user_id integer not null references Users(user_id),
+    survey_id integer not null references Surveys(survey_id)
+);
+create table if not exists Responses (
+    response_id integer primary key autoincrement,
+    survey_id integer not null references Surveys(survey_id),
+    user_id integer not null references Users(user_id),
+    region_id integer references HealthAdministrations(admin_id),
+    submission_date text not null default (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')),
+    is_completed integer not null default 0
+);
+create table if not exists Response_Details (
+    detail_id integer primary key autoincrement,
+    response_id integer not null references Responses(response_id),
+    field_id integer not null references Survey_Fields(field_id),
+    answer_value text
+);
+create table if not exists AuditLog (
+    log_id integer primary key autoincrement,
+    user_id integer references Users(user_id),
+    action_type text not null,
+    table_name text not null,
+    record_id integer,
+    old_value text,
+    new_value text,
+    action_timestamp text not null default (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')),
+    search_text text
+);
+create index if not exists responses_survey_keyset_idx on Responses (survey_id, submission_date desc, response_id desc);
+create index if not exists responses_user_completion_idx on Responses (user_id, survey_id, is_completed, submission_date);
+create unique index if not exists responses_one_completed_per_day_idx on Responses (user_id, survey_id, substr(submission_date, 1, 10)) where is_completed = 1;
+create index if not exists audit_log_timestamp_idx on AuditLog (action_timestamp desc, log_id desc);
+
+-- مكافئ فهرس trigram في sql/005_audit_log_search.sql: جدول FTS5 بمقسم trigram يخدم like '%...%'
+create virtual table if not exists AuditLog_search using fts5(search_text, tokenize = 'trigram');
+create trigger if not exists audit_log_search_insert after insert on AuditLog begin
+    update AuditLog set search_text = lower(new.action_type || ' ' || new.table_name || ' ' ||
+        coalesce(new.old_value, '') || ' ' || coalesce(new.new_value, '') || ' ' ||
+        coalesce((select username from Users where user_id = new.user_id), ''))
+    where log_id = new.log_id;
+    insert into AuditLog_search (rowid, search_text) select log_id, search_text from AuditLog where log_id = new.log_id;
+end;
+create trigger if not exists audit_log_search_delete after delete on AuditLog begin
+    delete from AuditLog_search where rowid = old.log_id;
+end;
+create index if not exists response_details_response_idx on Response_Details (response_id);
+create index if not exists survey_fields_survey_idx on Survey_Fields (survey_id, field_order);
+
+-- مكافئ sql/010_response_rollups.sql: إحصاءات يومية مجمعة يحدّثها مشغل عند كل إضافة أو تعديل أو حذف لإجابة
+create table if not exists ResponseDailyStats (
+    survey_id integer not null,
+    admin_id integer not null,
+    day text not null,
+    governorate_id integer,
+    submitted integer not null default 0,
+    completed integer not null default 0,
+    draft integer not null default 0,
+    primary key (survey_id, admin_id, day)
+);
+create index if not exists response_daily_stats_governorate_idx on ResponseDailyStats (governorate_id, survey_id);
+create trigger if not exists health_admin_rollup_governorate after update of governorate_id on HealthAdministrations
+when old.governorate_id is not new.governorate_id begin
+    update ResponseDailyStats set governorate_id = new.governorate_id where admin_id = new.admin_id;
+end;
+create trigger if not exists responses_rollup_insert after insert on Responses begin
+    insert into ResponseDailyStats (survey_id, admin_id, day, governorate_id, submitted, completed, draft)
+    values (new.survey_id, coalesce(new.region_id, 0), substr(new.submission_date, 1, 10),
+            (select governorate_id from HealthAdministrations where admin_id = new.region_id),
+            1, new.is_completed = 1, new.is_completed = 0)
+    on conflict (survey_id, admin_id, day) do update set submitted = submitted + excluded.submitted,
+        completed = completed + excluded.completed, draft = draft + excluded.draft;
+end;
+create trigger if not exists responses_rollup_delete after delete on Responses begin
+    update ResponseDailyStats set submitted = submitted - 1, completed = completed - (old.is_completed = 1),
+        draft = draft - (old.is_completed = 0)
+    where survey_id = old.survey_id and admin_id = coalesce(old.region_id, 0) and day = substr(old.submission_date, 1, 10);
+end;
+create trigger if not exists responses_rollup_update
+after update of survey_id, region_id, submission_date, is_completed on Responses begin
+    update ResponseDailyStats set submitted = submitted - 1, completed = completed - (old.is_completed = 1),
+        draft = draft - (old.is_completed = 0)
+    where survey_id = old.survey_id and admin_id = coalesce(old.region_id, 0) and day = substr(old.submission_date, 1, 10);
+    insert into ResponseDailyStats (survey_id, admin_id, day, governorate_id, submitted, completed, draft)
+    values (new.survey_id, coalesce(new.region_id, 0), substr(new.submission_date, 1, 10),
+            (select governorate_id from HealthAdministrations where admin_id = new.region_id),
+            1, new.is_completed = 1, new.is_completed = 0)
+    on conflict (survey_id, admin_id, day) do update set submitted = submitted + excluded.submitted,
+        completed = completed + excluded.completed, draft = draft + excluded.draft;
+end;
+"""
+
+BOOLEAN_COLUMNS = {'is_active', 'is_required', 'is_completed'}
+
+# مكافئ قناة Supabase Realtime (sql/011_responses_realtime.sql): المشغلات تسجل التغييرات أثناء المعاملة
+# ويتم نشرها على LocalClient.realtime بعد تثبيتها فقط
+REALTIME_TRIGGERS = """
+create temp trigger if not exists responses_realtime_insert after insert on Responses begin
+    select realtime_notify('Responses', 'INSERT', json_object('response_id', new.response_id, 'survey_id', new.survey_id,
+        'user_id', new.user_id, 'region_id', new.region_id, 'submission_date', new.submission_date,
+        'is_completed', new.is_completed), null);
+end;
+create temp trigger if not exists responses_realtime_update after update on Responses begin
+    select realtime_notify('Responses', 'UPDATE', json_object('response_id', new.response_id, 'survey_id', new.survey_id,
+        'user_id', new.user_id, 'region_id', new.region_id, 'submission_date', new.submission_date,
+        'is_completed', new.is_completed), json_object('response_id', old.response_id, 'survey_id', old.survey_id,
+        'user_id', old.user_id, 'region_id', old.region_id, 'submission_date', old.submission_date,
+        'is_completed', old.is_completed));
+end;
+create temp trigger if not exists responses_realtime_delete after delete on Responses begin
+    select realtime_notify('Responses', 'DELETE', null, json_object('response_id', old.response_id, 'survey_id', old.survey_id,
+        'user_id', old.user_id, 'region_id', old.region_id, 'submission_date', old.submission_date,
+        'is_completed', old.is_completed));
+end;
+"""
+
+# العلاقات المستخدمة في الاختيارات المضمنة:
+# (الجدول الأب، الجدول المضمن) -> (عمود الأب، عمود الجدول المضمن، هل العلاقة متعددة)
+RELATIONS = {
+    ('Users', 'HealthAdministrations'): ('assigned_region', 'admin_id', False),
+    ('Users', 'GovernorateAdmins'): ('user_id', 'user_id', True),
+    ('Users', 'UserSurveys'): ('user_id', 'user_id', True),
+    ('GovernorateAdmins', 'Governorates'): ('governorate_id', 'governorate_id', False),
+    ('GovernorateAdmins', 'Users'): ('user_id', 'user_id', False),
+    ('HealthAdministrations', 'Governorates'): ('governorate_id', 'governorate_id', False),
+    ('Governorates', 'HealthAdministrations'): ('governorate_id', 'governorate_id', True),
+    ('Surveys', 'Survey_Fields'): ('survey_id', 'survey_id', True),
+    ('Survey_Fields', 'Surveys'): ('survey_id', 'survey_id', False),
+    ('SurveyGovernorate', 'Surveys'): ('survey_id', 'survey_id', False),
+    ('SurveyGovernorate', 'Governorates'): ('governorate_id', 'governorate_id', False),
+    ('UserSurveys', 'Surveys'): ('survey_id', 'survey_id', False),
+    ('UserSurveys', 'Users'): ('user_id', 'user_id', False),
+    ('Responses', 'Users'): ('user_id', 'user_id', False),
+    ('Responses', 'Surveys'): ('survey_id', 'survey_id', False),
+    ('Responses', 'HealthAdministrations'): ('region_id', 'admin_id', False),
+    ('Responses', 'Response_Details'): ('response_id', 'response_id', True),
+    ('Response_Details', 'Responses'): ('response_id', 'response_id', False),
+    ('Response_Details', 'Survey_Fields'): ('field_id', 'field_id', False),
+    ('AuditLog', 'Users'): ('user_id', 'user_id', False),
+}
+
+# أعمدة البحث الجزئي المفهرسة بجداول FTS5 (trigram)، وrowid في الجدول الافتراضي هو المفتاح الأساسي
+SEARCH_INDEXES = {
+    ('AuditLog', 'search_text'): 'AuditLog_search',
+}
+
+OPERATORS = {
+    'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=',
+    'like': 'like', 'ilike': 'like', 'is': 'is', 'in': 'in'
+}
+
+
+class LocalBackendError(Exception):
+    """خطأ في تنفيذ استعلام على الواجهة المحلية"""
+
+
+class LocalResponse:
+    """نتيجة التنفيذ بنفس شكل استجابة postgrest (data و count)"""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(text: str) -> List[str]:
+    """تقسيم النص على الفواصل خارج الأقواس وعلامات التنصيص"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _parse_select(columns: str) -> Tuple[List[str], List[Dict]]:
+    """تحليل نص الاختيار إلى أعمدة وجداول مضمنة (متداخلة)"""
+    fields, embeds = [], []
+    for item in _split_top_level(' '.join(columns.split())):
+        match = re.match(r'^(?:(\w+):)?(\w+)(?:!(\w+))?\s*\((.*)\)$', item, re.S)
+        if match:
+            alias, table, hint, inner = match.groups()
+            sub_fields, sub_embeds = _parse_select(inner)
+            embeds.append({
+                'name': alias or table,
+                'table': table,
+                'inner': hint == 'inner',
+                'fields': sub_fields,
+                'embeds': sub_embeds
+            })
+        else:
+            fields.append(item)
+    return fields, embeds
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _parse_condition(text: str) -> Tuple[str, str, Any]:
+    """تحليل شرط بصيغة PostgREST: column.operator.value"""
+    tokens = text.split('.')
+    for i, token in enumerate(tokens):
+        if i > 0 and token in OPERATORS:
+            value = _unquote('.'.join(tokens[i + 1:]))
+            if token == 'in':
+                value = [_unquote(v) for v in _split_top_level(value.strip('()'))]
+            return '.'.join(tokens[:i]), token, value
+    raise LocalBackendError(f"شرط غير مدعوم: {text}")
+
+
+def _to_db(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _from_db(row: sqlite3.Row) -> Dict:
+    record = dict(row)
+    for column in BOOLEAN_COLUMNS.intersection(record):
+        if record[column] is not None:
+            record[column] = bool(record[column])
+    return record
+
+
+class LocalQuery:
+    """منشئ استعلام يحاكي postgrest-py فوق SQLite"""
+
+    def __init__(self, client: 'LocalClient', table: str):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = '*'
+        self.count_mode = None
+        self.payload = None
+        self.filters = []
+        self.or_groups = []
+        self.orders = []
+        self.limit_value = None
+        self.offset_value = None
+
+    # --- الإجراءات ---
+    def select(self, *columns: str, count: Optional[str] = None) -> 'LocalQuery':
+        self.action = 'select'
+        self.columns = ','.join(columns) if columns else '*'
+        self.count_mode = count
+        return self
+
+    def insert(self, data: Any) -> 'LocalQuery':
+        self.action = 'insert'
+        self.payload = data
+        return self
+
+    def update(self, data: Dict) -> 'LocalQuery':
+        self.action = 'update'
+        self.payload = data
+        return self
+
+    def delete(self) -> 'LocalQuery':
+        self.action = 'delete'
+        return self
+
+    # --- الفلاتر ---
+    def _filter(self, column: str, operator: str, value: Any) -> 'LocalQuery':
+        self.filters.append((column, operator, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'lte', value)
+
+    def like(self, column: str, pattern: str) -> 'LocalQuery':
+        return self._filter(column, 'like', pattern)
+
+    def ilike(self, column: str, pattern: str) -> 'LocalQuery':
+        return self._filter(column, 'ilike', pattern)
+
+    def is_(self, column: str, value: Any) -> 'LocalQuery':
+        return self._filter(column, 'is', value)
+
+    def in_(self, column: str, values: Any) -> 'LocalQuery':
+        if isinstance(values, LocalQuery):
+            values = [next(iter(row.values())) for row in values.execute().data]
+        return self._filter(column, 'in', list(values))
+
+    def or_(self, filters: str) -> 'LocalQuery':
+        self.or_groups.append(filters)
+        return self
+
+    def order(self, column: str, desc: bool = False) -> 'LocalQuery':
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int) -> 'LocalQuery':
+        self.limit_value = size
+        return self
+
+    def range(self, start: int, end: int) -> 'LocalQuery':
+        self.offset_value = start
+        self.limit_value = end - start + 1
+        return self
+
+    # --- بناء SQL ---
+    def _condition_sql(self, table: str, column: str, operator: str, value: Any,
+                       embeds: Dict[str, Dict]) -> Tuple[str, List]:
+        if '.' in column:
+            name, sub_column = column.split('.', 1)
+            embed = embeds.get(name, {'table': name})
+            parent_col, child_col, _ = RELATIONS[(table, embed['table'])]
+            sql, params = self._condition_sql(embed['table'], sub_column, operator, value, {})
+            return (f'exists (select 1 from "{embed["table"]}" where "{embed["table"]}"."{child_col}" = "{table}"."{parent_col}" and {sql})', params)
+
+        target = f'"{table}"."{column}"'
+        if operator == 'in':
+            if not value:
+                return '0', []
+            return f'{target} in ({", ".join("?" * len(value))})', [_to_db(v) for v in value]
+        if operator == 'is':
+            return f'{target} is {"null" if value in (None, "null") else "not null"}', []
+        if operator in ('like', 'ilike'):
+            index = SEARCH_INDEXES.get((table, column))
+            if index:
+                return (f'"{table}".rowid in (select rowid from "{index}" where search_text like ?)',
+                        [str(value).replace('*', '%')])
+            return f'{target} like ?', [str(value).replace('*', '%')]
+        if isinstance(value, bool):
+            value = int(value)
+        elif value in ('true', 'false') and column in BOOLEAN_COLUMNS:
+            value = int(value == 'true')
+        return f'{target} {OPERATORS[operator]} ?', [_to_db(value)]
+
+    def _or_sql(self, table: str, text: str, embeds: Dict[str, Dict]) -> Tuple[str, List]:
+        clauses, params = [], []
+        for part in _split_top_level(text):
+            group = re.match(r'^(and|or)\((.*)\)$', part, re.S)
+            if group:
+                joiner = f' {group.group(1)} '
+                sub = [self._or_sql(table, item, embeds) for item in _split_top_level(group.group(2))]
+                clauses.append('(' + joiner.join(s for s, _ in sub) + ')')
+                params.extend(p for _, ps in sub for p in ps)
+            else:
+                sql, ps = self._condition_sql(table, *_parse_condition(part), embeds)
+                clauses.append(sql)
+                params.extend(ps)
+        return '(' + ' or '.join(clauses) + ')', params
+
+    def _where(self, embeds: Dict[str, Dict]) -> Tuple[str, List]:
+        clauses, params = [], []
+        for column, operator, value in self.filters:
+            # فلاتر الجداول المضمنة غير الداخلية تطبق على الصفوف المضمنة فقط
+            if '.' in column and not embeds.get(column.split('.', 1)[0], {}).get('inner'):
+                continue
+            sql, ps = self._condition_sql(self.table, column, operator, value, embeds)
+            clauses.append(sql)
+            params.extend(ps)
+        for text in self.or_groups:
+            sql, ps = self._or_sql(self.table, text, embeds)
+            clauses.append(sql)
+            params.extend(ps)
+        return (' where ' + ' and '.join(clauses)) if clauses else '', params
+
+    # --- التنفيذ ---
+    def execute(self) -> LocalResponse:
+        with self.client.lock:
+            self.client.round_trips += 1
+            conn = self.client.conn
+            try:
+                if self.action == 'select':
+                    result = self._execute_select(conn)
+                elif self.action == 'insert':
+                    result = self._execute_insert(conn)
+                elif self.action == 'update':
+                    result = self._execute_update(conn)
+                else:
+                    result = self._execute_delete(conn)
+                conn.commit()
+                self.client.publish_changes()
+                return result
+            except sqlite3.Error as e:
+                conn.rollback()
+                self.client.discard_changes()
+                raise LocalBackendError(str(e)) from e
+
+    def _execute_select(self, conn: sqlite3.Connection) -> LocalResponse:
+        fields, embeds = _parse_select(self.columns)
+        embeds_by_name = {e['name']: e for e in embeds}
+        where, params = self._where(embeds_by_name)
+
+        count = None
+        if self.count_mode:
+            count = conn.execute(f'select count(*) from "{self.table}"{where}', params).fetchone()[0]
+
+        sql = f'select * from "{self.table}"{where}'
+        if self.orders:
+            sql += ' order by ' + ', '.join(f'"{c}" {"desc" if d else "asc"}' for c, d in self.orders)
+        if self.limit_value is not None:
+            sql += f' limit {int(self.limit_value)}'
+            if self.offset_value:
+                sql += f' offset {int(self.offset_value)}'
+        rows = [_from_db(r) for r in conn.execute(sql, params).fetchall()]
+
+        embed_filters = [(c.split('.', 1), o, v) for c, o, v in self.filters if '.' in c]
+        data = _project(conn, self.table, rows, fields, embeds, embed_filters)
+        return LocalResponse(data, count)
+
+    def _execute_insert(self, conn: sqlite3.Connection) -> LocalResponse:
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        inserted = []
+        for row in rows:
+            columns = list(row)
+            names = ', '.join('"%s"' % c for c in columns)
+            sql = f'insert into "{self.table}" ({names}) values ({", ".join("?" * len(columns))}) returning *'
+            inserted.append(_from_db(conn.execute(sql, [_to_db(row[c]) for c in columns]).fetchone()))
+        return LocalResponse(inserted)
+
+    def _execute_update(self, conn: sqlite3.Connection) -> LocalResponse:
+        where, params = self._where({})
+        assignments = ', '.join(f'"{c}" = ?' for c in self.payload)
+        sql = f'update "{self.table}" set {assignments}{where} returning *'
+        rows = conn.execute(sql, [_to_db(v) for v in self.payload.values()] + params).fetchall()
+        return LocalResponse([_from_db(r) for r in rows])
+
+    def _execute_delete(self, conn: sqlite3.Connection) -> LocalResponse:
+        where, params = self._where({})
+        rows = conn.execute(f'delete from "{self.table}"{where} returning *', params).fetchall()
+        return LocalResponse([_from_db(r) for r in rows])
+
+
+def _matches(actual: Any, operator: str, value: Any) -> bool:
+    if operator == 'in':
+        return actual in value or str(actual) in [str(v) for v in value]
+    if operator == 'is':
+        return (actual is None) == (value in (None, 'null'))
+    if operator in ('like', 'ilike'):
+        pattern = '^' + re.escape(str(value)).replace('%', '.*').replace(r'\*', '.*') + '$'
+        return actual is not None and re.match(pattern, str(actual), re.I if operator == 'ilike' else 0) is not None
+    if actual is None:
+        return False
+    if isinstance(actual, bool):
+        value = value if isinstance(value, bool) else str(value).lower() == 'true'
+    elif isinstance(actual, (int, float)) and not isinstance(value, (int, float)):
+        value = type(actual)(value)
+    return {
+        'eq': actual == value, 'neq': actual != value,
+        'gt': actual > value, 'gte': actual >= value,
+        'lt': actual < value, 'lte': actual <= value
+    }[operator]
+
+
+def _project(conn: sqlite3.Connection, table: str, rows: List[Dict], fields: List[str],
+             embeds: List[Dict], embed_filters: List) -> List[Dict]:
+    """اختيار الأعمدة المطلوبة وإلحاق الجداول المضمنة بدفعة استعلام واحدة لكل علاقة"""
+    return [record for _, record in _project_rows(conn, table, rows, fields, embeds, embed_filters)]
+
+
+def _project_rows(conn: sqlite3.Connection, table: str, rows: List[Dict], fields: List[str],
+                  embeds: List[Dict], embed_filters: List) -> List[Tuple[Dict, Dict]]:
+    for embed in embeds:
+        parent_col, child_col, many = RELATIONS[(table, embed['table'])]
+        keys = list({r[parent_col] for r in rows if r.get(parent_col) is not None})
+        children = []
+        if keys:
+            sql = f'select * from "{embed["table"]}" where "{child_col}" in ({", ".join("?" * len(keys))})'
+            children = [_from_db(r) for r in conn.execute(sql, keys).fetchall()]
+        own_filters = [(path[1], o, v) for path, o, v in embed_filters if path[0] == embed['name']]
+        children = [c for c in children if all(
+            '.' not in col and _matches(c.get(col), o, v) for col, o, v in own_filters
+        )]
+        nested_filters = [(col.split('.', 1), o, v) for col, o, v in own_filters if '.' in col]
+        projected = _project_rows(conn, embed['table'], children, embed['fields'], embed['embeds'], nested_filters)
+
+        grouped = {}
+        for raw, child in projected:
+            grouped.setdefault(raw[child_col], []).append(child)
+        for row in rows:
+            matched = grouped.get(row.get(parent_col), [])
+            row['__embed__' + embed['name']] = matched if many else (matched[0] if matched else None)
+
+    if embeds and any(e['inner'] for e in embeds):
+        rows = [r for r in rows if all(r['__embed__' + e['name']] for e in embeds if e['inner'])]
+
+    result = []
+    for row in rows:
+        if '*' in fields:
+            record = {k: v for k, v in row.items() if not k.startswith('__embed__')}
+        else:
+            record = {}
+            for field in fields:
+                alias, _, column = field.rpartition(':')
+                if column in row:
+                    record[alias or column] = row[column]
+        for embed in embeds:
+            record[embed['name']] = row['__embed__' + embed['name']]
+        result.append((row, record))
+    return result
+
+
+class LocalRpc:
+    """استدعاء إجراء مخزن محلي بنفس شكل client.rpc(...).execute()"""
+
+    def __init__(self, client: 'LocalClient', name: str, params: Dict):
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self) -> LocalResponse:
+        procedure = PROCEDURES.get(self.name)
+        if procedure is None:
+            raise LocalBackendError(f"الإجراء غير موجود: {self.name}")
+        with self.client.lock:
+            self.client.round_trips += 1
+            conn = self.client.conn
+            try:
+                result = procedure(conn, **self.params)
+                conn.commit()
+                self.client.publish_changes()
+                return LocalResponse(result)
+            except sqlite3.Error as e:
+                conn.rollback()
+                self.client.discard_changes()
+                raise LocalBackendError(str(e)) from e
+            except Exception:
+                conn.rollback()
+                self.client.discard_changes()
+                raise
+
+
+class LocalRealtime:
+    """ناشر محلي بديل لقناة Supabase Realtime (postgres_changes) للواجهة المحلية والاختبارات
+
+    الاشتراك مصفى بقيم عمود واحد مثل survey_id=eq.<قيمة>، والمستدعى يستقبل
+    (نوع الحدث، السجل الجديد، السجل القديم) بعد تثبيت المعاملة
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Tuple[str, frozenset, Callable]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, table: str, column: str, values: List[Any],
+                  callback: Callable[[str, Optional[Dict], Optional[Dict]], None]) -> Callable[[], None]:
+        entry = (column, frozenset(values), callback)
+        with self._lock:
+            self._subscribers.setdefault(table, []).append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers.get(table, []):
+                    self._subscribers[table].remove(entry)
+        return unsubscribe
+
+    def has_subscribers(self, table: str) -> bool:
+        return bool(self._subscribers.get(table))
+
+    def is_alive(self) -> bool:
+        return True
+
+    def publish(self, table: str, event_type: str, record: Optional[Dict], old_record: Optional[Dict] = None):
+        # مثل الخادم: يطابق الفلتر السجل الجديد، والسجل القديم لأحداث الحذف فقط
+        matched = old_record if event_type == 'DELETE' else record
+        with self._lock:
+            subscribers = list(self._subscribers.get(table, []))
+        for column, values, callback in subscribers:
+            if (matched or {}).get(column) in values:
+                callback(event_type, record, old_record)
+
+
+class LocalClient:
+    """عميل محلي بديل لعميل Supabase يعمل على ملف SQLite (أو في الذاكرة)"""
+
+    def __init__(self, path: str = ':memory:'):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('pragma foreign_keys = on')
+        self.conn.execute('pragma journal_mode = wal')
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self.round_trips = 0
+        self.realtime = LocalRealtime()
+        self._changes: List[Tuple[str, str, Optional[str], Optional[str]]] = []
+        self.conn.create_function('realtime_notify', 4, self._record_change)
+        self.conn.executescript(REALTIME_TRIGGERS)
+
+    def _record_change(self, table: str, event_type: str, record: Optional[str], old_record: Optional[str]):
+        if self.realtime.has_subscribers(table):
+            self._changes.append((table, event_type, record, old_record))
+
+    def publish_changes(self):
+        """نشر التغييرات المسجلة في المعاملة التي تم تثبيتها للتو"""
+        changes, self._changes = self._changes, []
+        for table, event_type, record, old_record in changes:
+            self.realtime.publish(table, event_type, _decode_change(record), _decode_change(old_record))
+
+    def discard_changes(self):
+        self._changes = []
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> LocalRpc:
+        return LocalRpc(self, name, params)
+
+
+def _decode_change(value: Optional[str]) -> Optional[Dict]:
+    if value is None:
+        return None
+    return {k: bool(v) if k in BOOLEAN_COLUMNS and v is not None else v for k, v in json.loads(value).items()}
+
+
+# --- الإجراءات المخزنة المحلية (مكافئة لملفات sql/) ---
+
+def _today_bounds() -> Tuple[str, str]:
+    today = datetime.now().strftime('%Y-%m-%d')
+    return f'{today}T00:00:00', f'{today}T23:59:59.999'
+
+
+def _submit_survey(conn: sqlite3.Connection, p_survey_id: int, p_user_id: int, p_region_id: int,
+                   p_is_completed: bool, p_answers: Dict[str, str]) -> Dict:
+    # الإكمال المكرر في نفس اليوم يتعارض مع responses_one_completed_per_day_idx
+    inserted = conn.execute(
+        'insert into Responses (survey_id, user_id, region_id, is_completed) values (?, ?, ?, ?) '
+        'on conflict do nothing returning response_id',
+        (p_survey_id, p_user_id, p_region_id, int(p_is_completed))
+    ).fetchone()
+    if inserted is None:
+        return {'response_id': None, 'already_completed': True}
+    response_id = inserted[0]
+    conn.executemany(
+        'insert into Response_Details (response_id, field_id, answer_value) values (?, ?, ?)',
+        [(response_id, int(field_id), value) for field_id, value in (p_answers or {}).items()]
+    )
+    return {'response_id': response_id, 'already_completed': False}
+
+
+def _employee_bootstrap(conn: sqlite3.Connection, p_user_id: int) -> Optional[Dict]:
+    user = conn.execute('select last_login, assigned_region from Users where user_id = ?', (p_user_id,)).fetchone()
+    if user is None:
+        return None
+
+    region = conn.execute(
+        'select h.admin_id, h.admin_name, g.governorate_id, g.governorate_name from HealthAdministrations h '
+        'join Governorates g on g.governorate_id = h.governorate_id where h.admin_id = ?',
+        (user['assigned_region'],)
+    ).fetchone()
+
+    start, end = _today_bounds()
+    surveys = [dict(row) for row in conn.execute(
+        'select s.survey_id, s.survey_name, s.created_at, exists ('
+        '  select 1 from Responses r where r.user_id = us.user_id and r.survey_id = s.survey_id and r.is_completed = 1'
+        '  and r.submission_date >= ? and r.submission_date <= ?) as completed_today '
+        'from UserSurveys us join Surveys s on s.survey_id = us.survey_id where us.user_id = ? order by s.survey_id',
+        (start, end, p_user_id)
+    )]
+    fields: Dict[int, List[Dict]] = {s['survey_id']: [] for s in surveys}
+    if surveys:
+        placeholders = ', '.join('?' * len(fields))
+        for row in conn.execute(
+            'select survey_id, field_id, field_label, field_type, field_options, is_required, field_order '
+            f'from Survey_Fields where survey_id in ({placeholders}) order by field_order', list(fields)
+        ):
+            field = dict(row)
+            field['is_required'] = bool(field['is_required'])
+            fields[field.pop('survey_id')].append(field)
+    for survey in surveys:
+        survey['completed_today'] = bool(survey['completed_today'])
+        survey['fields'] = fields[survey['survey_id']]
+
+    return {
+        'last_login': user['last_login'],
+        'region': dict(region) if region else None,
+        'surveys': surveys,
+    }
+
+
+def _create_survey(conn: sqlite3.Connection, p_survey_name: str, p_created_by: int,
+                   p_fields: List[Dict], p_governorate_ids: List[int]) -> int:
+    survey_id = conn.execute(
+        'insert into Surveys (survey_name, created_by) values (?, ?) returning survey_id',
+        (p_survey_name, p_created_by)
+    ).fetchone()[0]
+    conn.executemany(
+        'insert into Survey_Fields (survey_id, field_label, field_type, field_options, is_required, field_order) '
+        'values (?, ?, ?, ?, ?, ?)',
+        [(survey_id, f['field_label'], f['field_type'], f.get('field_options'), int(bool(f.get('is_required'))),
+          f['field_order'] if f.get('field_order') is not None else position)
+         for position, f in enumerate(p_fields or [], start=1)]
+    )
+    conn.executemany(
+        'insert into SurveyGovernorate (survey_id, governorate_id) values (?, ?)',
+        [(survey_id, governorate_id) for governorate_id in p_governorate_ids or []]
+    )
+    return survey_id
+
+
+def _update_survey_fields(conn: sqlite3.Connection, p_survey_id: int, p_survey_name: str,
+                          p_is_active: bool, p_fields: List[Dict]) -> None:
+    conn.execute('update Surveys set survey_name = ?, is_active = ? where survey_id = ?',
+                 (p_survey_name, int(p_is_active), p_survey_id))
+    fields = p_fields or []
+    conn.executemany(
+        'update Survey_Fields set field_label = ?1, field_type = ?2, field_options = ?3, is_required = ?4 '
+        'where field_id = ?5 and survey_id = ?6 and (field_label, field_type, field_options, is_required) '
+        'is not (?1, ?2, ?3, ?4)',
+        [(f['field_label'], f['field_type'], f.get('field_options'), int(bool(f.get('is_required'))),
+          f['field_id'], p_survey_id) for f in fields if 'field_id' in f]
+    )
+    max_order = conn.execute('select coalesce(max(field_order), 0) from Survey_Fields where survey_id = ?',
+                             (p_survey_id,)).fetchone()[0]
+    conn.executemany(
+        'insert into Survey_Fields (survey_id, field_label, field_type, field_options, is_required, field_order) '
+        'values (?, ?, ?, ?, ?, ?)',
+        [(p_survey_id, f['field_label'], f['field_type'], f.get('field_options'), int(bool(f.get('is_required'))),
+          max_order + position)
+         for position, f in enumerate((f for f in fields if 'field_id' not in f), start=1)]
+    )
+
+
+def _update_response_details(conn: sqlite3.Connection, p_updates: Dict[str, str],
+                             p_response_id: Optional[int] = None) -> int:
+    updates = p_updates or {}
+    updated = 0
+    for detail_id, value in updates.items():
+        updated += conn.execute(
+            'update Response_Details set answer_value = ? where detail_id = ? and (? is null or response_id = ?)',
+            (value, int(detail_id), p_response_id, p_response_id)
+        ).rowcount
+    if updated != len(updates):
+        raise LocalBackendError(f"تم العثور على {updated} فقط من أصل {len(updates)} من تفاصيل الإجابة")
+    return updated
+
+
+def _survey_response_stats(conn: sqlite3.Connection, p_survey_id: int,
+                           p_governorate_id: Optional[int] = None) -> Dict:
+    row = conn.execute(
+        'select coalesce(sum(submitted), 0) as total, coalesce(sum(completed), 0) as completed, '
+        'coalesce(sum(draft), 0) as draft, '
+        'count(distinct case when submitted > 0 and admin_id <> 0 then admin_id end) as regions '
+        'from ResponseDailyStats where survey_id = ? and (? is null or governorate_id = ?)',
+        (p_survey_id, p_governorate_id, p_governorate_id)
+    ).fetchone()
+    return dict(row)
+
+
+def _rebuild_response_rollups(conn: sqlite3.Connection, p_survey_id: Optional[int] = None) -> int:
+    conn.execute('delete from ResponseDailyStats where ? is null or survey_id = ?', (p_survey_id, p_survey_id))
+    return conn.execute(
+        'insert into ResponseDailyStats (survey_id, admin_id, day, governorate_id, submitted, completed, draft) '
+        'select r.survey_id, coalesce(r.region_id, 0), substr(r.submission_date, 1, 10), h.governorate_id, '
+        'count(*), sum(r.is_completed = 1), sum(r.is_completed = 0) '
+        'from Responses r left join HealthAdministrations h on h.admin_id = r.region_id '
+        'where ? is null or r.survey_id = ? '
+        'group by r.survey_id, coalesce(r.region_id, 0), substr(r.submission_date, 1, 10), h.governorate_id',
+        (p_survey_id, p_survey_id)
+    ).rowcount
+
+
+PROCEDURES = {
+    'submit_survey': _submit_survey,
+    'employee_bootstrap': _employee_bootstrap,
+    'create_survey': _create_survey,
+    'update_survey_fields': _update_survey_fields,
+    'update_response_details': _update_response_details,
+    'survey_response_stats': _survey_response_stats,
+    'rebuild_response_rollups': _rebuild_response_rollups,
+}
+
+
+if __name__ == '__main__':
+    import argparse
+    import hashlib
+
+    parser = argparse.ArgumentParser(description="تهيئة قاعدة بيانات SQLite المحلية")
+    parser.add_argument('path', nargs='?', default='local.db')
+    parser.add_argument('--admin', help="إنشاء مسؤول نظام بالصيغة username:password")
+    args = parser.parse_args()
+
+    client = LocalClient(args.path)
+    if args.admin:
+        username, password = args.admin.split(':', 1)
+        client.table('Users').insert({
+            'username': username,
+            'password_hash': hashlib.sha256(password.encode()).hexdigest(),
+            'role': 'admin'
+        }).execute()
+    print(f"تمت تهيئة {args.path}")
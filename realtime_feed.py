@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import pandas as pd
+
+from database import get_realtime, get_governorate_survey_responses, get_usernames, get_health_admins_by_governorate
+
+# متابعة إجابات استبيان في محافظة لحظياً: تحميل الإجابات مرة واحدة ثم دمج أحداث INSERT/UPDATE/DELETE
+# القادمة من قناة التغييرات في إطار بيانات محفوظ في الذاكرة ومشترك بين الجلسات، بدلاً من إعادة الجلب في كل إعادة تشغيل
+
+logger = logging.getLogger(__name__)
+
+REALTIME_CONNECT_TIMEOUT = 10.0
+RESPONSE_FEED_ENTRIES = 20
+LIVE_POLL_SECONDS = 2.0
+FEED_FULL_RELOAD_SECONDS = 600
+
+FEED_COLUMNS = ['response_id', 'user_id', 'username', 'region_id', 'admin_name', 'submission_date', 'is_completed']
+
+ChangeCallback = Callable[[str, Optional[Dict], Optional[Dict]], None]
+
+
+class SupabaseRealtime:
+    """اشتراكات تغييرات الجداول عبر realtime-py على اتصال websocket واحد في خيط خلفي
+
+    كل قيمة مصفاة قناة مستقلة realtime:public:<table>:<column>=eq.<value> يطابقها الخادم على السجل الجديد
+    (وعلى السجل القديم لأحداث الحذف)، وجميع عمليات القنوات تنفذ على حلقة asyncio الخاصة بخيط الاتصال
+    """
+
+    def __init__(self, url: str, key: str):
+        base = url.rstrip('/').replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+        self._url = f"{base}/realtime/v1/websocket?apikey={key}&vsn=1.0.0"
+        self._socket = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def _run(self):
+        from realtime.connection import Socket
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            socket = Socket(self._url, auto_reconnect=True)
+            socket.connect()
+            self._socket = socket
+        except Exception:
+            logger.exception("تعذر الاتصال بقناة التغييرات اللحظية")
+            return
+        finally:
+            self._ready.set()
+        socket.listen()
+
+    def _ensure_connected(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                self._socket = None
+                self._thread = threading.Thread(target=self._run, name='realtime', daemon=True)
+                self._thread.start()
+        self._ready.wait(REALTIME_CONNECT_TIMEOUT)
+        if self._socket is None:
+            raise ConnectionError("تعذر الاتصال بقناة التغييرات اللحظية")
+
+    def is_alive(self) -> bool:
+        """هل خيط الاتصال يعمل (يتوقف إذا فشلت إعادة الاتصال داخل listen)"""
+        return self._thread is not None and self._thread.is_alive() and self._socket is not None
+
+    @staticmethod
+    def _dispatch(payload: Dict, callback: ChangeCallback):
+        from realtime.transformers import convert_change_data
+
+        try:
+            columns = payload.get('columns') or []
+            record, old_record = payload.get('record'), payload.get('old_record')
+            if columns:
+                record = convert_change_data(columns, record) if record else record
+                old_record = convert_change_data(columns, old_record) if old_record else old_record
+            callback(payload.get('type'), record, old_record)
+        except Exception:
+            logger.exception("تعذر معالجة حدث من قناة التغييرات اللحظية")
+
+    async def _join(self, topic: str, callback: ChangeCallback):
+        channel = self._socket.set_channel(topic)
+        channel.on('*', lambda payload: self._dispatch(payload, callback))
+        await channel._join()
+        return channel
+
+    async def _leave(self, channels: List[Any]):
+        for channel in channels:
+            self._socket.channels[channel.topic].remove(channel)
+            if not self._socket.channels[channel.topic]:
+                del self._socket.channels[channel.topic]
+                await self._socket.ws_connection.send(json.dumps(
+                    {'topic': channel.topic, 'event': 'phx_leave', 'payload': {}, 'ref': None}
+                ))
+
+    def subscribe(self, table: str, column: str, values: List[Any], callback: ChangeCallback) -> Callable[[], None]:
+        self._ensure_connected()
+        channels = [
+            asyncio.run_coroutine_threadsafe(
+                self._join(f"realtime:public:{table}:{column}=eq.{value}", callback), self._loop
+            ).result(REALTIME_CONNECT_TIMEOUT)
+            for value in values
+        ]
+
+        def unsubscribe():
+            try:
+                asyncio.run_coroutine_threadsafe(self._leave(channels), self._loop).result(REALTIME_CONNECT_TIMEOUT)
+            except Exception:
+                logger.exception("تعذر إلغاء الاشتراك في قناة التغييرات اللحظية")
+        return unsubscribe
+
+
+class ResponseFeed:
+    """إجابات استبيان في محافظة محفوظة في الذاكرة وتُحدّث من قناة التغييرات
+
+    الاشتراك على survey_id=eq.<الاستبيان>، فتصل جميع تغييرات إجابات الاستبيان بما فيها نقل إجابة
+    إلى إدارة خارج المحافظة، ويتم التصفية بالمحافظة عند الدمج. المستدعى يضيف الأحداث إلى قائمة
+    انتظار فقط، ويتم دمجها في الإطار عند القراءة التالية.
+    يعاد التحميل كاملاً عند تغير إدارات المحافظة أو انقطاع الاتصال أو كل FEED_FULL_RELOAD_SECONDS،
+    وإذا تعذر الاشتراك يعاد التحميل عند كل قراءة (live = False)
+    """
+
+    def __init__(self, survey_id: int, governorate_id: int):
+        self.survey_id = survey_id
+        self.governorate_id = governorate_id
+        self.live = False
+        self.version = 0
+        self._admins: Dict[int, str] = {}
+        self._usernames: Dict[int, str] = {}
+        self._frame = pd.DataFrame(columns=FEED_COLUMNS)
+        self._pending: List[Tuple[str, Optional[Dict], Optional[Dict]]] = []
+        self._loaded_at: Optional[float] = None
+        self._publisher = None
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._frame_lock = threading.Lock()
+
+    def start(self):
+        """الاشتراك في تغييرات إجابات الاستبيان، والتحميل الأولي يتم عند أول قراءة بعد الاشتراك"""
+        self._loaded_at = None
+        try:
+            self._publisher = get_realtime()
+            self._unsubscribe = self._publisher.subscribe('Responses', 'survey_id', [self.survey_id], self._on_change)
+            self.live = True
+        except Exception:
+            self.live = False
+            logger.exception("تعذر الاشتراك في تغييرات الإجابات، سيتم إعادة التحميل عند كل عرض")
+
+    def close(self):
+        self.live = False
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def _on_change(self, event_type: str, record: Optional[Dict], old_record: Optional[Dict]):
+        with self._changed:
+            self._pending.append((event_type, record, old_record))
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: float) -> bool:
+        """انتظار وصول تغيير بعد النسخة المعطاة حتى timeout ثانية"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.version != version, timeout)
+
+    def _load(self) -> pd.DataFrame:
+        rows = get_governorate_survey_responses(self.survey_id, self.governorate_id)
+        for row in rows:
+            self._usernames[row['user_id']] = (row.get('Users') or {}).get('username')
+        return self._to_frame(rows)
+
+    def _to_frame(self, rows: List[Dict]) -> pd.DataFrame:
+        frame = pd.DataFrame([{c: row.get(c) for c in FEED_COLUMNS} for row in rows], columns=FEED_COLUMNS)
+        frame['username'] = frame['user_id'].map(self._usernames)
+        frame['admin_name'] = frame['region_id'].map(self._admins)
+        frame['response_id'] = frame['response_id'].astype('int64')
+        frame['is_completed'] = frame['is_completed'].astype(bool)
+        return frame
+
+    def _merge(self, frame: pd.DataFrame, changes: List[Tuple[str, Optional[Dict], Optional[Dict]]]) -> pd.DataFrame:
+        latest: Dict[int, Optional[Dict]] = {}
+        for event_type, record, old_record in changes:
+            if event_type == 'DELETE' or not record:
+                latest[(old_record or {}).get('response_id')] = None
+            elif record.get('survey_id') == self.survey_id and record.get('region_id') in self._admins:
+                latest[record['response_id']] = record
+            else:
+                # إجابة في محافظة أخرى، أو نُقلت من إدارة في المحافظة إلى إدارة خارجها أو إلى استبيان آخر
+                latest[record['response_id']] = None
+        latest.pop(None, None)
+        if not latest:
+            return frame
+
+        upserts = [record for record in latest.values() if record is not None]
+        unknown = {r['user_id'] for r in upserts} - set(self._usernames)
+        self._usernames.update(get_usernames(list(unknown)))
+        frame = frame[~frame['response_id'].isin(list(latest))]
+        if upserts:
+            frame = pd.concat([frame, self._to_frame(upserts)], ignore_index=True)
+        return frame
+
+    def _needs_reload(self) -> bool:
+        admins = {a['admin_id']: a['admin_name'] for a in get_health_admins_by_governorate(self.governorate_id)}
+        if admins != self._admins:
+            # إدارة صحية أضيفت إلى المحافظة أو نُقلت منها أو إليها
+            self._admins = admins
+            return True
+        if self.live and not self._publisher.is_alive():
+            logger.warning("انقطع الاتصال بقناة التغييرات اللحظية، إعادة الاشتراك وتحميل الإجابات")
+            self.close()
+            self.start()
+            return True
+        return (not self.live or self._loaded_at is None or
+                time.monotonic() - self._loaded_at > FEED_FULL_RELOAD_SECONDS)
+
+    def frame(self) -> pd.DataFrame:
+        """الإجابات الحالية مرتبة من الأحدث إلى الأقدم"""
+        with self._frame_lock:
+            skip = 0
+            if self._needs_reload():
+                # الأحداث السابقة للتحميل ممثلة فيه، وتُدمج فقط الأحداث التي تصل أثناءه.
+                # إذا فشل التحميل تبقى الأحداث في الانتظار ويعاد التحميل في القراءة التالية
+                with self._lock:
+                    skip = len(self._pending)
+                try:
+                    frame = self._load()
+                except Exception:
+                    self._loaded_at = None
+                    raise
+                self._loaded_at = time.monotonic()
+            else:
+                frame = self._frame
+            with self._lock:
+                changes, self._pending = self._pending[skip:], []
+            self._frame = self._merge(frame, changes).sort_values(
+                ['submission_date', 'response_id'], ascending=False, ignore_index=True
+            )
+            return self._frame
+
+
+# إطارات الإجابات مشتركة على مستوى العملية بين جميع الجلسات ويُغلق اشتراك الأقدم استخداماً عند تجاوز الحد
+_feeds: 'OrderedDict[Tuple[int, int], ResponseFeed]' = OrderedDict()
+_feeds_lock = threading.Lock()
+
+
+def get_response_feed(survey_id: int, governorate_id: int) -> ResponseFeed:
+    """إطار إجابات الاستبيان في المحافظة المتابع لحظياً"""
+    key = (survey_id, governorate_id)
+    evicted = []
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = ResponseFeed(survey_id, governorate_id)
+            feed.start()
+            _feeds[key] = feed
+            while len(_feeds) > RESPONSE_FEED_ENTRIES:
+                evicted.append(_feeds.popitem(last=False)[1])
+        _feeds.move_to_end(key)
+    for old in evicted:
+        old.close()
+    return feed
+
+
+def close_response_feeds():
+    """إغلاق جميع الإطارات واشتراكاتها (يُستدعى من invalidate_reference_cache)"""
+    with _feeds_lock:
+        feeds = list(_feeds.values())
+        _feeds.clear()
+    for feed in feeds:
+        feed.close()
+
+
+def follow_response_feed(feed: ResponseFeed, version: int, status):
+    """انتظار وصول تغيير بعد النسخة المعطاة مع تحديث العنصر status كل LIVE_POLL_SECONDS
+
+    تحديث العنصر يسمح لـ Streamlit بمقاطعة الانتظار عند تفاعل المستخدم أو إغلاق الجلسة
+    """
+    while not feed.wait_for_change(version, LIVE_POLL_SECONDS):
+        status.caption(f"🔴 متابعة مباشرة — آخر فحص {time.strftime('%H:%M:%S')}")
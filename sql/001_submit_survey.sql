@@ -0,0 +1,43 @@
+-- إرسال استبيان كامل في معاملة واحدة وطلب HTTP واحد:
+-- التحقق من الإكمال اليومي، ثم إدراج رأس الإجابة، ثم إدراج جميع التفاصيل.
+-- p_answers: كائن JSON بالشكل {"<field_id>": "<answer_value>", ...}
+create or replace function submit_survey(
+    p_survey_id bigint,
+    p_user_id bigint,
+    p_region_id bigint,
+    p_is_completed boolean,
+    p_answers jsonb
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_response_id bigint;
+begin
+    if p_is_completed then
+        -- منع إرسالين متزامنين لنفس المستخدم ونفس الاستبيان
+        perform pg_advisory_xact_lock(p_user_id::int, p_survey_id::int);
+
+        if exists (
+            select 1
+            from "Responses"
+            where user_id = p_user_id
+              and survey_id = p_survey_id
+              and is_completed
+              and submission_date >= current_date
+              and submission_date < current_date + 1
+        ) then
+            return jsonb_build_object('response_id', null, 'already_completed', true);
+        end if;
+    end if;
+
+    insert into "Responses" (survey_id, user_id, region_id, is_completed)
+    values (p_survey_id, p_user_id, p_region_id, p_is_completed)
+    returning response_id into v_response_id;
+
+    insert into "Response_Details" (response_id, field_id, answer_value)
+    select v_response_id, a.key::bigint, a.value
+    from jsonb_each_text(coalesce(p_answers, '{}'::jsonb)) as a;
+
+    return jsonb_build_object('response_id', v_response_id, 'already_completed', false);
+end;
+$$;
@@ -0,0 +1,3 @@
+-- فهرس لترقيم صفحات الإجابات بالمؤشر (submission_date, response_id) داخل كل استبيان
+create index if not exists responses_survey_keyset_idx
+    on "Responses" (survey_id, submission_date desc, response_id desc);
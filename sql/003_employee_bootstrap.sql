@@ -0,0 +1,56 @@
+-- كل ما تحتاجه لوحة الموظف عند فتحها في طلب واحد:
+-- الإدارة الصحية والمحافظة، آخر دخول، الاستبيانات المسموح بها مع حالة الإكمال اليوم وحقول كل استبيان.
+-- تعيد null إذا لم يوجد المستخدم.
+create or replace function employee_bootstrap(p_user_id bigint)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'last_login', u.last_login,
+        'region', (
+            select jsonb_build_object(
+                'admin_id', h.admin_id,
+                'admin_name', h.admin_name,
+                'governorate_id', g.governorate_id,
+                'governorate_name', g.governorate_name
+            )
+            from "HealthAdministrations" h
+            join "Governorates" g on g.governorate_id = h.governorate_id
+            where h.admin_id = u.assigned_region
+        ),
+        'surveys', coalesce((
+            select jsonb_agg(jsonb_build_object(
+                'survey_id', s.survey_id,
+                'survey_name', s.survey_name,
+                'created_at', s.created_at,
+                'completed_today', exists (
+                    select 1
+                    from "Responses" r
+                    where r.user_id = p_user_id
+                      and r.survey_id = s.survey_id
+                      and r.is_completed
+                      and r.submission_date >= current_date
+                      and r.submission_date < current_date + 1
+                ),
+                'fields', coalesce((
+                    select jsonb_agg(jsonb_build_object(
+                        'field_id', f.field_id,
+                        'field_label', f.field_label,
+                        'field_type', f.field_type,
+                        'field_options', f.field_options,
+                        'is_required', f.is_required,
+                        'field_order', f.field_order
+                    ) order by f.field_order)
+                    from "Survey_Fields" f
+                    where f.survey_id = s.survey_id
+                ), '[]'::jsonb)
+            ) order by s.survey_id)
+            from "UserSurveys" us
+            join "Surveys" s on s.survey_id = us.survey_id
+            where us.user_id = p_user_id
+        ), '[]'::jsonb)
+    )
+    from "Users" u
+    where u.user_id = p_user_id;
+$$;
@@ -0,0 +1,42 @@
+-- فحص "هل أكمل المستخدم الاستبيان اليوم" عبر فهرس مركب بدلاً من مسح الصفوف
+create index if not exists responses_user_completion_idx
+    on "Responses" (user_id, survey_id, is_completed, submission_date);
+
+-- إجابة مكتملة واحدة فقط لكل مستخدم واستبيان ويوم (submission_date من نوع timestamp بدون منطقة زمنية).
+-- يجب معالجة أي تكرارات قائمة قبل إنشاء الفهرس، ويمكن عرضها بالاستعلام:
+--   select user_id, survey_id, submission_date::date, count(*)
+--   from "Responses" where is_completed
+--   group by 1, 2, 3 having count(*) > 1;
+create unique index if not exists responses_one_completed_per_day_idx
+    on "Responses" (user_id, survey_id, (submission_date::date))
+    where is_completed;
+
+-- submit_survey: يصبح منع التكرار تعارضاً عند الإدراج بدلاً من قراءة إضافية وقفل
+create or replace function submit_survey(
+    p_survey_id bigint,
+    p_user_id bigint,
+    p_region_id bigint,
+    p_is_completed boolean,
+    p_answers jsonb
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_response_id bigint;
+begin
+    insert into "Responses" (survey_id, user_id, region_id, is_completed)
+    values (p_survey_id, p_user_id, p_region_id, p_is_completed)
+    on conflict (user_id, survey_id, (submission_date::date)) where is_completed do nothing
+    returning response_id into v_response_id;
+
+    if v_response_id is null then
+        return jsonb_build_object('response_id', null, 'already_completed', true);
+    end if;
+
+    insert into "Response_Details" (response_id, field_id, answer_value)
+    select v_response_id, a.key::bigint, a.value
+    from jsonb_each_text(coalesce(p_answers, '{}'::jsonb)) as a;
+
+    return jsonb_build_object('response_id', v_response_id, 'already_completed', false);
+end;
+$$;
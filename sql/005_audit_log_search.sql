@@ -0,0 +1,53 @@
+-- بحث مفهرس في سجل التعديلات: عمود search_text يحدّثه مشغل (trigger) ويُفهرس بفهرس trigram
+-- ليخدم البحث الجزئي ilike '%...%' دون مسح الجدول كاملاً
+create extension if not exists pg_trgm;
+
+alter table "AuditLog" add column if not exists search_text text;
+
+create or replace function audit_log_search_text(
+    p_action_type text,
+    p_table_name text,
+    p_old_value text,
+    p_new_value text,
+    p_user_id bigint
+) returns text
+language sql
+stable
+as $$
+    select lower(concat_ws(' ',
+        p_action_type,
+        p_table_name,
+        p_old_value,
+        p_new_value,
+        (select username from "Users" where user_id = p_user_id)
+    ));
+$$;
+
+create or replace function audit_log_set_search_text() returns trigger
+language plpgsql
+as $$
+begin
+    new.search_text := audit_log_search_text(
+        new.action_type, new.table_name, new.old_value::text, new.new_value::text, new.user_id
+    );
+    return new;
+end;
+$$;
+
+drop trigger if exists audit_log_search_text_trg on "AuditLog";
+create trigger audit_log_search_text_trg
+    before insert or update of action_type, table_name, old_value, new_value, user_id
+    on "AuditLog"
+    for each row execute function audit_log_set_search_text();
+
+-- تعبئة السجلات القائمة
+update "AuditLog"
+set search_text = audit_log_search_text(action_type, table_name, old_value::text, new_value::text, user_id)
+where search_text is null;
+
+create index if not exists audit_log_search_trgm_idx
+    on "AuditLog" using gin (search_text gin_trgm_ops);
+
+-- ترقيم الصفحات بالمؤشر (action_timestamp, log_id)
+create index if not exists audit_log_timestamp_idx
+    on "AuditLog" (action_timestamp desc, log_id desc);
@@ -0,0 +1,33 @@
+-- إنشاء استبيان كامل (الرأس، الحقول، ربط المحافظات) في معاملة واحدة وطلب HTTP واحد
+-- p_fields: مصفوفة JSON من {field_label, field_type, field_options, is_required, field_order}
+create or replace function create_survey(
+    p_survey_name text,
+    p_created_by bigint,
+    p_fields jsonb,
+    p_governorate_ids bigint[]
+) returns bigint
+language plpgsql
+as $$
+declare
+    v_survey_id bigint;
+begin
+    insert into "Surveys" (survey_name, created_by)
+    values (p_survey_name, p_created_by)
+    returning survey_id into v_survey_id;
+
+    insert into "Survey_Fields" (survey_id, field_label, field_type, field_options, is_required, field_order)
+    select v_survey_id,
+           f.field ->> 'field_label',
+           f.field ->> 'field_type',
+           f.field ->> 'field_options',
+           coalesce((f.field ->> 'is_required')::boolean, false),
+           coalesce((f.field ->> 'field_order')::int, f.position::int)
+    from jsonb_array_elements(coalesce(p_fields, '[]'::jsonb)) with ordinality as f(field, position);
+
+    insert into "SurveyGovernorate" (survey_id, governorate_id)
+    select v_survey_id, g.governorate_id
+    from unnest(coalesce(p_governorate_ids, '{}'::bigint[])) as g(governorate_id);
+
+    return v_survey_id;
+end;
+$$;
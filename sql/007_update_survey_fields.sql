@@ -0,0 +1,45 @@
+-- تحديث الاستبيان وحقوله في معاملة واحدة وطلب HTTP واحد:
+-- الحقول التي لها field_id تُحدَّث، والحقول الجديدة تُدرج بترتيب يحدده الخادم بعد آخر حقل.
+-- تحديث صف الاستبيان أولاً يقفله حتى نهاية المعاملة، فلا تعطي التعديلات المتزامنة حقلين نفس الترتيب.
+-- p_fields: مصفوفة JSON من {field_id?, field_label, field_type, field_options, is_required}
+create or replace function update_survey_fields(
+    p_survey_id bigint,
+    p_survey_name text,
+    p_is_active boolean,
+    p_fields jsonb
+) returns void
+language plpgsql
+as $$
+declare
+    v_max_order int;
+begin
+    update "Surveys"
+    set survey_name = p_survey_name,
+        is_active = p_is_active
+    where survey_id = p_survey_id;
+
+    update "Survey_Fields" sf
+    set field_label = f.field ->> 'field_label',
+        field_type = f.field ->> 'field_type',
+        field_options = f.field ->> 'field_options',
+        is_required = coalesce((f.field ->> 'is_required')::boolean, false)
+    from jsonb_array_elements(coalesce(p_fields, '[]'::jsonb)) as f(field)
+    where f.field ? 'field_id'
+      and sf.field_id = (f.field ->> 'field_id')::bigint
+      and sf.survey_id = p_survey_id;
+
+    select coalesce(max(field_order), 0) into v_max_order
+    from "Survey_Fields"
+    where survey_id = p_survey_id;
+
+    insert into "Survey_Fields" (survey_id, field_label, field_type, field_options, is_required, field_order)
+    select p_survey_id,
+           f.field ->> 'field_label',
+           f.field ->> 'field_type',
+           f.field ->> 'field_options',
+           coalesce((f.field ->> 'is_required')::boolean, false),
+           v_max_order + row_number() over (order by f.position)
+    from jsonb_array_elements(coalesce(p_fields, '[]'::jsonb)) with ordinality as f(field, position)
+    where not f.field ? 'field_id';
+end;
+$$;
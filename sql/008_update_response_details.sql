@@ -0,0 +1,30 @@
+-- تحديث عدة قيم من تفاصيل إجابة في معاملة واحدة وطلب HTTP واحد
+-- p_updates: كائن JSON بالشكل {"<detail_id>": "<answer_value>", ...}
+-- p_response_id (اختياري): يقصر التحديث على تفاصيل هذه الإجابة
+-- إذا لم توجد إحدى التفاصيل يُلغى التحديث كاملاً
+create or replace function update_response_details(
+    p_updates jsonb,
+    p_response_id bigint default null
+) returns integer
+language plpgsql
+as $$
+declare
+    v_expected integer;
+    v_updated integer;
+begin
+    select count(*) into v_expected from jsonb_object_keys(coalesce(p_updates, '{}'::jsonb));
+
+    update "Response_Details" d
+    set answer_value = u.value
+    from jsonb_each_text(coalesce(p_updates, '{}'::jsonb)) as u
+    where d.detail_id = u.key::bigint
+      and (p_response_id is null or d.response_id = p_response_id);
+
+    get diagnostics v_updated = row_count;
+    if v_updated <> v_expected then
+        raise exception 'تم العثور على % فقط من أصل % من تفاصيل الإجابة', v_updated, v_expected;
+    end if;
+
+    return v_updated;
+end;
+$$;
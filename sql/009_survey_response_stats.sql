@@ -0,0 +1,20 @@
+-- إحصاءات إجابات الاستبيان في استعلام تجميعي واحد (اختيارياً لمحافظة واحدة):
+-- الإجمالي، المكتملة، المسودات، وعدد الإدارات الصحية التي أرسلت إجابات
+create or replace function survey_response_stats(
+    p_survey_id bigint,
+    p_governorate_id bigint default null
+) returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'total', count(*),
+        'completed', count(*) filter (where r.is_completed),
+        'draft', count(*) filter (where not r.is_completed),
+        'regions', count(distinct r.region_id)
+    )
+    from "Responses" r
+    left join "HealthAdministrations" h on h.admin_id = r.region_id
+    where r.survey_id = p_survey_id
+      and (p_governorate_id is null or h.governorate_id = p_governorate_id);
+$$;
@@ -0,0 +1,113 @@
+-- إحصاءات يومية مجمعة للإجابات لكل (استبيان، إدارة صحية، يوم) مع المحافظة،
+-- يحدّثها مشغل على Responses تدريجياً عند كل إرسال، فلا تعيد لوحات التحكم مسح جدول الإجابات.
+-- admin_id = 0 للإجابات غير المرتبطة بإدارة صحية.
+create table if not exists "ResponseDailyStats" (
+    survey_id bigint not null,
+    admin_id bigint not null,
+    day date not null,
+    governorate_id bigint,
+    submitted integer not null default 0,
+    completed integer not null default 0,
+    draft integer not null default 0,
+    primary key (survey_id, admin_id, day)
+);
+
+create index if not exists response_daily_stats_governorate_idx
+    on "ResponseDailyStats" (governorate_id, survey_id);
+
+create or replace function apply_response_rollup(
+    p_survey_id bigint,
+    p_admin_id bigint,
+    p_day date,
+    p_is_completed boolean,
+    p_delta integer
+) returns void
+language sql
+as $$
+    insert into "ResponseDailyStats" as s (survey_id, admin_id, day, governorate_id, submitted, completed, draft)
+    values (
+        p_survey_id,
+        coalesce(p_admin_id, 0),
+        p_day,
+        (select governorate_id from "HealthAdministrations" where admin_id = p_admin_id),
+        p_delta,
+        case when p_is_completed then p_delta else 0 end,
+        case when p_is_completed then 0 else p_delta end
+    )
+    on conflict (survey_id, admin_id, day) do update
+    set submitted = s.submitted + excluded.submitted,
+        completed = s.completed + excluded.completed,
+        draft = s.draft + excluded.draft;
+$$;
+
+create or replace function responses_rollup() returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform apply_response_rollup(old.survey_id, old.region_id, old.submission_date::date, old.is_completed, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform apply_response_rollup(new.survey_id, new.region_id, new.submission_date::date, new.is_completed, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists responses_rollup_trg on "Responses";
+create trigger responses_rollup_trg
+    after insert or delete or update of survey_id, region_id, submission_date, is_completed
+    on "Responses"
+    for each row execute function responses_rollup();
+
+-- مهمة الإصلاح: إعادة بناء الإحصاءات من جدول الإجابات (لاستبيان واحد أو للجميع)
+create or replace function rebuild_response_rollups(p_survey_id bigint default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_rows integer;
+begin
+    lock table "Responses" in share mode;
+
+    delete from "ResponseDailyStats"
+    where p_survey_id is null or survey_id = p_survey_id;
+
+    insert into "ResponseDailyStats" (survey_id, admin_id, day, governorate_id, submitted, completed, draft)
+    select r.survey_id,
+           coalesce(r.region_id, 0),
+           r.submission_date::date,
+           h.governorate_id,
+           count(*),
+           count(*) filter (where r.is_completed),
+           count(*) filter (where not r.is_completed)
+    from "Responses" r
+    left join "HealthAdministrations" h on h.admin_id = r.region_id
+    where p_survey_id is null or r.survey_id = p_survey_id
+    group by r.survey_id, coalesce(r.region_id, 0), r.submission_date::date, h.governorate_id;
+
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+select rebuild_response_rollups();
+
+-- survey_response_stats تقرأ الآن من الإحصاءات المجمعة بدلاً من جدول الإجابات
+create or replace function survey_response_stats(
+    p_survey_id bigint,
+    p_governorate_id bigint default null
+) returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'total', coalesce(sum(s.submitted), 0),
+        'completed', coalesce(sum(s.completed), 0),
+        'draft', coalesce(sum(s.draft), 0),
+        'regions', count(distinct s.admin_id) filter (where s.submitted > 0 and s.admin_id <> 0)
+    )
+    from "ResponseDailyStats" s
+    where s.survey_id = p_survey_id
+      and (p_governorate_id is null or s.governorate_id = p_governorate_id);
+$$;
@@ -0,0 +1,14 @@
+-- بث تغييرات جدول الإجابات على قناة Supabase Realtime لمتابعة لوحة المحافظة لحظياً (realtime_feed.py)
+-- replica identity full: يتضمن old_record جميع الأعمدة فتطابق أحداث الحذف اشتراكات survey_id=eq.<استبيان>
+alter table "Responses" replica identity full;
+
+do $$
+begin
+    if not exists (
+        select 1 from pg_publication_tables
+        where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = 'Responses'
+    ) then
+        alter publication supabase_realtime add table "Responses";
+    end if;
+end;
+$$;
@@ -0,0 +1,26 @@
+-- ResponseDailyStats.governorate_id يتبع محافظة الإدارة الصحية: نقل إدارة صحية إلى محافظة أخرى
+-- (admin_views.edit_health_admin) ينقل إحصاءاتها السابقة معها
+create or replace function health_admin_rollup_governorate() returns trigger
+language plpgsql
+as $$
+begin
+    update "ResponseDailyStats"
+    set governorate_id = new.governorate_id
+    where admin_id = new.admin_id;
+    return null;
+end;
+$$;
+
+drop trigger if exists health_admin_rollup_governorate_trg on "HealthAdministrations";
+create trigger health_admin_rollup_governorate_trg
+    after update of governorate_id on "HealthAdministrations"
+    for each row
+    when (old.governorate_id is distinct from new.governorate_id)
+    execute function health_admin_rollup_governorate();
+
+-- تصحيح الصفوف التي نُقلت إداراتها قبل إضافة المشغل
+update "ResponseDailyStats" s
+set governorate_id = h.governorate_id
+from "HealthAdministrations" h
+where h.admin_id = s.admin_id
+  and s.governorate_id is distinct from h.governorate_id;
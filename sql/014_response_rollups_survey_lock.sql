@@ -0,0 +1,89 @@
+-- rebuild_response_rollups كانت تقفل جدول Responses كاملاً (share mode) فتوقف الإرسال في جميع الاستبيانات
+-- طوال إعادة البناء. أصبح التسلسل لكل استبيان بقفل استشاري: مشغل الإحصاءات يأخذه مشتركاً
+-- (فلا تنتظر الإرسالات المتزامنة على الاستبيان نفسه بعضها) وإعادة البناء تأخذه حصرياً لاستبيان واحد في كل مرة.
+-- 1010 يميز أقفال الإحصاءات المجمعة عن أي أقفال استشارية أخرى، ورقم الاستبيان يُطوى إلى integer
+-- (التصادم النادر بين استبيانين يعني انتظاراً إضافياً فقط)
+create or replace function lock_response_rollup(p_survey_id bigint, p_exclusive boolean default false)
+returns void
+language plpgsql
+as $$
+declare
+    v_key integer := (p_survey_id % 2147483647)::integer;
+begin
+    if p_exclusive then
+        perform pg_advisory_xact_lock(1010, v_key);
+    else
+        perform pg_advisory_xact_lock_shared(1010, v_key);
+    end if;
+end;
+$$;
+
+create or replace function responses_rollup() returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'UPDATE' and old.survey_id <> new.survey_id then
+        -- بترتيب ثابت حتى لا يتعارض تحديثان ينقلان إجابتين في اتجاهين متعاكسين
+        perform lock_response_rollup(least(old.survey_id, new.survey_id));
+        perform lock_response_rollup(greatest(old.survey_id, new.survey_id));
+    elsif tg_op = 'DELETE' then
+        perform lock_response_rollup(old.survey_id);
+    else
+        perform lock_response_rollup(new.survey_id);
+    end if;
+
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform apply_response_rollup(old.survey_id, old.region_id, old.submission_date::date, old.is_completed, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform apply_response_rollup(new.survey_id, new.region_id, new.submission_date::date, new.is_completed, 1);
+    end if;
+    return null;
+end;
+$$;
+
+-- إعادة البناء الكاملة (p_survey_id = null) تعيد بناء كل استبيان على حدة بترتيب رقمه،
+-- فلا يتوقف إلا الإرسال في الاستبيان الجاري بناؤه والاستبيانات التي اكتمل بناؤها في المعاملة نفسها
+create or replace function rebuild_response_rollups(p_survey_id bigint default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_rows integer := 0;
+    v_survey_id bigint;
+begin
+    if p_survey_id is null then
+        for v_survey_id in
+            select survey_id from "Surveys"
+            union
+            select survey_id from "ResponseDailyStats"
+            order by 1
+        loop
+            v_rows := v_rows + rebuild_response_rollups(v_survey_id);
+        end loop;
+        return v_rows;
+    end if;
+
+    -- ينتظر اكتمال الإرسالات الجارية على الاستبيان، وكل عبارة بعده ترى ما التزمت به
+    perform lock_response_rollup(p_survey_id, true);
+
+    delete from "ResponseDailyStats"
+    where survey_id = p_survey_id;
+
+    insert into "ResponseDailyStats" (survey_id, admin_id, day, governorate_id, submitted, completed, draft)
+    select r.survey_id,
+           coalesce(r.region_id, 0),
+           r.submission_date::date,
+           h.governorate_id,
+           count(*),
+           count(*) filter (where r.is_completed),
+           count(*) filter (where not r.is_completed)
+    from "Responses" r
+    left join "HealthAdministrations" h on h.admin_id = r.region_id
+    where r.survey_id = p_survey_id
+    group by r.survey_id, coalesce(r.region_id, 0), r.submission_date::date, h.governorate_id;
+
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
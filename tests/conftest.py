@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DB_BACKEND'] = 'sqlite'
+
+import database  # noqa: E402
+
+
+class RecordingAuditWriter:
+    """بديل لكاتب سجل التعديلات يحفظ السجلات في قائمة بدلاً من قاعدة البيانات"""
+
+    def __init__(self):
+        self.records = []
+
+    def submit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture(autouse=True)
+def audit_records(monkeypatch):
+    writer = RecordingAuditWriter()
+    monkeypatch.setattr(database, '_audit_writer', writer)
+    return writer.records
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import analytics
+import database
+
+
+@pytest.fixture
+def survey(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'analytics.db'))
+    monkeypatch.setattr(analytics, '_answers', analytics.OrderedDict())
+    client = database.get_client()
+    conn = client.conn
+    conn.execute("insert into Users (user_id, username, password_hash, role) values (1, 'employee', '', 'employee')")
+    conn.execute("insert into Surveys (survey_id, survey_name, created_by) values (1, 'استبيان', 1)")
+    conn.executemany('insert into Survey_Fields (field_id, survey_id, field_label, field_type, field_options, is_required, field_order) '
+                     'values (?, 1, ?, ?, ?, 0, ?)',
+                     [(1, 'العدد', 'number', None, 1), (2, 'الحالة', 'dropdown', json.dumps(['أ', 'ب']), 2)])
+    conn.commit()
+    for i in range(10):
+        _submit(client, {'1': str(i), '2': 'أ'})
+    return client
+
+
+def _submit(client, answers):
+    return client.rpc('submit_survey', {'p_survey_id': 1, 'p_user_id': 1, 'p_region_id': None,
+                                        'p_is_completed': False, 'p_answers': answers}).execute().data
+
+
+def test_new_submissions_fetch_only_new_details(survey):
+    results = analytics.get_survey_analytics(1)
+    assert results[1]['answered'] == 10
+
+    _submit(survey, {'1': '100', '2': 'ب'})
+    before = survey.round_trips
+    results = analytics.get_survey_analytics(1)
+    assert survey.round_trips - before == 1
+    assert results[1]['answered'] == 11
+    assert results[1]['summary']['max'] == 100
+    assert results[2]['counts'].to_dict() == {'أ': 10, 'ب': 1}
+
+    before = survey.round_trips
+    assert analytics.get_survey_analytics(1) is results
+    assert survey.round_trips - before == 1
+
+
+def test_edits_trigger_full_reload(survey):
+    analytics.get_survey_analytics(1)
+    detail_id = survey.conn.execute('select detail_id from Response_Details where field_id = 2 limit 1').fetchone()[0]
+    assert database.update_response_details_bulk({detail_id: 'ب'})
+    assert analytics.get_survey_analytics(1)[2]['counts'].to_dict() == {'أ': 9, 'ب': 1}
+
+
+def test_failed_fetch_is_not_cached(survey, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ConnectionError("timeout")
+    monkeypatch.setattr(analytics, 'get_survey_answer_values', fail)
+    assert analytics.get_survey_analytics(1) is None
+    assert 1 not in analytics._answers
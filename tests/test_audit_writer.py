@@ -0,0 +1,79 @@
+import time
+
+from audit_writer import AuditWriter
+
+
+class FlakyStore:
+    """مخزن يفشل في أول failures محاولات إدراج"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.rows = []
+        self.calls = 0
+
+    def write(self, batch):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("outage")
+        self.rows.extend(batch)
+
+
+def test_failed_batches_are_retried_until_written():
+    store = FlakyStore(failures=3)
+    writer = AuditWriter(store.write, batch_size=10, flush_interval_ms=10, retry_delay=0.01)
+    for i in range(25):
+        writer.submit({'record_id': i})
+    deadline = time.monotonic() + 5
+    while len(store.rows) < 25 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+    assert sorted(r['record_id'] for r in store.rows) == list(range(25))
+    assert store.calls > 3
+
+
+def test_close_gives_up_after_bounded_retries(caplog):
+    store = FlakyStore(failures=1_000)
+    writer = AuditWriter(store.write, batch_size=10, flush_interval_ms=60_000, retry_delay=0.01)
+    writer.submit({'record_id': 1})
+    writer.close()
+    assert not writer._thread.is_alive()
+    assert '"record_id": 1' in caplog.text
+
+
+def test_full_queue_falls_back_to_synchronous_write():
+    store = FlakyStore(failures=0)
+    writer = AuditWriter(store.write, batch_size=1000, flush_interval_ms=60_000, max_queue=1, enqueue_timeout=0.01)
+    for i in range(5):
+        writer.submit({'record_id': i})
+    writer.close()
+    assert sorted(r['record_id'] for r in store.rows) == list(range(5))
+
+
+class SlowStore(FlakyStore):
+    """مخزن يتأخر في أول محاولة إدراج فيمتلئ الطابور أثناءها"""
+
+    def __init__(self, delay: float):
+        super().__init__(failures=0)
+        self.delay = delay
+
+    def write(self, batch):
+        if self.calls == 0:
+            self.calls += 1
+            time.sleep(self.delay)
+            self.rows.extend(batch)
+        else:
+            super().write(batch)
+
+
+def test_close_with_full_queue_writes_pending_records(caplog):
+    store = SlowStore(delay=0.3)
+    writer = AuditWriter(store.write, batch_size=1, flush_interval_ms=10, max_queue=2)
+    writer.submit({'record_id': 0})
+    deadline = time.monotonic() + 5
+    while store.calls == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.submit({'record_id': 1})
+    writer.submit({'record_id': 2})
+    writer.close(timeout=0.05)
+    assert sorted(r['record_id'] for r in store.rows) == [0, 1, 2]
+    assert 'كتابة 2 سجل مباشرة' in caplog.text
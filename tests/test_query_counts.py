@@ -0,0 +1,50 @@
+import hashlib
+
+import pytest
+
+import database
+
+
+def _seed_users(client, users: int):
+    """محافظتان وإدارتان صحيتان و users مستخدماً بأدوار مختلفة"""
+    conn = client.conn
+    conn.executemany('insert into Governorates (governorate_id, governorate_name) values (?, ?)',
+                     [(1, 'محافظة 1'), (2, 'محافظة 2')])
+    conn.executemany('insert into HealthAdministrations (admin_id, admin_name, governorate_id) values (?, ?, ?)',
+                     [(1, 'إدارة 1', 1), (2, 'إدارة 2', 2)])
+    password_hash = hashlib.sha256(b'password').hexdigest()
+    roles = ['employee', 'governorate_admin', 'admin']
+    conn.executemany('insert into Users (user_id, username, password_hash, role, assigned_region) values (?, ?, ?, ?, ?)',
+                     [(u, f'user{u}', password_hash, roles[u % 3], (u % 2) + 1 if roles[u % 3] == 'employee' else None)
+                      for u in range(1, users + 1)])
+    conn.executemany('insert into GovernorateAdmins (user_id, governorate_id) values (?, ?)',
+                     [(u, (u % 2) + 1) for u in range(1, users + 1) if roles[u % 3] == 'governorate_admin'])
+    conn.commit()
+
+
+def _overview_round_trips(tmp_path, monkeypatch, users: int) -> int:
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / f'users_{users}.db'))
+    client = database.get_client()
+    _seed_users(client, users)
+    database.invalidate_reference_cache()
+
+    before = client.round_trips
+    overview = database.get_users_overview()
+    assert len(overview) == users
+    return client.round_trips - before
+
+
+def test_users_overview_round_trips_do_not_grow_with_users(tmp_path, monkeypatch):
+    counts = [_overview_round_trips(tmp_path, monkeypatch, users) for users in (10, 100, 1000)]
+    assert counts[0] == counts[1] == counts[2]
+    assert counts[0] <= 2
+
+
+@pytest.mark.parametrize('users', [10, 500])
+def test_users_overview_resolves_names(tmp_path, monkeypatch, users):
+    _overview_round_trips(tmp_path, monkeypatch, users)
+    overview = {u['username']: u for u in database.get_users_overview()}
+    assert overview['user1']['governorate_name'] == 'محافظة 2'
+    assert overview['user2']['governorate_name'] == ''
+    assert overview['user3']['admin_name'] == 'إدارة 2'
+    assert overview['user3']['governorate_name'] == 'محافظة 2'
@@ -0,0 +1,117 @@
+import pytest
+
+import database
+import realtime_feed
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'feed.db'))
+    client = database.get_client()
+    conn = client.conn
+    conn.executemany('insert into Governorates (governorate_id, governorate_name) values (?, ?)', [(1, 'أ'), (2, 'ب')])
+    conn.executemany('insert into HealthAdministrations (admin_id, admin_name, governorate_id) values (?, ?, ?)',
+                     [(1, 'إدارة 1', 1), (2, 'إدارة 2', 1), (3, 'إدارة 3', 2)])
+    conn.executemany("insert into Users (user_id, username, password_hash, role) values (?, ?, '', 'employee')",
+                     [(1, 'employee1'), (2, 'employee2')])
+    conn.executemany("insert into Surveys (survey_id, survey_name, created_by) values (?, ?, 1)", [(1, 'س1'), (2, 'س2')])
+    conn.commit()
+    database.invalidate_reference_cache()
+    yield client
+    realtime_feed.close_response_feeds()
+
+
+def _submit(client, region_id, survey_id=1, user_id=1):
+    return client.rpc('submit_survey', {'p_survey_id': survey_id, 'p_user_id': user_id, 'p_region_id': region_id,
+                                        'p_is_completed': False, 'p_answers': {}}).execute().data['response_id']
+
+
+def test_changes_are_merged_without_refetch(client, monkeypatch):
+    first = _submit(client, 1)
+    feed = realtime_feed.get_response_feed(1, 1)
+    assert feed.frame()['response_id'].tolist() == [first]
+
+    second = _submit(client, 2, user_id=2)
+    _submit(client, 3)
+    _submit(client, 1, survey_id=2)
+    client.table('Responses').update({'is_completed': True}).eq('response_id', first).execute()
+
+    loads = []
+    monkeypatch.setattr(realtime_feed, 'get_governorate_survey_responses', lambda *args: loads.append(args) or [])
+    frame = feed.frame()
+    assert loads == []
+    assert sorted(frame['response_id']) == [first, second]
+    assert frame.set_index('response_id').loc[first, 'is_completed']
+    assert frame.set_index('response_id').loc[second, 'username'] == 'employee2'
+
+
+def test_response_moved_out_of_governorate_is_dropped(client):
+    response_id = _submit(client, 1)
+    feed = realtime_feed.get_response_feed(1, 1)
+    assert len(feed.frame()) == 1
+
+    client.table('Responses').update({'region_id': 3}).eq('response_id', response_id).execute()
+    assert feed.frame().empty
+
+
+def test_stand_in_matches_new_row_only(client):
+    events = []
+    unsubscribe = client.realtime.subscribe('Responses', 'region_id', [1], lambda *event: events.append(event))
+    response_id = _submit(client, 1)
+    client.table('Responses').update({'region_id': 3}).eq('response_id', response_id).execute()
+    unsubscribe()
+    assert [event[0] for event in events] == ['INSERT']
+
+
+def test_new_health_admin_is_picked_up(client):
+    feed = realtime_feed.get_response_feed(1, 1)
+    assert feed.frame().empty
+
+    client.table('HealthAdministrations').update({'governorate_id': 1}).eq('admin_id', 3).execute()
+    database.invalidate_reference_cache()
+    _submit(client, 3)
+
+    feed = realtime_feed.get_response_feed(1, 1)
+    assert feed.frame()['region_id'].tolist() == [3]
+
+
+class DeadPublisher:
+    def subscribe(self, table, column, values, callback):
+        return lambda: None
+
+    def is_alive(self):
+        return False
+
+
+def test_dead_connection_resubscribes_and_reloads(client, monkeypatch):
+    feed = realtime_feed.get_response_feed(1, 1)
+    feed.frame()
+    feed._publisher = DeadPublisher()
+
+    _submit(client, 1)
+    feed._pending.clear()
+    assert len(feed.frame()) == 1
+    assert feed.live and feed._publisher is client.realtime
+
+
+def test_failed_reload_is_retried_and_keeps_frame(client, monkeypatch):
+    first = _submit(client, 1)
+    feed = realtime_feed.get_response_feed(1, 1)
+    assert feed.frame()['response_id'].tolist() == [first]
+
+    def fail(*args):
+        _submit(client, 2, user_id=2)
+        raise ConnectionError("انقطع الاتصال")
+
+    load = realtime_feed.get_governorate_survey_responses
+    monkeypatch.setattr(realtime_feed, 'get_governorate_survey_responses', fail)
+    feed._loaded_at = None
+    with pytest.raises(ConnectionError):
+        feed.frame()
+    assert feed._loaded_at is None
+    assert feed._frame['response_id'].tolist() == [first]
+    assert [event[0] for event in feed._pending] == ['INSERT']
+
+    monkeypatch.setattr(realtime_feed, 'get_governorate_survey_responses', load)
+    assert len(feed.frame()) == 2
+    assert feed._loaded_at is not None and not feed._pending
@@ -0,0 +1,22 @@
+import json
+
+import database
+
+
+def _schema(*fields):
+    return database._compile_survey_schema(1, 0, [
+        (field_id, label, field_type, options, False, order)
+        for order, (field_id, label, field_type, options) in enumerate(fields, start=1)
+    ])
+
+
+def test_dropdown_keeps_answers_removed_from_options():
+    schema = _schema((1, 'الحالة', 'dropdown', json.dumps(['أ', 'ب', 'أ'])))
+    details = [
+        {'detail_id': 1, 'response_id': 1, 'field_id': 1, 'answer_value': 'قديم'},
+        {'detail_id': 2, 'response_id': 2, 'field_id': 1, 'answer_value': 'ب'},
+    ]
+    matrix = database.build_response_matrix(schema, details, [1, 2, 3])
+    assert matrix['الحالة'].tolist()[:2] == ['قديم', 'ب']
+    assert matrix['الحالة'].isna().tolist() == [False, False, True]
+    assert list(matrix['الحالة'].cat.categories) == ['أ', 'ب', 'قديم']
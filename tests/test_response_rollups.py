@@ -0,0 +1,28 @@
+import database
+
+
+def _seed(client):
+    conn = client.conn
+    conn.executemany('insert into Governorates (governorate_id, governorate_name) values (?, ?)', [(1, 'أ'), (2, 'ب')])
+    conn.executemany('insert into HealthAdministrations (admin_id, admin_name, governorate_id) values (?, ?, ?)',
+                     [(1, 'إدارة 1', 1), (2, 'إدارة 2', 2)])
+    conn.execute("insert into Users (user_id, username, password_hash, role) values (1, 'employee', '', 'employee')")
+    conn.execute("insert into Surveys (survey_id, survey_name, created_by) values (1, 'استبيان', 1)")
+    conn.commit()
+    for region_id, is_completed in [(1, True), (1, False), (2, False)]:
+        client.rpc('submit_survey', {'p_survey_id': 1, 'p_user_id': 1, 'p_region_id': region_id,
+                                     'p_is_completed': is_completed, 'p_answers': {}}).execute()
+
+
+def test_stats_follow_health_admin_to_new_governorate(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'rollups.db'))
+    client = database.get_client()
+    _seed(client)
+    assert database.get_survey_response_stats(1, 1) == {'total': 2, 'completed': 1, 'draft': 1, 'regions': 1}
+
+    client.table('HealthAdministrations').update({'governorate_id': 2}).eq('admin_id', 1).execute()
+
+    assert database.get_survey_response_stats(1, 1)['total'] == 0
+    assert database.get_survey_response_stats(1, 2) == {'total': 3, 'completed': 1, 'draft': 2, 'regions': 2}
+    assert database.get_survey_daily_stats(1, 2)['submitted'].sum() == 3
+    assert database.get_survey_daily_stats(1, 1).empty
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import auth
+
+
+class SessionState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+@pytest.fixture
+def session(monkeypatch):
+    state = SessionState()
+    monkeypatch.setattr(auth.st, 'session_state', state)
+    monkeypatch.setattr(auth, 'get_user_version', lambda user_id: 0)
+    identity = {'user_id': 7, 'username': 'employee7', 'role': 'employee', 'region_id': 3, 'governorate_id': None}
+    auth.set_session_identity(identity)
+    state.identity['loaded_at'] = datetime.now() - timedelta(seconds=auth.USER_IDENTITY_TTL + 1)
+    return state
+
+
+def test_keeps_identity_when_refresh_fails(session, monkeypatch):
+    def fail(user_id):
+        raise ConnectionError("timeout")
+    monkeypatch.setattr(auth, 'get_user_identity', fail)
+    identity = auth.get_session_identity()
+    assert identity is not None and identity['username'] == 'employee7'
+
+
+def test_logs_out_when_user_is_gone(session, monkeypatch):
+    monkeypatch.setattr(auth, 'get_user_identity', lambda user_id: None)
+    assert auth.get_session_identity() is None
+
+
+def test_refreshes_stale_identity(session, monkeypatch):
+    monkeypatch.setattr(auth, 'get_user_identity', lambda user_id: {
+        'user_id': 7, 'username': 'employee7', 'role': 'employee', 'region_id': 4, 'governorate_id': None
+    })
+    assert auth.get_session_identity()['region_id'] == 4
+    assert session.region_id == 4
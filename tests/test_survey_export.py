@@ -0,0 +1,41 @@
+import pytest
+
+import admin_views
+import database
+
+
+class FailingQuery:
+    """استعلام يفشل عند التنفيذ كما يحدث عند انقطاع الاتصال في منتصف التصدير"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        raise ConnectionError("انقطع الاتصال")
+
+
+@pytest.fixture
+def responses(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'export.db'))
+    conn = database.get_client().conn
+    conn.execute("insert into Governorates (governorate_id, governorate_name) values (1, 'محافظة 1')")
+    conn.execute("insert into HealthAdministrations (admin_id, admin_name, governorate_id) values (1, 'إدارة 1', 1)")
+    conn.execute("insert into Users (user_id, username, password_hash, role, assigned_region) values (1, 'user1', '', 'employee', 1)")
+    conn.execute("insert into Surveys (survey_id, survey_name) values (1, 'استبيان')")
+    conn.execute("insert into Survey_Fields (field_id, survey_id, field_label, field_type, field_order) values (1, 1, 'الاسم', 'text', 1)")
+    conn.execute("insert into Responses (response_id, survey_id, user_id, region_id, is_completed) values (1, 1, 1, 1, 1)")
+    conn.execute("insert into Response_Details (response_id, field_id, answer_value) values (1, 1, 'أحمد')")
+    conn.commit()
+    database.invalidate_reference_cache()
+
+
+def test_export_builds_workbook(responses):
+    assert admin_views.build_survey_export(1).startswith(b'PK')
+
+
+def test_export_raises_when_details_fail(responses, monkeypatch):
+    client = database.get_client()
+    table = client.table
+    monkeypatch.setattr(client, 'table', lambda name: FailingQuery() if name == 'Response_Details' else table(name))
+    with pytest.raises(ConnectionError):
+        admin_views.build_survey_export(1)
@@ -0,0 +1,55 @@
+import json
+
+import database
+
+
+class SessionState(dict):
+    __getattr__ = dict.get
+
+
+def _survey(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'surveys.db'))
+    monkeypatch.setattr(database.st, 'session_state', SessionState(user_id=1))
+    client = database.get_client()
+    client.conn.execute("insert into Users (user_id, username, password_hash, role) values (1, 'admin', '', 'admin')")
+    client.conn.commit()
+    survey_id = client.rpc('create_survey', {
+        'p_survey_name': 'استبيان', 'p_created_by': 1, 'p_governorate_ids': [],
+        'p_fields': [{'field_label': 'أ', 'field_type': 'dropdown', 'field_options': json.dumps(['1', '2']), 'is_required': False},
+                     {'field_label': 'ب', 'field_type': 'text', 'field_options': None, 'is_required': True}]
+    }).execute().data
+    return client, survey_id
+
+
+def _form_fields(client, survey_id):
+    return [{'field_id': r['field_id'], 'field_label': r['field_label'], 'field_type': r['field_type'],
+             'field_options': json.loads(r['field_options']) if r['field_options'] else None,
+             'is_required': bool(r['is_required'])}
+            for r in client.conn.execute('select * from Survey_Fields where survey_id = ? order by field_order', (survey_id,))]
+
+
+def test_edit_back_to_cached_value_is_saved(tmp_path, monkeypatch):
+    client, survey_id = _survey(tmp_path, monkeypatch)
+    fields = _form_fields(client, survey_id)
+    database.get_survey_schema(survey_id)
+
+    # عملية أخرى تعدل الحقل بعد تحميل المخطط في ذاكرة هذه العملية
+    client.conn.execute("update Survey_Fields set field_label = 'معدل' where field_id = ?", (fields[0]['field_id'],))
+    client.conn.commit()
+
+    assert database.update_survey(survey_id, 'استبيان', True, fields)
+    assert _form_fields(client, survey_id)[0]['field_label'] == 'أ'
+
+
+def test_unchanged_fields_are_not_rewritten(tmp_path, monkeypatch):
+    client, survey_id = _survey(tmp_path, monkeypatch)
+    fields = _form_fields(client, survey_id)
+    fields[1]['field_label'] = 'ب2'
+
+    before = client.conn.total_changes
+    assert database.update_survey(survey_id, 'استبيان', True, fields + [
+        {'field_label': 'ج', 'field_type': 'number', 'field_options': None, 'is_required': False}
+    ])
+    # صف الاستبيان + الحقل المعدل + الحقل الجديد
+    assert client.conn.total_changes - before == 3
+    assert [f['field_label'] for f in _form_fields(client, survey_id)] == ['أ', 'ب2', 'ج']
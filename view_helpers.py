@@ -0,0 +1,70 @@
+import streamlit as st
+from database import get_survey_responses_page, RESPONSES_PAGE_SIZE
+
+PAGE_SIZE_OPTIONS = [25, RESPONSES_PAGE_SIZE, 100, 200]
+
+def paginated_responses(survey_id, key, governorate_id=None):
+    """عرض أزرار التنقل بين صفحات الإجابات وإرجاع صفوف الصفحة الحالية
+    
+    يتم حفظ مكدس المؤشرات في حالة الجلسة، لذلك تكلفة كل صفحة استعلام واحد
+    مهما بلغ عدد الإجابات.
+    """
+    cursors_key = f"{key}_cursors"
+    page_size = st.selectbox(
+        "عدد الإجابات في الصفحة",
+        PAGE_SIZE_OPTIONS,
+        index=PAGE_SIZE_OPTIONS.index(RESPONSES_PAGE_SIZE),
+        key=f"{key}_page_size"
+    )
+    
+    if st.session_state.get(f"{key}_page_size_used") != page_size:
+        st.session_state[f"{key}_page_size_used"] = page_size
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state.setdefault(cursors_key, [None])
+    
+    rows, next_cursor = get_survey_responses_page(
+        survey_id,
+        page_size=page_size,
+        after=cursors[-1],
+        governorate_id=governorate_id
+    )
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("→ السابق", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"الصفحة {len(cursors)}")
+    with col3:
+        if st.button("التالي ←", key=f"{key}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    
+    return rows
+
+def paginated_frame(frame, key):
+    """عرض أزرار التنقل بين صفحات إطار بيانات محفوظ في الذاكرة وإرجاع صفوف الصفحة الحالية"""
+    page_size = st.selectbox(
+        "عدد الإجابات في الصفحة",
+        PAGE_SIZE_OPTIONS,
+        index=PAGE_SIZE_OPTIONS.index(RESPONSES_PAGE_SIZE),
+        key=f"{key}_page_size"
+    )
+    
+    pages = max(1, -(-len(frame) // page_size))
+    page = min(st.session_state.get(f"{key}_page", 0), pages - 1)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("→ السابق", key=f"{key}_prev", disabled=page == 0):
+            st.session_state[f"{key}_page"] = page - 1
+            st.rerun()
+    with col2:
+        st.caption(f"الصفحة {page + 1} من {pages}")
+    with col3:
+        if st.button("التالي ←", key=f"{key}_next", disabled=page >= pages - 1):
+            st.session_state[f"{key}_page"] = page + 1
+            st.rerun()
+    
+    return frame.iloc[page * page_size:(page + 1) * page_size]